@@ -0,0 +1,151 @@
+import gc
+import os
+
+import dsp
+from playback import FileSource
+
+
+class Asset:
+    """A track held in RAM: all of it, or its first len(data) bytes"""
+
+    def __init__(self, path, data, size):
+        self.path = path
+        self.data = data
+        self.size = size  # Whole file
+        self.complete = len(data) == size
+
+
+class CachedSource:
+    """Loops an asset from RAM, reading any uncached tail from the SD card"""
+
+    def __init__(self, asset):
+        self.asset = asset
+        self.pos = 0
+        self.f = None  # Only opened for the tail
+
+    def readinto(self, view):
+        asset = self.asset
+        if not asset.size:
+            return 0
+        cached = len(asset.data)
+        want = len(view)
+        n = 0
+        while n < want:
+            if self.pos < cached:
+                take = min(want - n, cached - self.pos)
+                dsp.copy_bytes(view, n, asset.data, self.pos, take)
+            else:
+                if self.f is None:
+                    self.f = open(asset.path, 'rb')
+                    self.f.seek(self.pos)
+                # Only a block that straddles the end of the cache or of the
+                # file starts part way in and needs a slice
+                take = self.f.readinto(view[n:] if n else view)
+                if not take:
+                    self.pos = asset.size  # Shorter than stat() said: wrap now
+            n += take
+            self.pos += take
+            if self.pos >= asset.size:
+                # Wrap to the cached start; the tail is re-read from there next loop
+                self.pos = 0
+                if self.f:
+                    self.f.seek(cached)
+        return n
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos):
+        self.pos = pos % self.asset.size if self.asset.size else 0
+        if self.f:
+            self.f.seek(max(self.pos, len(self.asset.data)))
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+
+class AssetCache:
+    """Tracks kept in RAM (PSRAM on the S3) under a byte budget, least recently used out first.
+
+    Each track is capped at track_bytes so a long file caches its start
+    and streams the rest; budget_bytes caps the whole cache.
+    """
+
+    def __init__(self, budget_bytes, track_bytes=None, directory='/sd'):
+        self.budget = budget_bytes
+        self.track_bytes = track_bytes
+        self.directory = directory
+        self.assets = {}
+        self.order = []  # Least recently used first
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch(self, name):
+        self.order.remove(name)
+        self.order.append(name)
+
+    def evict(self, name):
+        asset = self.assets.pop(name, None)
+        if asset:
+            self.order.remove(name)
+            self.used -= len(asset.data)
+            self.evictions += 1
+
+    def clear(self):
+        for name in list(self.order):
+            self.evict(name)
+        gc.collect()
+
+    def load(self, name):
+        """Cached asset for name, reading it from the card if needed; None if it won't fit"""
+        asset = self.assets.get(name)
+        if asset:
+            self.hits += 1
+            self._touch(name)
+            return asset
+        self.misses += 1
+
+        path = self.directory + '/' + name
+        size = os.stat(path)[6]
+        nbytes = size
+        if self.track_bytes is not None:
+            nbytes = min(nbytes, self.track_bytes)
+        nbytes = min(nbytes, self.budget)
+        if nbytes < size:
+            nbytes &= ~511  # A partial copy ends on a sector boundary
+        if not nbytes:
+            return None
+
+        while self.order and self.used + nbytes > self.budget:
+            self.evict(self.order[0])
+        gc.collect()
+        try:
+            data = bytearray(nbytes)
+        except MemoryError:
+            print(f"Asset cache: no room for {nbytes} bytes of {name}")
+            return None
+
+        with open(path, 'rb') as f:
+            got = f.readinto(data)
+        if got < nbytes:
+            data = data[:got]
+        asset = Asset(path, data, size)
+        self.assets[name] = asset
+        self.order.append(name)
+        self.used += len(data)
+        return asset
+
+    def source(self, name):
+        """Playback source for name: from RAM when it can be cached, else straight off the card"""
+        asset = self.load(name)
+        if asset is None:
+            return FileSource(self.directory + '/' + name)
+        return CachedSource(asset)
+
+    def stats_line(self):
+        return (f"{len(self.assets)} tracks, {self.used}/{self.budget} bytes, "
+                f"hits={self.hits} misses={self.misses} evictions={self.evictions}")
@@ -0,0 +1,140 @@
+import math
+from array import array
+import dsp
+from levelmap import ilog2
+
+
+class BandAnalyzer:
+    """Energy in a few frequency bands of each frame, by fixed-point FFT.
+
+    The frame is cut into fft_size-sample segments (every one, or the
+    first `segments`), each Hann-windowed and transformed by dsp.fft_q15
+    into one preallocated work buffer; the bins between consecutive
+    edges_hz are summed into energies. Window, bit-reversal and twiddle
+    tables are built once here, so analyze() allocates nothing. The FFT
+    halves every stage to stay in 32 bits, so quiet frames are shifted
+    up by their headroom below full scale first (block floating point).
+
+    energies are on a per-frame scale (shifted so each fits a small
+    int) - compare them with each other, not across frames. weighting()
+    turns them into a factor for the frame's RMS: sqrt of the
+    weight-averaged energy share, so 1.0 when every band has weight 1
+    and below 1 when the energy sits in down-weighted bands.
+    """
+
+    def __init__(self, rate, edges_hz, weights=None, fft_size=256, frame_samples=1024, segments=0):
+        self.fft_size = fft_size
+        self.segments = min(segments or frame_samples // fft_size, frame_samples // fft_size)
+        self.work = array('i', bytearray(fft_size * 8))
+
+        # Q15 twiddles exp(-2*pi*i*k/n) as cos, -sin pairs
+        self.twiddles = array('h', bytearray(fft_size * 2))
+        for k in range(fft_size // 2):
+            angle = 2 * math.pi * k / fft_size
+            self.twiddles[2 * k] = min(32767, round(math.cos(angle) * 32768))
+            self.twiddles[2 * k + 1] = min(32767, round(-math.sin(angle) * 32768))
+
+        # Load order: Q14 Hann window << 16 | bit-reversed source index
+        bits = 0
+        while (1 << bits) < fft_size:
+            bits += 1
+        self.table = array('i', bytearray(fft_size * 4))
+        for i in range(fft_size):
+            rev = 0
+            for b in range(bits):
+                if i >> b & 1:
+                    rev |= 1 << (bits - 1 - b)
+            window = round(8192 * (1 - math.cos(2 * math.pi * rev / fft_size)))
+            self.table[i] = window << 16 | rev
+
+        # Bin ranges per band, up to Nyquist; each term shifted so a band's sum
+        # over all segments stays under 2**30
+        bin_hz = rate / fft_size
+        nyquist = fft_size // 2
+        self.bins = []
+        self.shifts = []
+        for lo_hz, hi_hz in zip(edges_hz, edges_hz[1:]):
+            lo = min(nyquist, max(1, round(lo_hz / bin_hz)))
+            hi = min(nyquist, max(lo, round(hi_hz / bin_hz)))
+            self.bins.append((lo, hi))
+            terms = (hi - lo) * self.segments
+            shift = 0
+            while (1 << shift) < terms:
+                shift += 1
+            self.shifts.append(shift)
+        self.scales = [float(1 << shift) for shift in self.shifts]  # Back to a common scale
+        self.edges_hz = edges_hz
+        self.weights = list(weights) if weights else [1.0] * len(self.bins)
+        self.energies = [0] * len(self.bins)
+        self.up = 0  # Headroom shift of the last frame
+        self._last_db = [0.0] * len(self.bins)
+
+    def analyze(self, frame):
+        """Band energies of one frame, into self.energies"""
+        energies = self.energies
+        for b in range(len(energies)):
+            energies[b] = 0
+        n = self.fft_size
+        work = self.work
+        peak = dsp.peak(frame, n * self.segments)
+        up = 14 - ilog2(peak) if peak else 0
+        if up < 0:
+            up = 0
+        self.up = up
+        for segment in range(self.segments):
+            dsp.fft_load(frame, segment * n, work, self.table, n, up)
+            dsp.fft_q15(work, self.twiddles, n)
+            for b in range(len(energies)):
+                lo, hi = self.bins[b]
+                energies[b] += dsp.band_power(work, lo, hi, self.shifts[b])
+
+    def weighting(self):
+        """Factor for the frame RMS from the weighted energy share (1.0 if silent)"""
+        total = 0.0
+        weighted = 0.0
+        for b in range(len(self.energies)):
+            energy = self.energies[b] * self.scales[b]
+            total += energy
+            weighted += self.weights[b] * energy
+        if not total:
+            return 1.0
+        return math.sqrt(weighted / total)
+
+    def flux(self, range_db=40):
+        """Spectral flux: weight-averaged rise of each band's level since the
+        previous call, in dB (0 for a steady spectrum). Call once per frame.
+        Bands more than range_db below the loudest count as at that floor,
+        so near-empty bands don't add noise."""
+        n = len(self.energies)
+        # Undo the frame's headroom shift so levels compare across frames
+        offset = 6.0206 * self.up
+        loudest = 0.0
+        for b in range(n):
+            energy = self.energies[b] * self.scales[b]
+            if energy > loudest:
+                loudest = energy
+        if not loudest:
+            return 0.0
+        floor = loudest * 10 ** (-range_db / 10)
+        rise = 0.0
+        weights = 0.0
+        for b in range(n):
+            energy = self.energies[b] * self.scales[b]
+            level = 10 * math.log10(energy if energy > floor else floor) - offset
+            change = level - self._last_db[b]
+            self._last_db[b] = level
+            if change > 0:
+                rise += self.weights[b] * change
+            weights += self.weights[b]
+        return rise / weights
+
+    def shares(self):
+        """Each band's share of the energy, in percent"""
+        energies = [self.energies[b] * self.scales[b] for b in range(len(self.energies))]
+        total = sum(energies) or 1
+        return [100 * e / total for e in energies]
+
+    def status_line(self):
+        edges = self.edges_hz
+        return ' '.join(f"{edges[b]}-{edges[b + 1]}Hz={share:.0f}%"
+                        for b, share in enumerate(self.shares()))
@@ -0,0 +1,147 @@
+import gc
+import _thread
+from array import array
+import dsp
+from locks import wake
+
+# gc.mem_alloc() only exists on MicroPython; on other ports we can't count
+try:
+    _mem_alloc = gc.mem_alloc
+except AttributeError:
+    _mem_alloc = None
+
+
+class FrameCapture:
+    """Reads 16-bit mic frames into one persistent buffer.
+
+    Gain, clamp and sum-of-squares happen in a single pass over the
+    frame, in place, so a frame read allocates nothing on the heap.
+    With step > 1 the level comes from every step-th sample only and
+    the frame is left as it was read. A filter chain (filters.py) set
+    as filters runs on the frame in place before that.
+    """
+
+    def __init__(self, frame_samples=1024, step=1):
+        self.frame_samples = frame_samples
+        self.step = step
+        # array('h') gives signed samples directly - no byte shifting
+        self.frame = array('h', bytearray(frame_samples * 2))
+        self.buf = memoryview(self.frame)
+
+        # Each square is shifted down by log2(frame_samples) before it is
+        # accumulated so the running sum stays a small int (no bigint
+        # allocation on MicroPython). acc * ms_scale is the mean square.
+        summed = (frame_samples + step - 1) // step
+        shift = dsp.frame_shift(summed)
+        self.shift = shift
+        self.ms_scale = (1 << shift) / summed
+
+        # Change in gc.mem_alloc() over the last read() (CaptureRing: from
+        # take() to done()), None if the port can't tell. It counts the whole
+        # heap: what other threads allocate meanwhile is in it, and a
+        # collection meanwhile can make it negative. Steadily 0 means the
+        # frame path allocates nothing.
+        self.heap_delta = None
+        self.filters = None
+
+    def read(self, mic, gain):
+        """Fill the frame from mic, apply gain and return the scaled sum of squares"""
+        before = _mem_alloc() if _mem_alloc else 0
+
+        mic.readinto(self.buf)
+        acc = self.process(self.frame, gain)
+
+        if _mem_alloc:
+            self.heap_delta = _mem_alloc() - before
+        return acc
+
+    def process(self, frame, gain):
+        """Run the filters on frame, then return sumsq(frame, gain)"""
+        if self.filters is not None:
+            self.filters.process(frame, self.frame_samples)
+        return self.sumsq(frame, gain)
+
+    def sumsq(self, frame, gain):
+        """Scaled sum of squares of a frame at gain (acc * ms_scale is the mean square)"""
+        if self.step == 1:
+            return dsp.gain_sumsq(frame, self.frame_samples, gain, self.shift)
+        return dsp.decimated_sumsq(frame, self.frame_samples, gain, self.shift, self.step)
+
+
+class CaptureRing(FrameCapture):
+    """Fixed ring of mic frames between a capture thread and the analysis.
+
+    The capture side calls fill() in a loop (or next_slot()/commit()
+    around an asyncio read) and never waits for the analysis; if every slot is still unread the new frame goes into the
+    spare buffer and is counted as an overrun. The analysis side calls
+    take(), which blocks until a frame is ready, works on that slot in
+    place (process() runs the filters there, off the capture thread),
+    then hands it back with done().
+    """
+
+    def __init__(self, frame_samples=1024, slots=4, step=1):
+        super().__init__(frame_samples, step)
+        self.slots = slots
+        self.frames = [array('h', bytearray(frame_samples * 2)) for _ in range(slots)]
+        self.views = [memoryview(frame) for frame in self.frames]
+
+        self.written = 0    # frames committed by fill()
+        self.consumed = 0   # frames finished by the analysis
+        self.overruns = 0   # frames dropped because the ring was full
+        self.max_fill = 0   # deepest the ring has been
+        self.stopped = False
+        self._spill = False
+        self._heap = 0
+
+        # Held while the ring is empty; fill() releases it to wake the reader
+        self._ready = _thread.allocate_lock()
+        self._ready.acquire()
+
+    def next_slot(self):
+        """Buffer to read the next frame into: a free slot, or the spare
+        buffer when every slot is still unread"""
+        self._spill = self.written - self.consumed >= self.slots
+        if self._spill:
+            return self.buf
+        return self.views[self.written % self.slots]
+
+    def commit(self):
+        """Publish the frame read into the buffer from next_slot()"""
+        if self._spill:
+            self.overruns += 1
+            return
+        self.written += 1
+        pending = self.written - self.consumed
+        if pending > self.max_fill:
+            self.max_fill = pending
+        wake(self._ready)
+
+    def fill(self, mic):
+        """Read one frame from mic into the ring (never waits on the reader)"""
+        # Even with no room the DMA has to be drained, into the spare buffer
+        mic.readinto(self.next_slot())
+        self.commit()
+
+    def take(self):
+        """Wait for the oldest unread frame; None once the ring is stopped"""
+        while self.written == self.consumed:
+            if self.stopped:
+                return None
+            self._ready.acquire()
+        if _mem_alloc:
+            self._heap = _mem_alloc()
+        return self.frames[self.consumed % self.slots]
+
+    def done(self):
+        """Hand the frame from take() back to the capture thread"""
+        if _mem_alloc:
+            self.heap_delta = _mem_alloc() - self._heap
+        self.consumed += 1
+
+    def pending(self):
+        return self.written - self.consumed
+
+    def stop(self):
+        """Wake a blocked reader and make take() return None"""
+        self.stopped = True
+        wake(self._ready)
@@ -0,0 +1,272 @@
+import _thread
+import os
+import time
+from array import array
+from recorder import wav_header, WAV_HEADER_BYTES
+from locks import wake
+
+# One line per saved clip, in the clip directory: file, tag, ticks_ms, ms into
+# the clip of the first event, frames, frames lost, then the event's info
+LOG_NAME = 'clips.csv'
+
+
+class ClipRing:
+    """Keeps the last seconds of mic frames in RAM and saves clips around
+    events to the SD card from its own thread.
+
+    A fixed ring of frames holds pre_s + post_s + slack_s seconds. The
+    analysis passes every frame to feed(), which copies it into the next
+    slot (no allocation, no I/O). event(tag) only records where it
+    happened: the writer thread (run(), or service() between frames
+    without threads) then writes the pre_s seconds before it and the
+    post_s seconds after it, straight from the ring, to a 16-bit WAV
+    named by sequence number, time and tag, and appends a line to
+    clips.csv. An event while a clip is still being written extends it
+    and its tag replaces the first one (e.g. 'mark' after 'trig': that
+    trigger was false).
+
+    Writes are batch_frames frames at a time and whole sectors (frames
+    of a multiple of 256 samples after a one-sector header), as in
+    sdwriter.SDWriter. slack_s is how far the writer may fall behind the
+    capture, e.g. through an SD stall, before frames it hasn't written
+    yet are overwritten; those are skipped and counted as lost. Frames
+    the capture dropped (CaptureRing overruns) never reach the ring, so
+    a clip around an overrun is that much shorter.
+    """
+
+    def __init__(self, rate, frame_samples, pre_s=4, post_s=2, slack_s=1, batch_frames=4, flush_ms=1000):
+        self.rate = rate
+        self.frame_samples = frame_samples
+        self.frame_bytes = frame_samples * 2
+        self.pre = max(1, int(pre_s * rate) // frame_samples)     # in frames
+        self.post = max(1, int(post_s * rate) // frame_samples)
+        slack = max(1, int(slack_s * rate) // frame_samples)
+        self.count = self.pre + self.post + slack
+        self.batch = max(1, min(batch_frames, self.count))
+        self.flush_ms = flush_ms
+        self.ring = array('h', bytearray(self.count * self.frame_bytes))
+        view = memoryview(self.ring)
+        self.views = [view[i * frame_samples:(i + 1) * frame_samples] for i in range(self.count)]
+        # batch_views[i][k]: frames i..i+k as one buffer, for writes that don't slice
+        self.batch_views = [[view[i * frame_samples:(i + k + 1) * frame_samples]
+                             for k in range(min(self.batch, self.count - i))] for i in range(self.count)]
+
+        self.fed = 0           # frames fed since start
+        self.pending = None    # (frame, tag, info) of the last event; one assignment, so no lock
+        self.directory = None  # Set by enable() once the card is mounted
+        self.seq = 0
+
+        # Writer state, only touched by the writer
+        self.f = None
+        self.running = False
+        self._seen = None
+        self._start = self._end = self.pos = 0
+        self._tag = self._info = self._name = None
+        self._opened_tag = None
+        self._event = self._lost = 0
+        self._last_flush = 0
+
+        # Held while there's nothing to write; feed() and event() release it to wake run()
+        self._ready = _thread.allocate_lock()
+        self._ready.acquire()
+
+        self.clips = 0      # clips saved
+        self.merged = 0     # events that extended a clip instead of starting one
+        self.dropped = 0    # events with no card to save them to
+        self.superseded = 0  # events replaced by the next one while waiting for a clip to finish
+        self.failed = 0     # clips cut short by a write error
+        self.lost = 0       # frames overwritten before the writer got to them
+        self.bytes = 0
+        self.writes = 0
+        self.worst_write_us = 0
+
+    # ===== ANALYSIS SIDE =====
+
+    def feed(self, frame):
+        """Copy one captured frame into the ring (frame_samples samples)"""
+        self.views[self.fed % self.count][:] = frame
+        self.fed += 1
+        if self.f is not None or self.pending is not self._seen:
+            wake(self._ready)
+
+    def event(self, tag, info=''):
+        """Save the frames around now: pre_s before, post_s after"""
+        last = self.pending
+        if last is not self._seen and self.f is not None and last[0] - self.pre > self._end:
+            self.superseded += 1  # Was waiting for the open clip, won't be saved now
+        self.pending = (self.fed, tag, info)
+        wake(self._ready)
+
+    def seconds(self):
+        """Seconds of audio the ring holds before an event"""
+        return self.pre * self.frame_samples / self.rate
+
+    # ===== WRITER SIDE =====
+
+    def enable(self, directory):
+        """Save clips under directory (created if missing), numbered after
+        the ones already there"""
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            os.mkdir(directory)
+            names = []
+        for name in names:
+            try:
+                self.seq = max(self.seq, int(name.split('_', 1)[0]) + 1)
+            except ValueError:
+                pass
+        self.directory = directory
+
+    def service(self, max_frames=None):
+        """Start, write or finish the pending clip: whole batches while the
+        clip is still filling, everything once it has; returns the frames
+        written (at most max_frames)"""
+        event = self.pending
+        if event is not self._seen:
+            if self.f is None:
+                self._seen = event
+                self._begin(event)
+            elif event[0] - self.pre <= self._end:
+                self._seen = event
+                self._end = max(self._end, event[0] + self.post)
+                self._tag, self._info = event[1], event[2]
+                self.merged += 1
+            # Otherwise it starts once this clip is done
+        if self.f is None:
+            return 0
+        try:
+            done = self._write(max_frames)
+            if time.ticks_diff(time.ticks_ms(), self._last_flush) >= self.flush_ms:
+                self.f.flush()
+                self._last_flush = time.ticks_ms()
+            if self.pos >= self._end:
+                self._finish()
+        except OSError as e:
+            print(f"ERROR saving clip {self._name}: {e}")
+            self.failed += 1
+            if self.f is not None:
+                try:
+                    self.f.close()
+                except OSError:
+                    pass
+            self.f = None
+            return 0
+        return done
+
+    def _begin(self, event):
+        frame, tag, info = event
+        if self.directory is None:
+            self.dropped += 1
+            return
+        self._start = max(frame - self.pre, self.fed - self.count + 1, 0)
+        self._end = frame + self.post
+        self.pos = self._start
+        self._tag = self._opened_tag = tag
+        self._info = info
+        self._event = frame
+        self._lost = self.lost
+        t = time.localtime(int(time.time()))
+        stamp = f"{t[0]:04d}{t[1]:02d}{t[2]:02d}_{t[3]:02d}{t[4]:02d}{t[5]:02d}"
+        self._name = f"{self.seq:04d}_{stamp}"
+        self.seq += 1
+        try:
+            f = open(self._path(tag), 'wb')
+            expected = WAV_HEADER_BYTES + (self._end - self._start) * self.frame_bytes
+            # Allocated up front where the file can be trimmed afterwards (not FAT on the board)
+            if hasattr(f, 'truncate'):
+                f.seek(expected - 1)
+                f.write(b'\0')
+                f.seek(0)
+            f.write(wav_header(self.rate, 0))
+        except OSError as e:
+            print(f"ERROR opening clip {self._name}: {e}")
+            self.dropped += 1
+            return
+        self._last_flush = time.ticks_ms()
+        self.f = f
+
+    def _path(self, tag):
+        return f"{self.directory}/{self._name}_{tag}.wav"
+
+    def _write(self, max_frames):
+        done = 0
+        while max_frames is None or done < max_frames:
+            fed = self.fed
+            oldest = fed - self.count + 1  # The slot being fed may be half overwritten
+            if self.pos < oldest:
+                self.lost += oldest - self.pos
+                self.pos = oldest
+            ready = min(fed, self._end) - self.pos
+            if ready <= 0 or (ready < self.batch and fed < self._end):
+                break
+            i = self.pos % self.count
+            k = min(ready, len(self.batch_views[i]))
+            if max_frames is not None:
+                k = min(k, max_frames - done)
+            start = time.ticks_us()
+            self.f.write(self.batch_views[i][k - 1])
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+            # Frames the capture reached while they were being written
+            torn = self.fed - self.count + 1 - self.pos
+            if torn > 0:
+                self.lost += min(torn, k)
+            self.writes += 1
+            self.bytes += k * self.frame_bytes
+            if elapsed > self.worst_write_us:
+                self.worst_write_us = elapsed
+            self.pos += k
+            done += k
+        return done
+
+    def _finish(self):
+        f = self.f
+        frames = self.pos - self._start
+        if hasattr(f, 'truncate'):
+            f.truncate(WAV_HEADER_BYTES + frames * self.frame_bytes)
+        f.seek(0)
+        f.write(wav_header(self.rate, frames * self.frame_bytes))
+        f.close()
+        path = self._path(self._tag)
+        if self._tag != self._opened_tag:
+            os.rename(self._path(self._opened_tag), path)
+        # Where the first event falls in the clip, so a replay can find it
+        event_ms = (self._event - self._start) * self.frame_samples * 1000 // self.rate
+        with open(f"{self.directory}/{LOG_NAME}", 'a') as log:
+            log.write(f"{self._name}_{self._tag}.wav,{self._tag},{time.ticks_ms()},{event_ms},"
+                      f"{frames},{self.lost - self._lost},{self._info}\n")
+        # Only now is the clip done; an error above counts it as failed
+        self.f = None
+        self.clips += 1
+        print(f"Clip saved: {path} ({frames * self.frame_samples / self.rate:.1f} s)")
+
+    def run(self):
+        """Writer loop for a dedicated thread; returns after stop()"""
+        self.running = True
+        try:
+            while self.running:
+                if not self.service():
+                    self._ready.acquire()
+        except Exception as e:
+            print(f"ERROR in clip writer: {e}")
+        finally:
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        wake(self._ready)
+
+    def close(self):
+        """Finish the clip being written with the frames already fed (after stop())"""
+        if self.f is not None:
+            self._seen = self.pending  # Too late to start or extend a clip
+            self._end = min(self._end, self.fed)
+            self.service()
+
+    # ===== STATS =====
+
+    def stats_line(self):
+        dropped = self.dropped + self.superseded
+        return (f"{self.clips} clips ({self.merged} merged, {dropped} dropped, {self.failed} failed), "
+                f"{self.bytes // 1024} KB in {self.writes} writes, worst write {self.worst_write_us} us, "
+                f"{self.lost} frames lost, ring {self.count * self.frame_bytes // 1024} KB")
@@ -0,0 +1,103 @@
+"""Sample-level DSP kernels shared by the monitor, mic test and host tools
+
+One API, several backends, picked once at import time:
+
+    dsp_viper - @micropython.viper/@native loops for the device
+    dsp_np    - NumPy, for host tools when numpy is installed
+    dsp_py    - pure-Python reference, used when nothing faster loads
+
+Sample buffers are 16-bit signed (array('h') or anything exposing an
+int16 buffer) and every kernel takes an explicit sample count n so
+preallocated frames can be partially filled. Saturation is symmetric
+(+/-32767) so squares always fit in a small int. Gains are integers.
+
+Kernels:
+    decode_pcm16(src, dst, n)
+    decode_pcm32(src, dst, n, shift=0, stride=1)
+    apply_gain(samples, n, gain)
+    gain_sumsq(samples, n, gain, shift)
+    decimated_sumsq(samples, n, gain, shift, step)   every step-th sample, read-only
+    sum_squares(samples, n, shift=0)
+    rms(samples, n)
+    dbfs(rms_value, full_scale=32767)
+    peak(samples, n)
+    dc_offset(samples, n)
+    subtract_dc(samples, n, offset)
+    noise_gate(samples, n, threshold)               zero |sample| <= threshold
+
+Streaming filters keep their state between calls in a small array('i')
+(filters.py builds them), so a stream can be fed frame by frame:
+    dc_block(samples, n, state)    one-pole DC blocker, state [acc, shift]
+    gate(samples, n, state)        noise gate with hysteresis and hold,
+                                   state [env, hold, open, close, release, hold_samples]
+
+Mixing kernels work on raw little-endian PCM16 bytes (what the SD card
+and I2S deal in) and a 32-bit accumulator, array('i'). Gains are Q23
+fixed point (GAIN_ONE = 1 << 23), stepped by step every sample:
+    mix_pcm16(acc, src, n, gain, step)  acc += src * gain
+    mix_out(acc, dst, n)                dst = saturate(acc); acc = 0
+    ramp_pcm16(buf, n, gain, step)      buf *= gain, in place
+    copy_bytes(dst, dst_off, src, src_off, n)
+                                        dst[dst_off:][:n] = src[src_off:][:n],
+                                        without making slices
+
+Spectrum kernels work on an interleaved complex array('i') of n points
+(n a power of two, at most 32768) with Q15 twiddles; bands.py builds
+the tables:
+    fft_load(samples, offset, work, table, n, up=0)  window, bit-reverse, << up
+    fft_q15(work, twiddles, n)                 in-place FFT, result = DFT / n
+    band_power(work, lo, hi, shift)            sum of |X[k]|^2 / 4, lo <= k < hi
+
+On the host, DSP_BACKEND=dsp_py (or dsp_np) forces a backend.
+"""
+import sys
+from dsp_py import frame_shift, GAIN_ONE
+
+if sys.implementation.name == 'micropython':
+    BACKEND_ORDER = ('dsp_viper', 'dsp_py')
+else:
+    BACKEND_ORDER = ('dsp_np', 'dsp_py')
+    import os
+    if os.environ.get('DSP_BACKEND'):
+        BACKEND_ORDER = (os.environ['DSP_BACKEND'],)
+
+
+def load_backend(name):
+    """Import a backend module by name (raises if it can't run here)"""
+    return __import__(name)
+
+
+def _select_backend():
+    for name in BACKEND_ORDER:
+        try:
+            return load_backend(name)
+        except (ImportError, SyntaxError):
+            # SyntaxError: port built without the viper/native emitter
+            pass
+    return load_backend('dsp_py')
+
+
+_backend = _select_backend()
+
+BACKEND = _backend.BACKEND
+decode_pcm16 = _backend.decode_pcm16
+decode_pcm32 = _backend.decode_pcm32
+apply_gain = _backend.apply_gain
+gain_sumsq = _backend.gain_sumsq
+decimated_sumsq = _backend.decimated_sumsq
+sum_squares = _backend.sum_squares
+rms = _backend.rms
+dbfs = _backend.dbfs
+peak = _backend.peak
+dc_offset = _backend.dc_offset
+subtract_dc = _backend.subtract_dc
+noise_gate = _backend.noise_gate
+dc_block = _backend.dc_block
+gate = _backend.gate
+mix_pcm16 = _backend.mix_pcm16
+mix_out = _backend.mix_out
+ramp_pcm16 = _backend.ramp_pcm16
+copy_bytes = _backend.copy_bytes
+fft_load = _backend.fft_load
+fft_q15 = _backend.fft_q15
+band_power = _backend.band_power
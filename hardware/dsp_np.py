@@ -0,0 +1,141 @@
+"""NumPy DSP kernels for the host tools - see dsp.py for the API
+
+Sample buffers are viewed in place with np.frombuffer, so the same
+array('h') frames used on the device can be passed in unchanged.
+"""
+import math
+import numpy as np
+from dsp_py import dbfs
+# Recursive filters: each sample depends on the last, so numpy can't help
+from dsp_py import dc_block, gate
+
+BACKEND = 'numpy'
+
+
+def _view(samples, n):
+    return np.frombuffer(samples, dtype=np.int16, count=n)
+
+
+def _saturate(values):
+    return np.clip(values, -32767, 32767).astype(np.int16)
+
+
+def decode_pcm16(src, dst, n):
+    _view(dst, n)[:] = np.frombuffer(src, dtype='<i2', count=n)
+
+
+def decode_pcm32(src, dst, n, shift=0, stride=1):
+    words = np.frombuffer(src, dtype='<i4', count=n * stride)[::stride]
+    _view(dst, n)[:] = _saturate(words >> shift)
+
+
+def apply_gain(samples, n, gain):
+    view = _view(samples, n)
+    view[:] = _saturate(view.astype(np.int32) * gain)
+
+
+def gain_sumsq(samples, n, gain, shift):
+    apply_gain(samples, n, gain)
+    return sum_squares(samples, n, shift)
+
+
+def decimated_sumsq(samples, n, gain, shift, step):
+    values = np.clip(_view(samples, n)[::step].astype(np.int64) * gain, -32767, 32767)
+    return int(((values * values) >> shift).sum())
+
+
+def sum_squares(samples, n, shift=0):
+    values = _view(samples, n).astype(np.int64)
+    return int(((values * values) >> shift).sum())
+
+
+def rms(samples, n):
+    if n <= 0:
+        return 0.0
+    values = _view(samples, n).astype(np.int64)
+    return math.sqrt(int((values * values).sum()) / n)
+
+
+def peak(samples, n):
+    if n <= 0:
+        return 0
+    return int(np.abs(_view(samples, n).astype(np.int32)).max())
+
+
+def dc_offset(samples, n):
+    if n <= 0:
+        return 0.0
+    return float(_view(samples, n).mean())
+
+
+def subtract_dc(samples, n, offset):
+    view = _view(samples, n)
+    view[:] = _saturate(view.astype(np.int32) - int(offset))
+
+
+def noise_gate(samples, n, threshold):
+    view = _view(samples, n)
+    view[np.abs(view.astype(np.int32)) <= threshold] = 0
+
+
+def _gains(gain, step, n):
+    return (gain + step * np.arange(n, dtype=np.int64)) >> 8
+
+
+def _pcm16(buf, n):
+    return np.frombuffer(buf, dtype='<i2', count=n)
+
+
+def mix_pcm16(acc, src, n, gain, step):
+    values = _pcm16(src, n).astype(np.int64)
+    np.frombuffer(acc, dtype=np.int32, count=n)[:] += ((values * _gains(gain, step, n)) >> 15).astype(np.int32)
+
+
+def mix_out(acc, dst, n):
+    total = np.frombuffer(acc, dtype=np.int32, count=n)
+    _pcm16(dst, n)[:] = _saturate(total)
+    total[:] = 0
+
+
+def ramp_pcm16(buf, n, gain, step):
+    view = _pcm16(buf, n)
+    view[:] = _saturate((view.astype(np.int64) * _gains(gain, step, n)) >> 15)
+
+
+def copy_bytes(dst, dst_off, src, src_off, n):
+    np.frombuffer(dst, dtype=np.uint8, count=n, offset=dst_off)[:] = \
+        np.frombuffer(src, dtype=np.uint8, count=n, offset=src_off)
+
+
+def fft_load(samples, offset, work, table, n, up=0):
+    entries = np.frombuffer(table, dtype=np.int32, count=n)
+    values = np.frombuffer(samples, dtype=np.int16)[offset + (entries & 0xFFFF)].astype(np.int64)
+    out = np.frombuffer(work, dtype=np.int32, count=2 * n)
+    out[0::2] = (values * (entries >> 16)) >> (14 - up)
+    out[1::2] = 0
+
+
+def fft_q15(work, twiddles, n):
+    # Stage by stage, every butterfly of a stage at once; same integer steps as dsp_py
+    x = np.frombuffer(work, dtype=np.int32, count=2 * n).astype(np.int64).reshape(n, 2)
+    tw = np.frombuffer(twiddles, dtype=np.int16, count=n).astype(np.int64).reshape(n // 2, 2)
+    half = 1
+    while half < n:
+        blocks = x.reshape(n // (2 * half), 2 * half, 2)
+        w = tw[::n // (2 * half)][:half]
+        wr, wi = w[:, 0], w[:, 1]
+        a = blocks[:, :half].copy()
+        b = blocks[:, half:]
+        tr = ((b[..., 0] * wr) >> 15) - ((b[..., 1] * wi) >> 15)
+        ti = ((b[..., 0] * wi) >> 15) + ((b[..., 1] * wr) >> 15)
+        blocks[:, :half, 0] = (a[..., 0] + tr) >> 1
+        blocks[:, :half, 1] = (a[..., 1] + ti) >> 1
+        blocks[:, half:, 0] = (a[..., 0] - tr) >> 1
+        blocks[:, half:, 1] = (a[..., 1] - ti) >> 1
+        half *= 2
+    np.frombuffer(work, dtype=np.int32, count=2 * n)[:] = x.reshape(-1)
+
+
+def band_power(work, lo, hi, shift):
+    x = np.frombuffer(work, dtype=np.int32, count=2 * hi)[2 * lo:].astype(np.int64) >> 1
+    return int(np.sum((x[0::2] * x[0::2] + x[1::2] * x[1::2]) >> shift))
@@ -0,0 +1,287 @@
+"""Reference pure-Python DSP kernels - see dsp.py for the API"""
+import math
+
+BACKEND = 'python'
+
+GAIN_ONE = 1 << 23  # Unity gain for the Q23 mixing kernels
+
+
+def frame_shift(n):
+    """Smallest shift with (1 << shift) >= n, used to keep square sums small"""
+    shift = 0
+    while (1 << shift) < n:
+        shift += 1
+    return shift
+
+
+def decode_pcm16(src, dst, n):
+    """Decode n little-endian 16-bit samples from src into dst"""
+    for i in range(n):
+        j = i * 2
+        value = (src[j + 1] << 8) | src[j]
+        if value & 0x8000:
+            value -= 0x10000
+        dst[i] = value
+
+
+def decode_pcm32(src, dst, n, shift=0, stride=1):
+    """Decode n little-endian 32-bit words (every stride-th) into 16-bit dst"""
+    step = stride * 4
+    for i in range(n):
+        j = i * step
+        value = (src[j + 3] << 24) | (src[j + 2] << 16) | (src[j + 1] << 8) | src[j]
+        if value & 0x80000000:
+            value -= 0x100000000
+        value >>= shift
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        dst[i] = value
+
+
+def apply_gain(samples, n, gain):
+    """Multiply samples by an integer gain in place, saturating to 16 bits"""
+    for i in range(n):
+        value = samples[i] * gain
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        samples[i] = value
+
+
+def gain_sumsq(samples, n, gain, shift):
+    """apply_gain() and sum_squares() in a single pass"""
+    acc = 0
+    for i in range(n):
+        value = samples[i] * gain
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        samples[i] = value
+        acc += (value * value) >> shift
+    return acc
+
+
+def decimated_sumsq(samples, n, gain, shift, step):
+    """gain_sumsq() over every step-th of the first n samples, leaving them unchanged"""
+    acc = 0
+    for i in range(0, n, step):
+        value = samples[i] * gain
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        acc += (value * value) >> shift
+    return acc
+
+
+def sum_squares(samples, n, shift=0):
+    """Sum of squares, each square shifted right by shift"""
+    acc = 0
+    for i in range(n):
+        value = samples[i]
+        acc += (value * value) >> shift
+    return acc
+
+
+def rms(samples, n):
+    """RMS of the first n samples"""
+    if n <= 0:
+        return 0.0
+    shift = frame_shift(n)
+    return math.sqrt(sum_squares(samples, n, shift) * (1 << shift) / n)
+
+
+def dbfs(rms_value, full_scale=32767):
+    """RMS level in dB relative to full scale"""
+    if rms_value <= 0:
+        return -float('inf')
+    return 20 * math.log10(rms_value / full_scale)
+
+
+def peak(samples, n):
+    """Largest absolute sample value"""
+    result = 0
+    for i in range(n):
+        value = samples[i]
+        if value < 0:
+            value = -value
+        if value > result:
+            result = value
+    return result
+
+
+def dc_offset(samples, n):
+    """Mean sample value (DC offset)"""
+    if n <= 0:
+        return 0.0
+    total = 0
+    for i in range(n):
+        total += samples[i]
+    return total / n
+
+
+def subtract_dc(samples, n, offset):
+    """Subtract an integer DC offset in place, saturating to 16 bits"""
+    offset = int(offset)
+    for i in range(n):
+        value = samples[i] - offset
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        samples[i] = value
+
+
+def noise_gate(samples, n, threshold):
+    """Zero samples whose magnitude is at most threshold, in place"""
+    for i in range(n):
+        value = samples[i]
+        if -threshold <= value <= threshold:
+            samples[i] = 0
+
+
+def dc_block(samples, n, state):
+    """One-pole DC blocker in place; state = array('i', [acc, shift]) with
+    acc >> shift the running DC estimate (pole at 1 - 2**-shift)"""
+    acc = state[0]
+    shift = state[1]
+    for i in range(n):
+        value = samples[i] - (acc >> shift)
+        acc += value
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        samples[i] = value
+    state[0] = acc
+
+
+def gate(samples, n, state):
+    """Noise gate with hysteresis in place; state = array('i', [envelope,
+    hold, open_at, close_at, release_shift, hold_samples]). The peak
+    envelope opens the gate at open_at; once it falls below close_at the
+    gate closes after hold_samples, zeroing samples while closed."""
+    env = state[0]
+    hold = state[1]
+    open_at = state[2]
+    close_at = state[3]
+    release = state[4]
+    hold_samples = state[5]
+    for i in range(n):
+        value = samples[i]
+        magnitude = -value if value < 0 else value
+        if magnitude > env:
+            env = magnitude
+        elif env > 0:
+            env -= (env >> release) + 1
+            if env < 0:
+                env = 0
+        if env >= open_at:
+            hold = hold_samples
+        elif env < close_at and hold > 0:
+            hold -= 1
+        if hold == 0:
+            samples[i] = 0
+    state[0] = env
+    state[1] = hold
+
+
+def mix_pcm16(acc, src, n, gain, step):
+    """Add n PCM16 samples from src into acc at a Q23 gain ramped by step"""
+    for i in range(n):
+        j = i * 2
+        value = (src[j + 1] << 8) | src[j]
+        if value & 0x8000:
+            value -= 0x10000
+        acc[i] += (value * (gain >> 8)) >> 15
+        gain += step
+
+
+def mix_out(acc, dst, n):
+    """Saturate acc into PCM16 dst and clear acc for the next mix"""
+    for i in range(n):
+        value = acc[i]
+        acc[i] = 0
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        j = i * 2
+        dst[j] = value & 0xFF
+        dst[j + 1] = (value >> 8) & 0xFF
+
+
+def ramp_pcm16(buf, n, gain, step):
+    """Scale n PCM16 samples in place by a Q23 gain ramped by step"""
+    for i in range(n):
+        j = i * 2
+        value = (buf[j + 1] << 8) | buf[j]
+        if value & 0x8000:
+            value -= 0x10000
+        value = (value * (gain >> 8)) >> 15
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        buf[j] = value & 0xFF
+        buf[j + 1] = (value >> 8) & 0xFF
+        gain += step
+
+
+def copy_bytes(dst, dst_off, src, src_off, n):
+    """Copy n bytes from src at src_off to dst at dst_off"""
+    for i in range(n):
+        dst[dst_off + i] = src[src_off + i]
+
+
+def fft_load(samples, offset, work, table, n, up=0):
+    """Windowed, bit-reversed complex input for fft_q15: work[2i] = sample
+    offset + (table[i] & 0xFFFF) times the Q14 window table[i] >> 16 and
+    2**up (headroom for quiet input, 0-14), work[2i+1] = 0"""
+    down = 14 - up
+    for i in range(n):
+        entry = table[i]
+        work[2 * i] = (samples[offset + (entry & 0xFFFF)] * (entry >> 16)) >> down
+        work[2 * i + 1] = 0
+
+
+def fft_q15(work, twiddles, n):
+    """In-place radix-2 FFT of n complex points (interleaved, bit-reversed
+    order) halved at every stage, so the result is the DFT / n. twiddles
+    holds cos, -sin of 2*pi*k/n in Q15 for k < n/2."""
+    half = 1
+    while half < n:
+        stride = n // (2 * half)
+        for start in range(0, n, 2 * half):
+            for k in range(half):
+                i = 2 * (start + k)
+                j = i + 2 * half
+                w = 2 * k * stride
+                wr = twiddles[w]
+                wi = twiddles[w + 1]
+                xr = work[j]
+                xi = work[j + 1]
+                tr = ((xr * wr) >> 15) - ((xi * wi) >> 15)
+                ti = ((xr * wi) >> 15) + ((xi * wr) >> 15)
+                ar = work[i]
+                ai = work[i + 1]
+                work[i] = (ar + tr) >> 1
+                work[i + 1] = (ai + ti) >> 1
+                work[j] = (ar - tr) >> 1
+                work[j + 1] = (ai - ti) >> 1
+        half *= 2
+
+
+def band_power(work, lo, hi, shift):
+    """Sum of |X[k]|^2 / 4 over bins lo <= k < hi of fft_q15's output, each
+    term shifted right by shift"""
+    acc = 0
+    for k in range(lo, hi):
+        re = work[2 * k] >> 1
+        im = work[2 * k + 1] >> 1
+        acc += (re * re + im * im) >> shift
+    return acc
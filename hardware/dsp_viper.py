@@ -0,0 +1,385 @@
+"""MicroPython viper/native DSP kernels - see dsp.py for the API
+
+Viper functions take at most four arguments and only integer gains,
+so a few kernels have a thin Python wrapper around the viper loop.
+ptr16 loads are zero-extended and need sign extension by hand.
+"""
+import math
+import micropython
+from array import array
+from dsp_py import frame_shift, dbfs
+
+BACKEND = 'viper'
+
+
+@micropython.viper
+def decode_pcm16(src, dst, n: int):
+    s = ptr16(src)
+    d = ptr16(dst)
+    for i in range(n):
+        d[i] = s[i]
+
+
+@micropython.viper
+def _decode_pcm32(src, dst, n: int, shift_stride: int):
+    s = ptr32(src)
+    d = ptr16(dst)
+    shift = shift_stride & 0xFF
+    stride = shift_stride >> 8
+    for i in range(n):
+        value = s[i * stride] >> shift
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        d[i] = value
+
+
+def decode_pcm32(src, dst, n, shift=0, stride=1):
+    _decode_pcm32(src, dst, n, (stride << 8) | shift)
+
+
+@micropython.viper
+def apply_gain(samples, n: int, gain: int):
+    p = ptr16(samples)
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        value *= gain
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        p[i] = value
+
+
+@micropython.viper
+def gain_sumsq(samples, n: int, gain: int, shift: int) -> int:
+    p = ptr16(samples)
+    acc = 0
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        value *= gain
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        p[i] = value
+        acc += (value * value) >> shift
+    return acc
+
+
+@micropython.viper
+def _decimated_sumsq(samples, n: int, gain: int, shift_step: int) -> int:
+    p = ptr16(samples)
+    shift = shift_step & 0xFF
+    step = shift_step >> 8
+    acc = 0
+    i = 0
+    while i < n:
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        value *= gain
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        acc += (value * value) >> shift
+        i += step
+    return acc
+
+
+def decimated_sumsq(samples, n, gain, shift, step):
+    return _decimated_sumsq(samples, n, gain, (step << 8) | shift)
+
+
+@micropython.viper
+def _sum_squares(samples, n: int, shift: int) -> int:
+    p = ptr16(samples)
+    acc = 0
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        acc += (value * value) >> shift
+    return acc
+
+
+def sum_squares(samples, n, shift=0):
+    return _sum_squares(samples, n, shift)
+
+
+@micropython.native
+def rms(samples, n):
+    if n <= 0:
+        return 0.0
+    shift = frame_shift(n)
+    return math.sqrt(_sum_squares(samples, n, shift) * (1 << shift) / n)
+
+
+@micropython.viper
+def peak(samples, n: int) -> int:
+    p = ptr16(samples)
+    result = 0
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value = 0x10000 - value
+        if value > result:
+            result = value
+    return result
+
+
+@micropython.viper
+def _sum(samples, n: int) -> int:
+    p = ptr16(samples)
+    total = 0
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        total += value
+    return total
+
+
+def dc_offset(samples, n):
+    if n <= 0:
+        return 0.0
+    return _sum(samples, n) / n
+
+
+@micropython.viper
+def _subtract_dc(samples, n: int, offset: int):
+    p = ptr16(samples)
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        value -= offset
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        p[i] = value
+
+
+def subtract_dc(samples, n, offset):
+    _subtract_dc(samples, n, int(offset))
+
+
+@micropython.viper
+def noise_gate(samples, n: int, threshold: int):
+    p = ptr16(samples)
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value = 0x10000 - value
+        if value <= threshold:
+            p[i] = 0
+
+
+@micropython.viper
+def dc_block(samples, n: int, state):
+    p = ptr16(samples)
+    s = ptr32(state)
+    acc = s[0]
+    shift = s[1]
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        value -= acc >> shift
+        acc += value
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        p[i] = value
+    s[0] = acc
+
+
+@micropython.viper
+def gate(samples, n: int, state):
+    p = ptr16(samples)
+    s = ptr32(state)
+    env = s[0]
+    hold = s[1]
+    open_at = s[2]
+    close_at = s[3]
+    release = s[4]
+    hold_samples = s[5]
+    for i in range(n):
+        magnitude = p[i]
+        if magnitude & 0x8000:
+            magnitude = 0x10000 - magnitude
+        if magnitude > env:
+            env = magnitude
+        elif env > 0:
+            env -= (env >> release) + 1
+            if env < 0:
+                env = 0
+        if env >= open_at:
+            hold = hold_samples
+        elif env < close_at and hold > 0:
+            hold -= 1
+        if hold == 0:
+            p[i] = 0
+    s[0] = env
+    s[1] = hold
+
+
+# Gain and step for the ramped kernels; one per kernel since the mixer
+# (prefetch thread) and the output fade (writer thread) run concurrently
+_mix_ramp = array('i', [0, 0])
+_out_ramp = array('i', [0, 0])
+_copy_offsets = array('i', [0, 0])  # Only the playback prefetch copies
+
+
+@micropython.viper
+def _mix_pcm16(acc, src, n: int, ramp):
+    a = ptr32(acc)
+    s = ptr16(src)
+    r = ptr32(ramp)
+    gain = r[0]
+    step = r[1]
+    for i in range(n):
+        value = s[i]
+        if value & 0x8000:
+            value -= 0x10000
+        a[i] = a[i] + ((value * (gain >> 8)) >> 15)
+        gain += step
+
+
+def mix_pcm16(acc, src, n, gain, step):
+    _mix_ramp[0] = gain
+    _mix_ramp[1] = step
+    _mix_pcm16(acc, src, n, _mix_ramp)
+
+
+@micropython.viper
+def mix_out(acc, dst, n: int):
+    a = ptr32(acc)
+    d = ptr16(dst)
+    for i in range(n):
+        value = a[i]
+        a[i] = 0
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        d[i] = value
+
+
+@micropython.viper
+def _ramp_pcm16(buf, n: int, ramp):
+    p = ptr16(buf)
+    r = ptr32(ramp)
+    gain = r[0]
+    step = r[1]
+    for i in range(n):
+        value = p[i]
+        if value & 0x8000:
+            value -= 0x10000
+        value = (value * (gain >> 8)) >> 15
+        if value > 32767:
+            value = 32767
+        elif value < -32767:
+            value = -32767
+        p[i] = value
+        gain += step
+
+
+def ramp_pcm16(buf, n, gain, step):
+    _out_ramp[0] = gain
+    _out_ramp[1] = step
+    _ramp_pcm16(buf, n, _out_ramp)
+
+
+@micropython.viper
+def _copy_bytes(dst, src, n: int, offsets):
+    d = ptr8(dst)
+    s = ptr8(src)
+    o = ptr32(offsets)
+    dst_off = o[0]
+    src_off = o[1]
+    for i in range(n):
+        d[dst_off + i] = s[src_off + i]
+
+
+def copy_bytes(dst, dst_off, src, src_off, n):
+    _copy_offsets[0] = dst_off
+    _copy_offsets[1] = src_off
+    _copy_bytes(dst, src, n, _copy_offsets)
+
+
+@micropython.viper
+def _fft_load(samples, work, table, packed: int):
+    s = ptr16(samples)
+    w = ptr32(work)
+    t = ptr32(table)
+    n = 1 << (packed & 0xF)
+    down = 14 - ((packed >> 4) & 0xF)
+    offset = packed >> 8
+    for i in range(n):
+        entry = t[i]
+        value = s[offset + (entry & 0xFFFF)]
+        if value & 0x8000:
+            value -= 0x10000
+        w[2 * i] = (value * (entry >> 16)) >> down
+        w[2 * i + 1] = 0
+
+
+def fft_load(samples, offset, work, table, n, up=0):
+    # n is a power of two: pass its log2 so offset, up and n share one argument
+    bits = 0
+    while (1 << bits) < n:
+        bits += 1
+    _fft_load(samples, work, table, (offset << 8) | (up << 4) | bits)
+
+
+@micropython.viper
+def fft_q15(work, twiddles, n: int):
+    x = ptr32(work)
+    tw = ptr16(twiddles)
+    half = 1
+    while half < n:
+        stride = n // (2 * half)
+        start = 0
+        while start < n:
+            for k in range(half):
+                i = 2 * (start + k)
+                j = i + 2 * half
+                w = 2 * k * stride
+                wr = tw[w]
+                if wr & 0x8000:
+                    wr -= 0x10000
+                wi = tw[w + 1]
+                if wi & 0x8000:
+                    wi -= 0x10000
+                xr = x[j]
+                xi = x[j + 1]
+                tr = ((xr * wr) >> 15) - ((xi * wi) >> 15)
+                ti = ((xr * wi) >> 15) + ((xi * wr) >> 15)
+                ar = x[i]
+                ai = x[i + 1]
+                x[i] = (ar + tr) >> 1
+                x[i + 1] = (ai + ti) >> 1
+                x[j] = (ar - tr) >> 1
+                x[j + 1] = (ai - ti) >> 1
+            start += 2 * half
+        half *= 2
+
+
+@micropython.viper
+def band_power(work, lo: int, hi: int, shift: int) -> int:
+    x = ptr32(work)
+    acc = 0
+    for k in range(lo, hi):
+        re = x[2 * k] >> 1
+        im = x[2 * k + 1] >> 1
+        acc += (re * re + im * im) >> shift
+    return acc
@@ -0,0 +1,104 @@
+import math
+from array import array
+import dsp
+
+
+def _time_shift(rate, seconds):
+    """Shift k whose one-pole time constant 2**k samples is closest to seconds"""
+    samples = rate * seconds
+    if samples <= 1:
+        return 0
+    return max(0, min(15, round(math.log(samples) / math.log(2))))
+
+
+class DCBlocker:
+    """High-pass that removes the mic's DC offset as it streams.
+
+    y = x - dc, dc following x through a one-pole low-pass with its pole
+    at 1 - 2**-shift: about cutoff_hz for the given rate, rounded to a
+    power-of-two time constant. The whole state is the integer
+    accumulator (dc << shift), so frames can be fed one at a time.
+    """
+
+    def __init__(self, rate, cutoff_hz=5):
+        shift = _time_shift(rate, 1 / (2 * math.pi * cutoff_hz))
+        # acc holds up to 32767 << shift: keep it a small int
+        self.state = array('i', [0, min(shift, 14)])
+        self.cutoff_hz = rate / (2 * math.pi * (1 << self.state[1]))
+
+    def reset(self, offset=0):
+        """Start from an estimated DC offset (e.g. dsp.dc_offset of a first frame)"""
+        self.state[0] = int(offset) << self.state[1]
+
+    def prime(self, samples, n):
+        """reset() to the mean of samples, so the first frame has no settling tail"""
+        self.reset(dsp.dc_offset(samples, n))
+
+    def offset(self):
+        return self.state[0] >> self.state[1]
+
+    def process(self, samples, n):
+        dsp.dc_block(samples, n, self.state)
+
+
+class NoiseGate:
+    """Zeroes the signal while it stays at the noise floor.
+
+    A peak envelope (instant attack, release_ms decay) opens the gate
+    at open_level; it closes only after the envelope has been below
+    close_level for hold_ms, so speech tails and short gaps between
+    words are not chopped. Levels are sample magnitudes after whatever
+    stages run before the gate.
+    """
+
+    def __init__(self, rate, open_level, close_level=None, hold_ms=50, release_ms=10):
+        if close_level is None:
+            close_level = open_level * 2 // 3
+        hold = max(1, rate * hold_ms // 1000)
+        self.state = array('i', [0, 0, open_level, min(close_level, open_level),
+                                 _time_shift(rate, release_ms / 1000), hold])
+
+    def reset(self):
+        self.state[0] = 0
+        self.state[1] = 0
+
+    def is_open(self):
+        return self.state[1] > 0
+
+    def process(self, samples, n):
+        dsp.gate(samples, n, self.state)
+
+
+class Gain:
+    """Integer gain, saturating to +/-32767"""
+
+    def __init__(self, gain):
+        self.gain = gain
+
+    def reset(self):
+        pass
+
+    def process(self, samples, n):
+        if self.gain != 1:
+            dsp.apply_gain(samples, n, self.gain)
+
+
+class FilterChain:
+    """Stages applied in order, in place, to each frame of a stream.
+
+    A stage is anything with process(samples, n) and reset(); the ones
+    here keep O(1) state in preallocated arrays, so process() allocates
+    nothing. Call reset() where the stream restarts (a new recording, a
+    restarted mic).
+    """
+
+    def __init__(self, *stages):
+        self.stages = list(stages)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, samples, n):
+        for stage in self.stages:
+            stage.process(samples, n)
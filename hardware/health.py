@@ -0,0 +1,101 @@
+import time
+from array import array
+
+
+class HealthMonitor:
+    """Heartbeat deadlines per component, targeted restarts with backoff, WDT gating.
+
+    Components call beat() each time they make progress (which also
+    marks them active) and idle() when they have nothing to do, so an
+    idle component is never late. fault() reports a failure the
+    component noticed itself. poll() - from the watchdog thread -
+    runs the restart action of every late or faulted component, at
+    most once per backoff period (doubling up to max_backoff_ms and
+    reset after settle_ms without trouble), and feeds the WDT only
+    when every active component is healthy. A component that can't
+    be brought back therefore ends in a WDT reset.
+    """
+
+    def __init__(self, names, deadlines_ms, wdt=None, backoff_ms=500,
+                 max_backoff_ms=30000, settle_ms=60000):
+        n = len(names)
+        self.names = names
+        self.deadlines = deadlines_ms
+        self.wdt = wdt
+        self.base_backoff = backoff_ms
+        self.max_backoff = max_backoff_ms
+        self.settle_ms = settle_ms
+        self.actions = [None] * n
+
+        self.active = bytearray(n)
+        self.last = array('I', bytearray(4 * n))      # ticks_ms of the last beat
+        self.beats = array('I', bytearray(4 * n))     # Beats so far, to tell if any came between two checks
+        self.faults = array('I', bytearray(4 * n))    # Reported since the last restart
+        self.restarts = array('I', bytearray(4 * n))
+        self.backoff = array('I', [backoff_ms] * n)
+        self.next_restart = array('I', bytearray(4 * n))
+        self.last_restart = array('I', bytearray(4 * n))
+        self.restarted = bytearray(n)  # Backoff still raised
+        self.healthy = True
+
+    def on_restart(self, component, action):
+        """Call action() to restart component"""
+        self.actions[component] = action
+
+    def beat(self, component):
+        self.last[component] = time.ticks_ms()
+        self.beats[component] += 1
+        self.active[component] = 1
+
+    def idle(self, component):
+        self.active[component] = 0
+
+    def fault(self, component):
+        self.faults[component] += 1
+
+    def poll(self):
+        """Check every active component, restart what failed; returns True if all healthy"""
+        now = time.ticks_ms()
+        healthy = True
+        for c in range(len(self.names)):
+            if not self.active[c]:
+                continue
+            late = time.ticks_diff(now, self.last[c]) > self.deadlines[c]
+            if late or self.faults[c]:
+                healthy = False
+                self._recover(c, now, 'stalled' if late else 'faulted')
+            elif self.restarted[c] and time.ticks_diff(now, self.last_restart[c]) > self.settle_ms:
+                self.backoff[c] = self.base_backoff
+                self.restarted[c] = 0
+        self.healthy = healthy
+        if healthy and self.wdt:
+            self.wdt.feed()
+        return healthy
+
+    def _recover(self, c, now, why):
+        if self.restarted[c] and time.ticks_diff(now, self.next_restart[c]) < 0:
+            return  # Still backing off
+        backoff = self.backoff[c]
+        self.restarts[c] += 1
+        print(f"Health: {self.names[c]} {why}, restart #{self.restarts[c]} (next no sooner than {backoff} ms)")
+        self.next_restart[c] = time.ticks_add(now, backoff)
+        self.last_restart[c] = now
+        self.backoff[c] = min(backoff * 2, self.max_backoff)
+        self.restarted[c] = 1
+        self.faults[c] = 0
+        self.last[c] = now  # A full deadline to come back in
+        action = self.actions[c]
+        if action:
+            try:
+                action()
+            except Exception as e:
+                print(f"ERROR restarting {self.names[c]}: {e}")
+
+    def status_line(self):
+        parts = []
+        for c in range(len(self.names)):
+            state = 'idle'
+            if self.active[c]:
+                state = f"{time.ticks_diff(time.ticks_ms(), self.last[c])}ms"
+            parts.append(f"{self.names[c]}={state}/{self.restarts[c]}")
+        return ' '.join(parts) + (' OK' if self.healthy else ' UNHEALTHY')
@@ -0,0 +1,84 @@
+"""Per-module import time and heap use, to compare source, .mpy and frozen builds
+
+Run it on a freshly reset board, before anything else imports the firmware:
+
+    mpremote reset
+    mpremote run hardware/import_report.py
+
+Modules are imported in dependency order, so each line is what that
+module itself costs. "from" shows what was loaded: a .py that had to be
+compiled on the board, a .mpy, or frozen bytecode in the image. The
+firmware itself comes last: main from source, or monitor when
+build_firmware.py put it behind a stub main.py (which is never imported
+here, as importing it starts the firmware).
+"""
+import gc
+import sys
+import time
+
+MODULES = ('locks', 'dsp_py', 'dsp_viper', 'dsp', 'capture', 'playback', 'mixer', 'assets',
+           'telemetry', 'timing', 'health', 'levels', 'levelmap', 'bands', 'onset', 'filters',
+           'recorder', 'sdwriter', 'clips')
+
+# gc.mem_alloc() only exists on MicroPython
+_mem_alloc = getattr(gc, 'mem_alloc', None)
+_mem_free = getattr(gc, 'mem_free', None)
+
+
+def origin(module):
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return 'builtin'
+    if path.startswith('.frozen'):
+        return 'frozen'
+    return path.rsplit('.', 1)[-1]
+
+
+def app_module():
+    """'monitor' if main.py is the build_firmware.py stub that runs it, else 'main'"""
+    try:
+        with open('main.py') as f:
+            if 'import monitor' not in f.read():
+                return 'main'
+    except OSError:
+        pass  # No main.py: the monitor can only be frozen or .mpy
+    return 'monitor'
+
+
+def measure(name):
+    """(import us, heap bytes kept, heap bytes peak, origin) for one module"""
+    gc.collect()
+    before = _mem_alloc() if _mem_alloc else 0
+    start = time.ticks_us()
+    module = __import__(name)
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    peak = _mem_alloc() - before if _mem_alloc else 0
+    gc.collect()
+    kept = _mem_alloc() - before if _mem_alloc else 0
+    return elapsed, kept, peak, origin(module)
+
+
+def report(modules=None):
+    if modules is None:
+        modules = MODULES + (app_module(),)
+    print(f"{'module':12s} {'from':>7s} {'import us':>10s} {'heap kept':>10s} {'heap peak':>10s}")
+    total_us = total_kept = 0
+    for name in modules:
+        if name in sys.modules:
+            print(f"{name:12s} already imported - reset the board first")
+            continue
+        try:
+            elapsed, kept, peak, source = measure(name)
+        except ImportError as e:
+            print(f"{name:12s} {'-':>7s} {e}")
+            continue
+        total_us += elapsed
+        total_kept += kept
+        print(f"{name:12s} {source:>7s} {elapsed:10d} {kept:10d} {peak:10d}")
+    print(f"{'total':12s} {'':>7s} {total_us:10d} {total_kept:10d}")
+    if _mem_free:
+        gc.collect()
+        print(f"Heap free after imports: {_mem_free()} bytes")
+
+
+report()
@@ -0,0 +1,78 @@
+from array import array
+
+MANT_BITS = 4  # Bins per octave of the mean square = 1 << MANT_BITS (~0.19 dB each)
+
+# floor(log2(i)) for a byte
+_LOG2 = bytearray(256)
+for _i in range(2, 256):
+    _LOG2[_i] = _LOG2[_i >> 1] + 1
+
+
+def ilog2(x):
+    """floor(log2(x)) for 0 < x < 2**31, from the byte table"""
+    if x >> 16:
+        if x >> 24:
+            return 24 + _LOG2[x >> 24]
+        return 16 + _LOG2[x >> 16]
+    if x >> 8:
+        return 8 + _LOG2[x >> 8]
+    return _LOG2[x]
+
+
+class SquareTable:
+    """Any function of a mean square, by one table lookup instead of sqrt/log.
+
+    Inputs are the integers the capture path already has: a scaled sum
+    of squares x, with x * scale the mean square (FrameCapture's
+    ms_scale). Bins are log-spaced - the octave of x from ilog2() plus
+    its next MANT_BITS bits - so relative resolution is the same from
+    silence to full scale and x below 1 << MANT_BITS is exact. build()
+    fills the table from any monotonic function and returns the worst
+    error at the bin edges, an upper bound for every input.
+    """
+
+    def __init__(self, typecode='B', scale=1.0, mant_bits=MANT_BITS):
+        self.mant_bits = mant_bits
+        self.bins = 1 << mant_bits
+        self.size = (32 - mant_bits) * self.bins
+        self.table = array(typecode, [0] * self.size)
+        self.scale = scale
+        self.max_error = None
+
+    def index(self, x):
+        m = self.mant_bits
+        if x < self.bins:
+            return x if x > 0 else 0
+        e = ilog2(x)
+        return (e - m + 1) * self.bins + (x >> (e - m)) - self.bins
+
+    def lookup(self, x):
+        return self.table[self.index(x)]
+
+    def edges(self, i):
+        """[lo, hi) range of x that lands in bin i"""
+        if i < self.bins:
+            return i, i + 1
+        octave, offset = divmod(i, self.bins)
+        e = octave + self.mant_bits - 1
+        width = 1 << (e - self.mant_bits)
+        lo = (self.bins + offset) * width
+        return lo, lo + width
+
+    def build(self, func, resolution=1):
+        """Fill with func(mean square) at each bin's centre, rounded to resolution
+        steps; returns (and keeps in max_error) the worst error, in func's units"""
+        table = self.table
+        scale = self.scale
+        worst = 0
+        for i in range(self.size):
+            lo, hi = self.edges(i)
+            value = round(func((lo + hi - 1) / 2 * scale) / resolution)
+            table[i] = value
+            value *= resolution
+            for edge in (lo, hi - 1):
+                error = abs(func(edge * scale) - value)
+                if error > worst:
+                    worst = error
+        self.max_error = worst
+        return worst
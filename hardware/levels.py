@@ -0,0 +1,140 @@
+import json
+import math
+
+_LN10 = math.log(10)
+
+
+def _db_factor(db):
+    return 10 ** (db / 20)
+
+
+class LevelTracker:
+    """Noise floor and loud level of the room, learned from frame RMS as it goes.
+
+    Both are streaming quantiles of the frame RMS (floor_pct and
+    loud_pct): each frame nudges an estimate up by a fixed factor if
+    the frame was above it and down if below, weighted so it settles
+    at the percentile. That is a compare and a multiply per frame and
+    two numbers of state, and steps in dB make it scale-free. Rates
+    are in dB per second of audio, so they don't depend on the frame
+    length; for warmup_s after a cold start they are warmup_factor
+    times faster. ema is a smoothed RMS for display.
+
+    The trigger threshold sits threshold_db above the floor (never
+    below min_threshold) and level() maps RMS between floor and loud
+    level onto 0-100. save()/load() keep the estimates across resets
+    so a warm start needs no warm-up.
+    """
+
+    def __init__(self, frame_ms, floor_pct=10, loud_pct=95, floor_rate_db=0.3, loud_rate_db=0.8,
+                 warmup_s=5, warmup_factor=50, threshold_db=10, min_threshold=0, min_span_db=6,
+                 ema_frames=4):
+        self.frame_s = frame_ms / 1000
+        self.floor_p = floor_pct / 100
+        self.loud_p = loud_pct / 100
+        self.floor_rate = floor_rate_db
+        self.loud_rate = loud_rate_db
+        self.warmup_frames = int(warmup_s / self.frame_s)
+        self.warmup_factor = warmup_factor
+        self.threshold_factor = _db_factor(threshold_db)
+        self.min_threshold = min_threshold
+        self.min_span = _db_factor(min_span_db)
+        self.ema_alpha = 1 / ema_frames
+        self.saved_floor = None
+        self.reset()
+
+    def reset(self):
+        """Forget everything and warm up again from the next frame"""
+        self.floor = None
+        self.loud = None
+        self.ema = 0.0
+        self.frames = 0
+        self.threshold = self.min_threshold
+        self._set_steps(self.warmup_factor)
+
+    def _set_steps(self, speed):
+        # Up and down steps weighted so ups * p == downs * (1 - p) at the percentile
+        floor_db = self.floor_rate * speed * self.frame_s
+        loud_db = self.loud_rate * speed * self.frame_s
+        self.floor_up = _db_factor(floor_db * self.floor_p)
+        self.floor_down = 1 / _db_factor(floor_db * (1 - self.floor_p))
+        self.loud_up = _db_factor(loud_db * self.loud_p)
+        self.loud_down = 1 / _db_factor(loud_db * (1 - self.loud_p))
+
+    def update(self, rms, learn_floor=True):
+        """Feed one frame's RMS; learn_floor False holds the floor (e.g. while
+        the room is hearing our own playback)"""
+        self.ema += (rms - self.ema) * self.ema_alpha
+        if rms < 1:
+            rms = 1
+        if self.floor is None:
+            self.floor = rms
+            self.loud = rms * self.min_span
+
+        if learn_floor:
+            self.floor *= self.floor_up if rms > self.floor else self.floor_down
+        self.loud *= self.loud_up if rms > self.loud else self.loud_down
+        if self.loud < self.floor * self.min_span:
+            self.loud = self.floor * self.min_span
+
+        self.frames += 1
+        if self.frames == self.warmup_frames:
+            self._set_steps(1)
+        threshold = self.floor * self.threshold_factor
+        self.threshold = threshold if threshold > self.min_threshold else self.min_threshold
+
+    def warm(self):
+        return self.frames >= self.warmup_frames
+
+    def level(self, rms):
+        """RMS as 0-100 between the floor and the loud level (log-shaped)"""
+        if self.floor is None or rms <= self.floor:
+            return 0
+        if rms >= self.loud:
+            return 100
+        normalized = (rms - self.floor) / (self.loud - self.floor)
+        return math.log(1 + 9 * normalized) / _LN10 * 100
+
+    def save(self, path):
+        """Write the estimates to path; returns False if there's nothing to save yet"""
+        if self.floor is None:
+            return False
+        with open(path, 'w') as f:
+            json.dump({'floor': self.floor, 'loud': self.loud, 'frames': self.frames}, f)
+        self.saved_floor = self.floor
+        return True
+
+    def load(self, path):
+        """Resume from a save(), skipping the warm-up; False if there is none"""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            floor = float(state['floor'])
+            loud = float(state['loud'])
+        except (OSError, ValueError, KeyError):
+            return False
+        self.floor = floor
+        self.loud = loud
+        self.saved_floor = floor
+        self.frames = max(self.frames, self.warmup_frames, int(state.get('frames', 0)))
+        self._set_steps(1)
+        threshold = floor * self.threshold_factor
+        self.threshold = threshold if threshold > self.min_threshold else self.min_threshold
+        return True
+
+    def changed(self, db=1):
+        """True once the floor has moved more than db since the last save/load"""
+        if self.floor is None:
+            return False
+        if self.saved_floor is None:
+            return self.warm()
+        ratio = self.floor / self.saved_floor
+        limit = _db_factor(db)
+        return ratio > limit or ratio < 1 / limit
+
+    def status_line(self):
+        if self.floor is None:
+            return "no frames yet"
+        return (f"floor={self.floor:.0f} loud={self.loud:.0f} threshold={self.threshold:.0f} "
+                f"ema={self.ema:.0f}{'' if self.warm() else ' (warming up)'}")
+
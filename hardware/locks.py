@@ -0,0 +1,12 @@
+def wake(lock):
+    """Release a lock used as a wake-up signal, if it is held.
+
+    Two threads can both see locked() before either releases it; the
+    second release() then raises RuntimeError, which only means the
+    waiter has already been woken.
+    """
+    if lock.locked():
+        try:
+            lock.release()
+        except RuntimeError:
+            pass
@@ -5,6 +5,27 @@ import math
 import os
 import uos
 import _thread
+from micropython import const
+from capture import CaptureRing
+from bands import BandAnalyzer
+from playback import BlockPlayer
+from mixer import Mixer
+from dsp import GAIN_ONE
+from assets import AssetCache
+from telemetry import Telemetry, PLAYING, PAUSED, VARIANT_SHIFT
+from timing import StageTimer
+from health import HealthMonitor
+from levels import LevelTracker
+from levelmap import SquareTable
+from onset import OnsetDetector
+from filters import FilterChain, DCBlocker, NoiseGate
+from clips import ClipRing
+from locks import wake
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
 
 print("=== Ambient Sound Monitor - Initializing ===")
 
@@ -17,14 +38,215 @@ lock = _thread.allocate_lock()
 mic = None
 audio = None
 running = True  # Main control flag
+play_event = None  # asyncio.Event, only set up by the async runtime
+play_track = None  # Track the playback service should be playing
+track_source = None  # Mixer over the variants, what the player reads from
+trigger_us = None  # ticks_us() of the last start_audio_playback(), until its first sample
 rms_history = []
 RMS_HISTORY_SIZE = 10  # For display and general tracking
 
+# Analysis input. Level gating needs neither full bandwidth nor every sample:
+# a lower MIC_RATE or an ANALYSIS_STEP > 1 (RMS over every Nth sample) frees
+# CPU; python-test-files/sweep_analysis.py measures what it costs in accuracy
+MIC_RATE = 16000
+MIC_IBUF = 4000  # I2S DMA buffer in bytes (~125 ms at 16 kHz)
+FRAME_SAMPLES = 1024  # One analysed frame, 64 ms at 16 kHz
+ANALYSIS_STEP = 1
+FRAME_MS = FRAME_SAMPLES * 1000 // MIC_RATE
+
+# Preallocated ring of capture frames, filled by capture_thread()
+MIC_GAIN = 5  # Same gain as mic_test.py
+CAPTURE_SLOTS = 4  # ~256 ms of audio the analysis may fall behind by
+capture_ring = CaptureRing(FRAME_SAMPLES, CAPTURE_SLOTS, ANALYSIS_STEP)
+
+# Streaming filters run on each frame before its level (filters.py). The mic's
+# DC offset otherwise counts as sound and holds the RMS floor up; the gain
+# stays fused into the level pass (MIC_GAIN). Only with ADAPTIVE_LEVELS: the fixed
+# scale in rms_to_level() and THRESHOLD_RMS were measured with the offset in
+DC_BLOCK = True
+DC_CUTOFF_HZ = 5
+NOISE_GATE_LEVEL = 0  # Sample level that opens a noise gate, 0 = none (it hides the floor levels.py learns)
+
+# Band energies of each frame (bands.py), so the trigger can count speech
+# for more than HVAC hum or footsteps: the RMS it compares with the
+# threshold is scaled by the weighted energy share, 1.0 for flat weights
+BANDS = True
+BAND_EDGES_HZ = (60, 250, 500, 1000, 2000, 4000, 8000)
+BAND_WEIGHTS = (0.25, 1.0, 1.5, 1.5, 1.0, 0.5)  # Hum, low voice, speech core..., hiss
+BAND_FFT = 256      # FFT length; frames are analysed in FRAME_SAMPLES // BAND_FFT segments
+BAND_SEGMENTS = 0   # Segments analysed per frame (0 = all); fewer to save CPU
+bands = None
+if BANDS:
+    bands = BandAnalyzer(MIC_RATE, BAND_EDGES_HZ, BAND_WEIGHTS, BAND_FFT, FRAME_SAMPLES, BAND_SEGMENTS)
+speech_weight = 1.0  # bands.weighting() of the last frame
+
+# Preallocated playback blocks, kept filled from the SD card ahead of the speaker
+PLAY_BLOCK_BYTES = 4096  # 8 sectors, 128 ms at 16 kHz mono
+PLAY_BLOCKS = 3
+FADE_BLOCKS = 1  # Fade in on trigger / out on pause over one block (128 ms)
+CROSSFADE_BLOCKS = 8  # Crossfade between variants over ~1 s
+player = BlockPlayer(PLAY_BLOCK_BYTES, PLAY_BLOCKS, 16000 * 2)
+
+# Tracks are played from RAM (PSRAM) once loaded; anything past
+# ASSET_TRACK_BYTES streams from the card
+ASSET_CACHE_BYTES = 3 * 1024 * 1024
+ASSET_TRACK_BYTES = 1024 * 1024  # ~32 s at 16 kHz mono
+assets = AssetCache(ASSET_CACHE_BYTES, ASSET_TRACK_BYTES)
+
+# Held while the playback service is idle; start_audio_playback() releases it
+play_wake = _thread.allocate_lock()
+play_wake.acquire()
+
+# Configuration
+AUDIO_FILE = 'branches_med.raw' #branches_soft, branches_med, branches_loud
+
+# Intensity takes of the track, quietest first. Playback crossfades between
+# them, keeping its position, as the room level changes.
+VARIANT_FILES = ['branches_soft.raw', 'branches_med.raw', 'branches_loud.raw']
+# Level (0-100 between the room's floor and loud level, see rms_to_level())
+# above which the next variant up is chosen, so the choice follows the room and mic
+VARIANT_LEVELS = [35, 70]
+VARIANT_HOLD_MS = 640  # How long a new choice must last before switching
+VARIANT_HOLD = max(1, VARIANT_HOLD_MS // FRAME_MS)  # ... in frames
+variants = [AUDIO_FILE]  # The VARIANT_FILES found on the card
+variant_choice = 0
+variant_count = 0
+THRESHOLD_RMS = 750  # Used when ADAPTIVE_LEVELS is off
+
+# Trigger threshold and level scale follow the room's noise floor, learned as it
+# is heard (levels.py) and kept on the card so a reset doesn't start over
+ADAPTIVE_LEVELS = True
+THRESHOLD_DB = 10        # Trigger this far above the noise floor
+THRESHOLD_MIN_RMS = 200  # ... but never below this
+LEVELS_FILE = '/sd/levels.json'
+LEVELS_SAVE_S = 300  # Saved at most this often, and only once the floor has moved
+levels = LevelTracker(FRAME_MS, threshold_db=THRESHOLD_DB, min_threshold=THRESHOLD_MIN_RMS)
+levels_saved_ms = 0
+
+input_filters = FilterChain()
+if DC_BLOCK and ADAPTIVE_LEVELS:
+    input_filters.stages.append(DCBlocker(MIC_RATE, DC_CUTOFF_HZ))
+if NOISE_GATE_LEVEL:
+    input_filters.stages.append(NoiseGate(MIC_RATE, NOISE_GATE_LEVEL))
+if input_filters.stages:
+    capture_ring.filters = input_filters
+
+# Level by one lookup on the frame's sum of squares (levelmap.py) instead of
+# rms_to_level()'s float math; rebuilt from it when the calibration moves
+LEVEL_TABLE = True
+LEVEL_TABLE_DB = 0.5  # Floor/loud movement that triggers a rebuild
+LEVEL_TABLE_S = 5     # ... at most this often
+LEVEL_TABLE_BITS = 6  # 64 bins per octave of the mean square (~0.05 dB): 1664 bytes
+LEVEL_TABLE_MAX_ERROR = 2  # Levels; a narrower calibration than the bins resolve keeps the float path
+level_table = None
+level_table_bounds = (None, None)  # Floor and loud RMS the table was built for
+level_table_ms = 0
+
+# Console output: 0 = errors and start-up only, 1 = + playback events,
+# 2 = + a line per frame (slows the loop at REPL baud rates)
+DEBUG_LEVEL = 1
+
+# Binary status records on the console for python-test-files/telemetry_decode.py
+TELEMETRY = False
+TELEMETRY_HZ = 10
+telemetry = Telemetry(TELEMETRY_HZ)
+frame_ticks = 0  # ticks_us() when the frame being analysed arrived
+
+# Per-stage timing histograms; timing.report() at the REPL prints them.
+# Setting _TIMING to 0 compiles every timing call out of this file.
+_TIMING = const(1)
+TIMING_REPORT = True  # Also print the report at every watchdog check
+_T_I2S_READ = const(0)
+_T_FRAME_WAIT = const(1)
+_T_CLIP_TAP = const(2)
+_T_GAIN_RMS = const(3)
+_T_BANDS = const(4)
+_T_LEVEL = const(5)
+_T_PRINT = const(6)
+_T_TRIGGER = const(7)
+_T_PLAY_LOCK = const(8)
+_T_PLAY_WRITE = const(9)
+_T_TELEMETRY = const(10)
+_T_LOOP = const(11)
+STAGE_NAMES = ('i2s_read', 'frame_wait', 'clip_tap', 'gain_rms', 'bands', 'level', 'print',
+               'trigger', 'play_lock', 'play_write', 'telemetry', 'loop')
+timing = StageTimer(STAGE_NAMES) if _TIMING else None
+
+# Health monitor: each stage posts heartbeats, check_health() restarts only the one that stalls
+_H_CAPTURE = const(0)    # A mic frame read
+_H_ANALYSIS = const(1)   # A frame analysed
+_H_PLAYBACK = const(2)   # A real (not underrun) block written, only while playing
+HEALTH_NAMES = ('capture', 'analysis', 'playback')
+HEALTH_DEADLINES_MS = (500, 2000, 1000)  # Analysis waits on capture, so give capture the first go
+# machine.WDT timeout, fed only while every stage is healthy; 0 leaves it off.
+# It can't be stopped once started, so leave it off while developing; set it in the
+# field (e.g. 8000): it is what recovers a stage that never returns
+WDT_TIMEOUT_MS = 0
+# A mic read that never returns can't be interrupted (deinit() under a blocked
+# readinto() isn't safe), so a capture that misses its restart resets the board:
+# through the WDT if it runs, else with machine.reset(). False only logs it
+MIC_STUCK_RESET = True
+health = HealthMonitor(HEALTH_NAMES, HEALTH_DEADLINES_MS)
+mic_restart = False      # Set by the monitor, acted on by the capture loop
+mic_restart_beats = None  # health.beats of capture at the last restart request
+speaker_restart = False  # Set by the monitor, acted on by the playback service
+last_overruns = 0
+
+# 'thread': _thread workers polling shared flags (default)
+# 'async':  asyncio tasks on I2S streams, pause/resume signalled with events.
+#           SD reads (an uncached track tail) and clip writes then run on the event
+#           loop, a block at a time: a card stall longer than MIC_IBUF still drops
+#           mic audio there, so keep 'thread' with a slow card
+RUNTIME = 'thread'
+
+# Boot: with FAST_BOOT the REPL escape is a button or flag file checked once, not a 5 s wait
+FAST_BOOT = True
+# BOOT button on ESP32-S3 boards, low while pressed. Press and hold it just after
+# reset (held through reset it starts the ROM bootloader instead)
+SAFE_BOOT_PIN = 0
+SAFE_BOOT_FLAG = '/safe_boot'  # Or create this file, e.g. mpremote touch :safe_boot
+sd_card = None
+first_frame = True
+
 # These will track consistent trigger states
 above_threshold_count = 0  # Count of consecutive samples above threshold
 below_threshold_count = 0  # Count of consecutive samples below threshold
-ABOVE_THRESHOLD_REQUIRED = 20  # ~2 seconds worth of samples
-BELOW_THRESHOLD_REQUIRED = 1   # ~1 second worth of samples
+# Hysteresis in ms, counted in frames of whatever length FRAME_SAMPLES gives
+ABOVE_THRESHOLD_MS = 1280  # Sustained sound before playback starts
+BELOW_THRESHOLD_MS = 64    # Quiet before it pauses
+ABOVE_THRESHOLD_REQUIRED = max(1, ABOVE_THRESHOLD_MS // FRAME_MS)
+BELOW_THRESHOLD_REQUIRED = max(1, BELOW_THRESHOLD_MS // FRAME_MS)
+
+# Onset detection (onset.py) in place of ABOVE_THRESHOLD_MS: a CUSUM of each
+# frame's dB above the threshold plus its spectral flux confirms loud or
+# speech-like sound in a few frames and faint sound about as slowly as before.
+# python-test-files/onset_eval.py replays labelled recordings to tune it.
+ONSET_DETECTOR = True
+ONSET_DECIDE_DB = 24  # Evidence that confirms an onset, in dB summed over frames
+ONSET_CAP_DB = 8      # Most one frame adds, so the fastest onset is 3 frames (192 ms)
+ONSET_DRIFT_DB = 1    # Taken off every frame: sound must clear the threshold by this much
+ONSET_FLUX_GAIN = 0.5  # dB of novelty per dB of spectral flux (needs BANDS)
+onset = OnsetDetector(FRAME_MS, ONSET_DECIDE_DB, ONSET_CAP_DB, ONSET_DRIFT_DB, ONSET_FLUX_GAIN)
+spectral_flux = 0.0  # bands.flux() of the last frame
+
+# Pre-trigger clips (clips.py): the last CLIP_PRE_S seconds of mic audio stay in
+# a RAM ring (216 KB at 16 kHz), and each trigger, or a false-trigger mark from
+# MARK_PIN, saves them and CLIP_POST_S after to CLIP_DIR from a writer thread.
+# Frames are saved as captured, before gain and filters, so
+# python-test-files/onset_eval.py can replay them once labelled.
+CLIPS = True
+CLIP_PRE_S = 4
+CLIP_POST_S = 2
+CLIP_SLACK_S = 1  # How far the writer may fall behind (SD stalls) before frames are lost
+CLIP_DIR = '/sd/clips'
+# Button to GND, pressed after a false trigger; None = no button. Not SAFE_BOOT_PIN:
+# a press there around a reset would stop the monitor at the REPL instead
+MARK_PIN = 10
+clips = None
+if CLIPS:
+    clips = ClipRing(MIC_RATE, FRAME_SAMPLES, CLIP_PRE_S, CLIP_POST_S, CLIP_SLACK_S)
+mark_button = None
+mark_down = False
 
 # ===== INITIALIZATION FUNCTIONS =====
 
@@ -50,7 +272,6 @@ def init_sd_card():
                 pass
                 
         print("SD card mounted successfully")
-        print("SD contents:", os.listdir('/sd'))
         return sd
     except Exception as e:
         print("ERROR: SD card initialization failed:", e)
@@ -68,8 +289,8 @@ def init_mic():
     mode=I2S.RX,
     bits=16,
     format=I2S.MONO,
-            rate=16000,
-            ibuf=4000
+            rate=MIC_RATE,
+            ibuf=MIC_IBUF
         )
         print("Microphone initialized successfully")
         return microphone
@@ -106,6 +327,10 @@ def safe_cleanup():
     running = False
     audio_should_play = False
     audio_playing = False
+    capture_ring.stop()
+    wake_playback()
+    if clips:
+        clips.stop()
     
     # Wait for threads to stop
     time.sleep(1)
@@ -125,7 +350,10 @@ def safe_cleanup():
     except:
         pass
         
-    # Unmount SD card
+    # Unmount SD card, with the levels learned this run and any clip being written saved first
+    save_levels(force=True)
+    if clips:
+        clips.close()
     try:
         uos.umount('/sd')
         print("SD card unmounted")
@@ -136,129 +364,347 @@ def safe_cleanup():
 
 # ===== SOUND DETECTION =====
 
+def rms_to_level(rms):
+    """Map an RMS value to a 0-100 level with logarithmic scaling"""
+    if ADAPTIVE_LEVELS:
+        return levels.level(rms)  # Between the learned floor and loud level
+    min_rms = 3550
+    max_rms = 4100
+    
+    # Calculate normalized level with logarithmic scaling
+    if rms < min_rms:
+        return 0
+    elif rms > max_rms:
+        return 100
+    normalized_rms = (rms - min_rms) / (max_rms - min_rms)
+    return (math.log(1 + 9 * normalized_rms) / math.log(10)) * 100
+
+def refresh_level_table():
+    """Rebuild level_table from rms_to_level() (looked up on the sum of squares in
+    frame_level()'s scale) once the calibration has moved
+    LEVEL_TABLE_DB (at most every LEVEL_TABLE_S); the new table is swapped in whole,
+    or None (float path) if it can't hold LEVEL_TABLE_MAX_ERROR"""
+    global level_table, level_table_bounds, level_table_ms
+    if not LEVEL_TABLE:
+        return
+    bounds = (levels.floor, levels.loud) if ADAPTIVE_LEVELS else (0, 0)
+    if bounds[0] is None or bounds == level_table_bounds:
+        return
+    now = time.ticks_ms()
+    built = level_table_bounds[0]
+    if built is not None:
+        if time.ticks_diff(now, level_table_ms) < LEVEL_TABLE_S * 1000:
+            return
+        limit = 10 ** (LEVEL_TABLE_DB / 20)
+        moved = max(bounds[0] / built, built / bounds[0],
+                    bounds[1] / level_table_bounds[1], level_table_bounds[1] / bounds[1])
+        if moved < limit:
+            return
+    table = SquareTable('B', capture_ring.ms_scale, LEVEL_TABLE_BITS)
+    error = table.build(lambda ms: rms_to_level(math.sqrt(ms)))
+    level_table = table if error <= LEVEL_TABLE_MAX_ERROR else None
+    level_table_bounds = bounds
+    level_table_ms = now
+
+def reinit_mic():
+    global mic, mic_restart
+    mic_restart = False  # Whoever reinitialises, a pending restart is done
+    try:
+        if mic:
+            mic.deinit()
+        time.sleep(0.1)
+        mic = init_mic()
+    except:
+        print("Failed to reinitialize mic")
+        time.sleep(0.5)
+
+def capture_thread():
+    """Keep the mic DMA drained into capture_ring, whatever the analysis is doing"""
+    print("Capture thread starting")
+    while running:
+        try:
+            if _TIMING:
+                t = time.ticks_us()
+            capture_ring.fill(mic)
+            if _TIMING:
+                timing.lap(_T_I2S_READ, t)
+            health.beat(_H_CAPTURE)
+            if mic_restart:
+                reinit_mic()
+        except Exception as e:
+            print("ERROR in capture thread:", e)
+            health.fault(_H_CAPTURE)
+            reinit_mic()
+    capture_ring.stop()
+    print("Capture thread ended")
+
 def detect_sound():
-    global mic, last_readings, running, rms_history
+    global mic, last_readings, running, rms_history, frame_ticks, speech_weight, spectral_flux
     
     if not running:
         return 0, 0
         
     try:
-        # Read audio buffer
-        buf = bytearray(2048)
-        mic.readinto(buf)
-        
-        # Process samples with gain
-        samples = []
-        gain = 5  # Same gain as mic_test.py
-        for i in range(0, len(buf), 2):
-            # Get 16-bit sample
-            value = (buf[i+1] << 8) | buf[i]
-            if value & 0x8000:
-                value -= 0x10000
-            
-            # Apply gain and clamp
-            value = int(value * gain)
-            value = max(min(value, 32767), -32768)
-            
-            samples.append(value)
-        
-        # Calculate RMS value
-        rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples))
-        
-        # Dynamic scaling
-        min_rms = 3550
-        max_rms = 4100
+        if _TIMING:
+            t = time.ticks_us()
+        # Wait for the next captured frame; it stays in its ring slot until done()
+        frame = capture_ring.take()
+        if frame is None:
+            return 0, 0
+        frame_ticks = time.ticks_us()
+        if _TIMING:
+            t = timing.lap(_T_FRAME_WAIT, t)
+        if clips is not None:
+            clips.feed(frame)  # As captured, before the filters
+            if _TIMING:
+                t = timing.lap(_T_CLIP_TAP, t)
+        # Filter, then gain, clamp and square it in one pass
+        acc = capture_ring.process(frame, MIC_GAIN)
+        rms = math.sqrt(acc * capture_ring.ms_scale)
+        if _TIMING:
+            t = timing.lap(_T_GAIN_RMS, t)
+        if bands is not None:
+            bands.analyze(frame)
+            speech_weight = bands.weighting()
+            if ONSET_DETECTOR:
+                spectral_flux = bands.flux()
+            if _TIMING:
+                t = timing.lap(_T_BANDS, t)
+        capture_ring.done()
         
-        # Calculate normalized level with logarithmic scaling
-        if rms < min_rms:
-            normalized_level = 0
-        elif rms > max_rms:
-            normalized_level = 100
-        else:
-            normalized_rms = (rms - min_rms) / (max_rms - min_rms)
-            normalized_level = (math.log(1 + 9 * normalized_rms) / math.log(10)) * 100
+        normalized_level = frame_level(acc, rms)
+        if _TIMING:
+            t = timing.lap(_T_LEVEL, t)
         
         # Display counter information
-        print(f"Sound: {normalized_level:.1f}% | RMS: {rms:.1f} | Above: {above_threshold_count}/{ABOVE_THRESHOLD_REQUIRED} | Below: {below_threshold_count}/{BELOW_THRESHOLD_REQUIRED}")
+        if DEBUG_LEVEL >= 2:
+            print(f"Sound: {normalized_level:.1f}% | RMS: {rms:.1f} | Above: {above_threshold_count}/{ABOVE_THRESHOLD_REQUIRED} | Below: {below_threshold_count}/{BELOW_THRESHOLD_REQUIRED} | Speech: {speech_weight:.2f} | Onset: {onset.score:.0f}/{ONSET_DECIDE_DB} | Heap: {capture_ring.heap_delta}B | Overruns: {capture_ring.overruns}")
+        if _TIMING:
+            timing.lap(_T_PRINT, t)
         
         return normalized_level, rms
         
     except Exception as e:
         print("ERROR in detect_sound:", e)
-        try:
-            if mic:
-                mic.deinit()
-            time.sleep(0.1)
-            mic = init_mic()
-        except:
-            print("Failed to reinitialize mic")
         return 0, 0
 
+def frame_level(acc, rms):
+    """0-100 level of a frame from its scaled sum of squares and RMS, in the scale
+    the calibration was learned in: with ADAPTIVE_LEVELS that's the band-weighted
+    RMS handle_level() gives levels.update(), so hum alone doesn't read as loud"""
+    if ADAPTIVE_LEVELS:
+        rms *= speech_weight
+        acc = int(acc * speech_weight * speech_weight)
+    if level_table is not None:
+        return level_table.lookup(acc)
+    return rms_to_level(rms)
+
+def send_telemetry(level, rms):
+    """One telemetry record, at most TELEMETRY_HZ times a second"""
+    if not telemetry.due():
+        return
+    flags = 0
+    if audio_playing:
+        flags |= PLAYING
+    if audio_paused:
+        flags |= PAUSED
+    if track_source:
+        flags |= track_source.selected << VARIANT_SHIFT
+    telemetry.send(rms, level, above_threshold_count, below_threshold_count, flags,
+                   capture_ring.overruns, player.underruns,
+                   time.ticks_diff(time.ticks_us(), frame_ticks), capture_ring.heap_delta)
+
 # ===== AUDIO PLAYBACK =====
-def play_audio_thread(filename):
-    global audio_playing, audio_should_play, audio_paused, audio, running
+def load_variants():
+    """Find the track variants on the card and load them into the asset cache"""
+    global variants
+    files = os.listdir('/sd')
+    variants = [name for name in VARIANT_FILES if name in files]
+    if AUDIO_FILE not in variants:
+        variants = [AUDIO_FILE]
+    for name in variants:
+        assets.load(name)
+    print(f"Variants: {variants}")
+    print(f"Asset cache: {assets.stats_line()}")
+
+def open_track(filename):
+    """Source for filename that can crossfade to the other variants"""
+    global track_source
+    track_source = Mixer([assets.source(name) for name in variants],
+                         PLAY_BLOCK_BYTES, variants.index(filename))
+    return track_source
+
+def choose_variant(level):
+    """Switch to the variant for this level once it has held for VARIANT_HOLD frames"""
+    global variant_choice, variant_count
+    
+    choice = 0
+    while choice < len(VARIANT_LEVELS) and level > VARIANT_LEVELS[choice]:
+        choice += 1
+    choice = min(choice, len(variants) - 1)
     
+    if choice != variant_choice:
+        variant_choice = choice
+        variant_count = 0
+    variant_count += 1
+    if track_source and variant_count == VARIANT_HOLD and track_source.selected != choice:
+        if DEBUG_LEVEL >= 1:
+            print(f"Crossfading to {variants[choice]}")
+        track_source.crossfade(choice, CROSSFADE_BLOCKS)
+
+def wake_playback():
+    if play_event:
+        play_event.set()
+    else:
+        wake(play_wake)
+
+def note_first_sample():
+    """Report trigger-to-first-sample latency once the first block has been written"""
+    global trigger_us
+    if trigger_us is not None:
+        if DEBUG_LEVEL >= 1:
+            print(f"Trigger-to-first-sample: {time.ticks_diff(time.ticks_us(), trigger_us) / 1000:.1f} ms")
+        trigger_us = None
+
+def note_first_frame():
+    """Report time from reset to the first analysed frame"""
+    global first_frame
+    if first_frame:
+        first_frame = False
+        if DEBUG_LEVEL >= 1:
+            print(f"First frame analysed {time.ticks_ms()} ms after reset")
+
+def init_playback():
+    """SD card, speaker and variants: what playback needs and the analysis doesn't.
+    
+    Runs on the playback service, so the monitor is already listening
+    while the card mounts. Returns False, and stops the monitor, if
+    any of it fails.
+    """
+    global sd_card, audio, running
     try:
-        print(f"Audio thread starting for {filename}")
-        while audio_should_play and running:
+        sd_card = init_sd_card()
+        if ADAPTIVE_LEVELS and levels.load(LEVELS_FILE):
+            print(f"Levels restored: {levels.status_line()}")
+        if clips:
             try:
-                with open('/sd/' + filename, 'rb') as f:
-                    while audio_should_play and running:
-                        if not audio_paused:
-                            chunk = f.read(1024)
-                            if not chunk:  # End of file
-                                break  # Will restart from beginning
-                            try:
-                                audio.write(chunk)
-                                # Small yield to allow other operations
-                                time.sleep(0.001)
-                            except Exception as e:
-                                print(f"ERROR writing audio: {e}")
-                                break
-                        else:
-                            time.sleep(0.1)  # Pause
-                    
-                    if not audio_should_play or not running:
-                        break
-            except Exception as e:
-                print(f"ERROR opening audio file: {e}")
-                break
+                clips.enable(CLIP_DIR)
+            except OSError as e:
+                print(f"ERROR: no clips, {CLIP_DIR} unusable: {e}")
+        audio = init_speaker()
+        try:
+            os.stat('/sd/' + AUDIO_FILE)
+        except OSError:
+            print(f"ERROR: {AUDIO_FILE} not found on SD card!")
+            print("Available files:", os.listdir('/sd'))
+            raise
+        print(f"Using audio file: {AUDIO_FILE}")
+        # Load the variants now so the first trigger doesn't wait on the card
+        load_variants()
+        return True
     except Exception as e:
-        print(f"ERROR in audio playback thread: {e}")
-    finally:
-        # Thorough cleanup
-        with lock:
-            audio_playing = False
-            audio_should_play = False
-            audio_paused = False
+        print("CRITICAL ERROR during initialization:", e)
+        running = False
+        capture_ring.stop()
+        return False
+
+def playback_thread():
+    """Persistent playback service: the speaker I2S stays open the whole time.
+    
+    While paused or stopped nothing is written and the DMA clocks out
+    silence on its own, so a trigger only has to wake this thread.
+    Playback fades in on a trigger and out on a pause.
+    """
+    global audio_playing, audio_should_play, audio_paused, audio
+    
+    print("Playback service starting")
+    if not init_playback():
+        return
+    while running:
+        playing = audio_should_play and not audio_paused
+        if not playing and not (player.active and player.gain):
+            health.idle(_H_PLAYBACK)
+            play_wake.acquire()  # Idle until start_audio_playback()
+            continue
         try:
-            # Reset audio interface if needed
-            if audio and running:
-                audio.deinit()
-                time.sleep(0.1)
-                audio = init_speaker()
-        except:
-            pass
-        print("Audio thread ended and cleaned up")
+            if speaker_restart:
+                restart_speaker()  # The track reopens below
+            if playing:
+                if not player.active:
+                    health.beat(_H_PLAYBACK)  # Opening counts against the deadline too
+                    player.open(open_track(play_track), 0)
+                    player.prefetch()  # Start with every block full
+                    # SD reads happen on the prefetch thread, so this one only waits on I2S
+                    player.start_prefetch()
+                player.fade(GAIN_ONE, FADE_BLOCKS)
+            else:
+                player.fade(0, FADE_BLOCKS)  # Fade out, then go idle
+            if _TIMING:
+                t = time.ticks_us()
+            underruns = player.underruns
+            player.write_to(audio)
+            if _TIMING:
+                timing.lap(_T_PLAY_WRITE, t)
+            if player.underruns == underruns:
+                health.beat(_H_PLAYBACK)
+                if playing:
+                    note_first_sample()  # Once the first real block is in the DMA
+        except Exception as e:
+            print(f"ERROR in playback service: {e}")
+            health.fault(_H_PLAYBACK)
+            player.stop()
+            print(f"Playback: {player.stats_line()}")
+            with lock:
+                audio_playing = False
+                audio_should_play = False
+                audio_paused = False
+            try:
+                # Only a failure resets the audio interface
+                if audio and running:
+                    audio.deinit()
+                    time.sleep(0.1)
+                    audio = init_speaker()
+            except:
+                pass
+    player.stop()
+    print(f"Playback: {player.stats_line()}")
+    print("Playback service ended")
+
+def restart_speaker():
+    """Close the player and reopen the speaker I2S; the service reopens the track"""
+    global audio, speaker_restart
+    speaker_restart = False
+    player.stop()
+    print(f"Playback: {player.stats_line()}")
+    if audio:
+        audio.deinit()
+        time.sleep(0.1)
+        audio = init_speaker()
 
 def start_audio_playback(filename):
-    global audio_playing, audio_should_play, audio_paused
+    global audio_playing, audio_should_play, audio_paused, play_track, trigger_us
     
     if not running:
         return
         
+    if _TIMING:
+        t = time.ticks_us()
     with lock:
-        if audio_playing:
-            audio_paused = False
-            print("Resuming playback")
-            return
-            
+        if _TIMING:
+            timing.lap(_T_PLAY_LOCK, t)
+        resuming = audio_playing
         audio_should_play = True
         audio_paused = False
         audio_playing = True
+        play_track = filename
+        trigger_us = time.ticks_us()
     
-    print(f"Starting playback of {filename}")
-    _thread.start_new_thread(play_audio_thread, (filename,))
+    if DEBUG_LEVEL >= 1:
+        if resuming:
+            print("Resuming playback")
+        else:
+            print(f"Starting playback of {filename}")
+    wake_playback()
 
 def pause_audio_playback():
     global audio_paused, audio_playing
@@ -269,75 +715,234 @@ def pause_audio_playback():
     with lock:
         if audio_playing:
             audio_paused = True
-            print("Paused playback")
+            if play_event:
+                play_event.clear()
+            if DEBUG_LEVEL >= 1:
+                print("Paused playback")
 
 # ===== ERROR WATCHDOG =====
+def restart_analysis():
+    """The analysis can't be restarted from outside; shed its optional work instead"""
+    global DEBUG_LEVEL
+    if DEBUG_LEVEL > 1:
+        DEBUG_LEVEL = 1
+        print("Analysis falling behind: DEBUG_LEVEL lowered to 1")
+
+def request_mic_restart():
+    global mic_restart, mic_restart_beats
+    beats = health.beats[_H_CAPTURE]
+    if beats == mic_restart_beats:
+        # Not one frame read since the last restart was asked for: the capture
+        # is stuck inside readinto() and never got to the flag
+        mic_stuck()
+    mic_restart_beats = beats
+    mic_restart = True
+
+def mic_stuck():
+    """Last resort for a capture blocked in readinto(): reset the board"""
+    print("Health: capture stuck in a mic read")
+    if not MIC_STUCK_RESET:
+        return
+    if health.wdt:
+        return  # poll() stops feeding it while capture is late
+    print("Resetting")
+    save_levels(force=True)
+    machine.reset()
+
+def request_speaker_restart():
+    global speaker_restart
+    speaker_restart = True  # Only ever due while the service is writing
+
+health.on_restart(_H_CAPTURE, request_mic_restart)
+health.on_restart(_H_ANALYSIS, restart_analysis)
+health.on_restart(_H_PLAYBACK, request_speaker_restart)
+
+def check_health():
+    """Turn new capture overruns into an analysis fault, then poll the monitor"""
+    global last_overruns
+    overruns = capture_ring.overruns
+    if overruns != last_overruns:
+        if health.active[_H_ANALYSIS]:  # Not the ones from before the loop started
+            health.fault(_H_ANALYSIS)
+        last_overruns = overruns
+    health.poll()
+
+def start_wdt():
+    if WDT_TIMEOUT_MS:
+        health.wdt = machine.WDT(timeout=WDT_TIMEOUT_MS)
+        print(f"Hardware watchdog: {WDT_TIMEOUT_MS} ms")
+
+def save_levels(force=False):
+    """Keep the learned levels on the card: every LEVELS_SAVE_S at most, and
+    only once they've moved, to spare the card"""
+    global levels_saved_ms
+    if not (ADAPTIVE_LEVELS and sd_card and levels.changed()):
+        return
+    now = time.ticks_ms()
+    if not force and time.ticks_diff(now, levels_saved_ms) < LEVELS_SAVE_S * 1000:
+        return
+    try:
+        levels.save(LEVELS_FILE)
+        levels_saved_ms = now
+    except OSError as e:
+        print(f"ERROR saving levels: {e}")
+
+def mark_false_trigger():
+    """Save the last CLIP_PRE_S seconds as a false trigger (renames the clip of a
+    trigger still being written)"""
+    if DEBUG_LEVEL >= 1:
+        print("Marked as a false trigger")
+    clips.event('mark')
+
+def poll_mark_button():
+    """A press of MARK_PIN (low while pressed) is a false-trigger mark"""
+    global mark_button, mark_down
+    if mark_button is None:
+        mark_button = Pin(MARK_PIN, Pin.IN, Pin.PULL_UP)
+    down = mark_button.value() == 0
+    if down and not mark_down:
+        mark_false_trigger()
+    mark_down = down
+
+def periodic_check(counter):
+    """One watchdog tick (every 0.1 s, either runtime): health, level table and
+    mark button, plus a report every 300 ticks; returns the next counter"""
+    counter += 1
+    check_health()
+    refresh_level_table()
+    if clips and MARK_PIN is not None:
+        poll_mark_button()
+    if counter <= 300:  # 300 * 0.1s = 30 seconds
+        return counter
+    print(f"Watchdog check: {health.status_line()}")
+    if ADAPTIVE_LEVELS:
+        print(f"Levels: {levels.status_line()}")
+        save_levels()
+    if bands is not None:
+        print(f"Bands: {bands.status_line()} (speech weight {speech_weight:.2f})")
+    if level_table is not None:
+        print(f"Level table: within {level_table.max_error:.2f} of rms_to_level()")
+    if clips:
+        print(f"Clips: {clips.stats_line()}")
+    if _TIMING and TIMING_REPORT:
+        timing.report()
+    return 0
+
 def watchdog_thread():
     global running
     counter = 0
     
-    # Give system time to initialize
-    time.sleep(5)
+    # No start-up grace period needed: stages are only checked once they beat
+    start_wdt()
     
     while running:
-        counter += 1
-        # Every 30 seconds, check if system is responsive
-        if counter > 300:  # 300 * 0.1s = 30 seconds
-            print("Watchdog check")
-            counter = 0
-            # Add any health checks here
+        counter = periodic_check(counter)
         time.sleep(0.1)
 
 # ===== MAIN PROGRAM =====
 
+def trigger_threshold():
+    return levels.threshold if ADAPTIVE_LEVELS else THRESHOLD_RMS
+
+def print_threshold():
+    if ADAPTIVE_LEVELS:
+        print(f"RMS threshold: {THRESHOLD_DB} dB above the noise floor, at least {THRESHOLD_MIN_RMS}")
+    else:
+        print(f"RMS threshold: {THRESHOLD_RMS}")
+    if ONSET_DETECTOR:
+        print(f"Onset: CUSUM to {ONSET_DECIDE_DB} dB over the threshold, fastest {onset.min_latency_ms():.0f} ms")
+    else:
+        print(f"Onset: {ABOVE_THRESHOLD_MS} ms above the threshold")
+    if clips:
+        print(f"Clips: {clips.seconds():.1f} s before each trigger to {CLIP_DIR}")
+
+def handle_level(level, rms):
+    """Threshold checking with hysteresis: start or pause playback"""
+    global above_threshold_count, below_threshold_count
+    
+    playing = audio_playing and not audio_paused
+    if playing:
+        choose_variant(level)
+    rms *= speech_weight  # Gate on the band-weighted RMS
+    if ADAPTIVE_LEVELS:
+        levels.update(rms, not playing)  # No floor from our own playback
+    threshold = trigger_threshold()
+    if ONSET_DETECTOR:
+        sustained = onset.update(rms, threshold, spectral_flux)
+    
+    if rms > threshold:
+        if DEBUG_LEVEL >= 2:
+            print(f"Sound level above threshold")
+        above_threshold_count += 1
+        below_threshold_count = 0  # Reset counter when above threshold
+        
+        # Only start playback after sustained noise
+        if not ONSET_DETECTOR:
+            sustained = above_threshold_count >= ABOVE_THRESHOLD_REQUIRED
+        if sustained:
+            if not audio_playing or audio_paused:
+                if DEBUG_LEVEL >= 1:
+                    print(f"🔊 SUSTAINED TRIGGER: RMS={rms:.1f}, Above for {above_threshold_count} samples")
+                onset.reset()
+                if clips:
+                    clips.event('trig', f"{rms:.0f},{threshold:.0f}")
+                start_audio_playback(AUDIO_FILE)
+    else:
+        if DEBUG_LEVEL >= 2:
+            print(f"Sound level below threshold")
+        below_threshold_count += 1
+        above_threshold_count = 0  # Reset counter when below threshold
+        
+        # Quicker to pause after sound drops
+        if below_threshold_count >= BELOW_THRESHOLD_REQUIRED:
+            if audio_playing and not audio_paused:
+                if DEBUG_LEVEL >= 1:
+                    print(f"🔇 SUSTAINED QUIET: RMS={rms:.1f}, Below for {below_threshold_count} samples")
+                onset.reset()
+                pause_audio_playback()
+
+def analyse_frame():
+    """One frame through detection, the trigger and telemetry (either runtime)"""
+    level, rms = detect_sound()
+    health.beat(_H_ANALYSIS)
+    if first_frame:
+        note_first_frame()
+    
+    if _TIMING:
+        t = time.ticks_us()
+    handle_level(level, rms)
+    if _TIMING:
+        t = timing.lap(_T_TRIGGER, t)
+    if TELEMETRY:
+        send_telemetry(level, rms)
+    if _TIMING:
+        timing.lap(_T_TELEMETRY, t)
+        timing.lap(_T_LOOP, frame_ticks)
+
 def main():
-    global mic, audio, running, audio_playing, audio_paused, above_threshold_count, below_threshold_count
+    global mic, audio, running, audio_playing, audio_paused
     
     # Set up watchdog thread for safety
     _thread.start_new_thread(watchdog_thread, ())
     
-    print("\n=== Ambient Sound Monitor - Starting ===")
+    # Capture runs on its own thread so slow iterations don't drop audio
+    _thread.start_new_thread(capture_thread, ())
     
-    # Configuration
-    AUDIO_FILE = 'branches_med.raw' #branches_soft, branches_med, branches_loud
-    THRESHOLD_RMS = 750
+    # Playback service brings up the SD card and speaker, then idles until the first trigger
+    _thread.start_new_thread(playback_thread, ())
     
-    # Verify audio file exists
-    if AUDIO_FILE not in os.listdir('/sd'):
-        print(f"ERROR: {AUDIO_FILE} not found on SD card!")
-        print("Available files:", os.listdir('/sd'))
-        return
+    # Clips go to the card from their own thread, never from the analysis
+    if clips:
+        _thread.start_new_thread(clips.run, ())
     
-    print(f"Using audio file: {AUDIO_FILE}")
-    print(f"RMS threshold: {THRESHOLD_RMS}")
+    print("\n=== Ambient Sound Monitor - Starting ===")
+    print_threshold()
     
     try:
         print("Starting main monitoring loop")
         while running:
             try:
-                level, rms = detect_sound()
-                
-                # Threshold checking with hysteresis
-                if rms > THRESHOLD_RMS:
-                    print(f"Sound level above threshold")
-                    above_threshold_count += 1
-                    below_threshold_count = 0  # Reset counter when above threshold
-                    
-                    # Only start playback after sustained noise
-                    if above_threshold_count >= ABOVE_THRESHOLD_REQUIRED:
-                        if not audio_playing or audio_paused:
-                            print(f"🔊 SUSTAINED TRIGGER: RMS={rms:.1f}, Above for {above_threshold_count} samples")
-                            start_audio_playback(AUDIO_FILE)
-                else:
-                    print(f"Sound level below threshold")
-                    below_threshold_count += 1
-                    above_threshold_count = 0  # Reset counter when below threshold
-                    
-                    # Quicker to pause after sound drops
-                    if below_threshold_count >= BELOW_THRESHOLD_REQUIRED:
-                        if audio_playing and not audio_paused:
-                            print(f"🔇 SUSTAINED QUIET: RMS={rms:.1f}, Below for {below_threshold_count} samples")
-                            pause_audio_playback()
+                analyse_frame()
             except Exception as e:
                 print(f"ERROR in loop iteration: {e}")
                 import sys
@@ -358,6 +963,7 @@ def main():
             audio_should_play = False
             audio_playing = False
             audio_paused = False
+        wake_playback()
         
         # Longer delay for cleanup
         time.sleep(1.0)  
@@ -365,49 +971,216 @@ def main():
         # Final hardware shutdown
         safe_cleanup()
 
+# ===== ASYNC RUNTIME =====
+# Same capture ring, analysis and trigger logic as main(), but as asyncio
+# tasks: I2S is awaited as a stream instead of blocking a thread, and
+# playback waits on play_event instead of polling audio_paused.
+
+frame_ready = None  # asyncio.Event set by capture_task() for each frame
+
+def i2s_stream(i2s):
+    """asyncio stream over an I2S object (the host emulation supplies its own)"""
+    if hasattr(i2s, 'asyncio_stream'):
+        return i2s.asyncio_stream()
+    return asyncio.StreamReader(i2s)
+
+async def read_frame(reader, view, nbytes):
+    # The ring's own slot view, read whole; only the rest of a partial
+    # read (a stream read may return part of the frame) needs a slice
+    got = await reader.readinto(view)
+    while got < nbytes:
+        got += await reader.readinto(view[got >> 1:])
+
+async def capture_task():
+    reader = i2s_stream(mic)
+    nbytes = capture_ring.frame_samples * 2
+    while running:
+        try:
+            if _TIMING:
+                t = time.ticks_us()
+            await read_frame(reader, capture_ring.next_slot(), nbytes)
+            if _TIMING:
+                timing.lap(_T_I2S_READ, t)
+            capture_ring.commit()
+            frame_ready.set()
+            health.beat(_H_CAPTURE)
+            if mic_restart:
+                reinit_mic()
+                reader = i2s_stream(mic)
+        except Exception as e:
+            print("ERROR in capture task:", e)
+            health.fault(_H_CAPTURE)
+            reinit_mic()
+            reader = i2s_stream(mic)
+
+async def playback_task():
+    global audio_playing, audio_should_play, audio_paused
+    
+    if not init_playback():
+        return
+    # Same persistent service as playback_thread(): the writer stays open
+    writer = i2s_stream(audio)
+    try:
+        while running:
+            playing = audio_should_play and play_event.is_set()
+            if not playing and not (player.active and player.gain):
+                health.idle(_H_PLAYBACK)
+                # Sleeps here until start_audio_playback() sets the event
+                await play_event.wait()
+                if not audio_should_play:
+                    play_event.clear()
+                continue
+            try:
+                if speaker_restart:
+                    restart_speaker()
+                    writer = i2s_stream(audio)
+                if playing:
+                    if not player.active:
+                        health.beat(_H_PLAYBACK)
+                        player.open(open_track(play_track), 0)
+                        player.prefetch()  # Start with every block full
+                    player.fade(GAIN_ONE, FADE_BLOCKS)
+                else:
+                    player.fade(0, FADE_BLOCKS)  # Fade out, then go idle
+                # No thread to prefetch on: one block between drains, as many as are
+                # played, so a read from the card holds up the loop for one block at most
+                player.prefetch(1)
+                # Setting out_buf directly avoids a copy in write()
+                underruns = player.underruns
+                writer.out_buf = player.next_block()
+                await writer.drain()
+                player.done()
+                if player.underruns == underruns:
+                    health.beat(_H_PLAYBACK)
+                    if playing:
+                        note_first_sample()
+            except Exception as e:
+                print(f"ERROR in playback task: {e}")
+                health.fault(_H_PLAYBACK)
+                player.stop()
+                print(f"Playback: {player.stats_line()}")
+                with lock:
+                    audio_playing = False
+                    audio_should_play = False
+                    audio_paused = False
+                play_event.clear()
+    finally:
+        player.stop()
+        print(f"Playback: {player.stats_line()}")
+
+async def clip_task():
+    # No thread to write on: a batch at most between frames, so the capture keeps
+    # its turn. An SD stall longer than MIC_IBUF still holds up the whole loop;
+    # the thread runtime doesn't have that problem
+    while running:
+        clips.service(clips.batch)
+        await asyncio.sleep(FRAME_MS / 1000)
+
+async def watchdog_task():
+    start_wdt()
+    counter = 0
+    while running:
+        counter = periodic_check(counter)
+        await asyncio.sleep(0.1)
+
+async def main_async():
+    global running, play_event, frame_ready
+    
+    play_event = asyncio.Event()
+    frame_ready = asyncio.Event()
+    
+    print("\n=== Ambient Sound Monitor - Starting (asyncio) ===")
+    print_threshold()
+    
+    # playback_task() brings up the SD card and speaker once capture is under way
+    tasks = [
+        asyncio.create_task(capture_task()),
+        asyncio.create_task(playback_task()),
+        asyncio.create_task(watchdog_task()),
+    ]
+    if clips:
+        tasks.append(asyncio.create_task(clip_task()))
+    try:
+        print("Starting main monitoring loop")
+        while running:
+            try:
+                # Frames come from the ring, so this never blocks the capture
+                while not capture_ring.pending():
+                    frame_ready.clear()
+                    await frame_ready.wait()
+                analyse_frame()
+            except Exception as e:
+                print(f"ERROR in loop iteration: {e}")
+                import sys
+                sys.print_exception(e)  # Print full exception details
+    finally:
+        running = False
+        play_event.set()  # Let playback_task() see running is False
+        for task in tasks:
+            task.cancel()
+
 # ===== SAFE BOOT DETECTION =====
 
 # Allow interruption during boot
 def safe_boot():
-    print("Safe boot: Press any key in 5 seconds to enter REPL mode...")
+    """True if startup should stop here and leave the REPL to the user"""
+    if FAST_BOOT:
+        # No waiting: the button or the flag file is checked once
+        if Pin(SAFE_BOOT_PIN, Pin.IN, Pin.PULL_UP).value() == 0:
+            print("Safe boot: button held - entering REPL mode")
+            return True
+        try:
+            os.stat(SAFE_BOOT_FLAG)
+        except OSError:
+            return False
+        print(f"Safe boot: {SAFE_BOOT_FLAG} found - entering REPL mode (delete it to start normally)")
+        return True
+    
+    print("Safe boot: Press Ctrl-C in 5 seconds to enter REPL mode...")
     for i in range(50):
         print(".", end="")
-        # Check for keypress (can't detect directly, but can add button check)
         time.sleep(0.1)
     print("\nContinuing with normal startup")
+    return False
 
 # ===== PROGRAM ENTRY POINT =====
-
-try:
-    # First thing: enable safe boot option
-    safe_boot()
-    
-    # Sequential initialization with better error handling
-    print("Initializing hardware components...")
+def run():
+    """Start the monitor; returns to the REPL when it stops"""
+    global mic
     try:
-        sd_card = init_sd_card()
-        time.sleep(0.5)
-        
-        mic = init_mic()
-        time.sleep(0.5)
-        
-        audio = init_speaker()
-        time.sleep(0.5)
+        # First thing: enable safe boot option
+        if safe_boot():
+            raise KeyboardInterrupt
+    
+        # Only the mic is needed to start listening; the SD card and
+        # speaker come up on the playback service meanwhile
+        print("Initializing hardware components...")
+        try:
+            mic = init_mic()
         
-        print("All hardware initialized successfully")
+            # Start main program
+            if RUNTIME == 'async' and asyncio:
+                try:
+                    asyncio.run(main_async())
+                except KeyboardInterrupt:
+                    print("\nMonitoring stopped by user")
+            else:
+                main()
         
-        # Start main program
-        main()
+        except Exception as e:
+            print("CRITICAL ERROR during initialization:", e)
+            safe_cleanup()
         
-    except Exception as e:
-        print("CRITICAL ERROR during initialization:", e)
+    except KeyboardInterrupt:
+        # Safe boot, or Ctrl-C during initialization
+        print("\nStartup interrupted - entering REPL mode")
+        # Don't start the program
+    
+    finally:
+        # Final cleanup if we get here
         safe_cleanup()
-        
-except KeyboardInterrupt:
-    # Catch keyboard interrupt during initialization
-    print("\nStartup interrupted by user - entering REPL mode")
-    # Don't start the program
-    
-finally:
-    # Final cleanup if we get here
-    safe_cleanup()
+
+# Runs as __main__ on boot; importing main (benchmarks, emulation) skips it.
+# The precompiled build imports this module as monitor and calls run()
+if __name__ == '__main__':
+    run()
@@ -4,6 +4,12 @@ import time
 import os
 import uos
 import math
+from array import array
+import dsp
+from levelmap import SquareTable
+from recorder import StreamRecorder, WAV_HEADER_BYTES
+from sdwriter import SDWriter
+from filters import FilterChain, DCBlocker, NoiseGate, Gain
 
 print("=== INMP441 I2S MEMS Microphone Test Script ===")
 # exec(open('mic_test.py').read())
@@ -22,6 +28,22 @@ MIC_NOISE_DB = 29     # dB - Noise floor
 # Calculate reference amplitude value
 MIC_REF_AMPL = math.pow(10, MIC_SENSITIVITY/20) * ((1<<(MIC_BITS-1))-1)
 
+# Streaming recorder: 32-bit stereo slots in, 16-bit mono WAV out
+MIC_IBUF = 32000     # I2S DMA buffer in bytes, 100 ms of 40 kHz stereo 32-bit
+RECORD_SHIFT = 16    # The INMP441's 24 bits sit at the top of the 32-bit slot; keep the top 16
+RECORD_CHUNK = 2048  # Frames per read: 51 ms at 40 kHz, written as one 4 KB (8-sector) block
+NOISE_GATE = 100     # Noise filter: closes once the level (after gain) stays below this...
+NOISE_GATE_OPEN = 150  # ... and opens again above this
+NOISE_GATE_HOLD_MS = 50  # How long it stays open after the level drops
+DC_CUTOFF_HZ = 5     # DC blocker corner
+recorder = StreamRecorder(SAMPLE_RATE, RECORD_CHUNK, 2, SAMPLE_BITS, RECORD_SHIFT, MIC_IBUF)
+
+# Chunks go to the card from a writer thread (sdwriter.py), never from the record loop
+WRITE_BLOCKS = 16    # Pool of one-chunk blocks: 64 KB, 0.8 s of recording the card may lag by
+WRITE_BATCH = 4      # Blocks per f.write(): 16 KB, 32 sectors
+WRITE_FLUSH_MS = 1000  # Flush the file this often
+writer = SDWriter(RECORD_CHUNK * 2, WRITE_BLOCKS, WRITE_BATCH, WRITE_FLUSH_MS)
+
 # Initialize SD card
 def init_sd():
     print("Initializing SD card...")
@@ -80,7 +102,7 @@ def init_mic():
         bits=SAMPLE_BITS,   # 32-bit samples
         format=I2S.STEREO,  # Changed to STEREO to match I2S_CHANNEL_FMT_RIGHT_LEFT
         rate=SAMPLE_RATE,   # 40kHz sample rate
-        ibuf=4096          # Increased buffer size (4 * 1024 to match dma_buf_count * dma_buf_len)
+        ibuf=MIC_IBUF       # Room for the recorder to fall behind by ~100 ms
     )
 
 # Initialize speaker
@@ -94,32 +116,40 @@ def init_speaker():
         mode=I2S.TX,
         bits=16,
         format=I2S.MONO,
-        rate=16000,
+        rate=SAMPLE_RATE,  # What the recordings were made at
         ibuf=4000
     )
 
-def apply_noise_filter(samples, threshold=100):
-    """Apply a simple noise filter to remove low-amplitude noise"""
-    filtered = []
-    for sample in samples:
-        if abs(sample) > threshold:
-            filtered.append(sample)
-        else:
-            filtered.append(0)
-    return filtered
+def apply_noise_filter(samples, threshold=NOISE_GATE):
+    """Apply a simple noise filter to remove low-amplitude noise (in place)"""
+    dsp.noise_gate(samples, len(samples), threshold)
+    return samples
+
+# dB tables by chunk length, each mapping that chunk's sum of squares to dB
+_db_tables = {}
+
+def _db_table(n):
+    """(table, shift) for n-sample chunks, built on first use"""
+    entry = _db_tables.get(n)
+    if entry is None:
+        shift = dsp.frame_shift(n)
+        scale = (1 << shift) / n
+        # Samples are the top 16 bits of the 32-bit slot, so the reference scales down with them
+        offset = MIC_OFFSET_DB + MIC_REF_DB - 20 * math.log10(MIC_REF_AMPL / (1 << RECORD_SHIFT))
+        table = SquareTable('h', scale)
+        # In 0.1 dB steps; a sum of 0 never looks the table up
+        table.build(lambda ms: offset + 10 * math.log10(max(ms, scale)), 0.1)
+        entry = _db_tables[n] = (table, shift)
+    return entry
 
 def calculate_dB(samples):
-    """Calculate dB value from samples"""
-    # Calculate RMS
-    rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples))
-    
-    # Calculate dB relative to reference
-    if rms > 0:
-        db = MIC_OFFSET_DB + MIC_REF_DB + 20 * math.log10(rms / MIC_REF_AMPL)
-    else:
-        db = -float('inf')
-    
-    return db
+    """Calculate dB value from samples (within 0.2 dB, by table lookup)"""
+    n = len(samples)
+    table, shift = _db_table(n)
+    acc = dsp.sum_squares(samples, n, shift)
+    if acc == 0:
+        return -float('inf')
+    return table.lookup(acc) / 10
 
 def analyze_raw_samples(buffer, num_samples=10):
     """Analyze raw samples from the buffer before any processing"""
@@ -169,7 +199,7 @@ def analyze_noise_characteristics(samples):
     # Calculate basic statistics
     abs_samples = [abs(s) for s in samples]
     mean = sum(abs_samples) / len(abs_samples)
-    rms = math.sqrt(sum(s * s for s in samples) / len(samples))
+    rms = dsp.rms(samples, len(samples))
     
     # Count samples above different thresholds
     thresholds = [100, 200, 500, 1000, 2000]
@@ -190,97 +220,46 @@ def analyze_noise_characteristics(samples):
         print(f"Signal-to-Noise Ratio: {snr:.2f} dB")
 
 def record_to_file(filename, duration_seconds=3, apply_gain=False, gain=2, noise_filter=True):
+    """Stream duration_seconds of the mic to /sd/filename as a 16-bit WAV"""
     print(f"Recording for {duration_seconds} seconds directly to {filename}")
     print(f"Settings: gain={'ON' if apply_gain else 'OFF'} ({gain}x), noise filter: {'ON' if noise_filter else 'OFF'}")
     
-    # Calculate number of samples
-    total_samples = SAMPLE_RATE * duration_seconds
-    samples_recorded = 0
+    # One look at the signal before the clock starts (record() drains what this costs)
+    recorder.read(mic)
+    recorder.convert()
+    analyze_raw_samples(recorder.raw)
+    visualize_signal(recorder.samples[:50])  # Show first 50 samples
+    noise_analysis_buffer = recorder.samples[:1000]  # Unfiltered, for the noise analysis
     
-    # Buffer for DC offset calculation
-    dc_buffer = []
-    dc_samples = 1000  # Number of samples to use for DC offset calculation
+    # DC blocker, gain, gate: each chunk in place, state carried across chunks
+    dc_blocker = DCBlocker(SAMPLE_RATE, DC_CUTOFF_HZ)
+    dc_blocker.prime(recorder.samples, recorder.chunk_frames)
+    filters = FilterChain(dc_blocker)
+    if apply_gain:
+        filters.stages.append(Gain(gain))
+    if noise_filter:
+        filters.stages.append(NoiseGate(SAMPLE_RATE, NOISE_GATE_OPEN, NOISE_GATE, NOISE_GATE_HOLD_MS))
     
-    # Buffer for noise analysis
-    noise_analysis_buffer = []
+    def progress(rec):
+        # Once a second, not per chunk: console output at REPL baud rates costs real time
+        print(f"Recording: {rec.frames // SAMPLE_RATE} s, {calculate_dB(rec.chunk):.1f} dB, "
+              f"{rec.dropped} frames dropped, {writer.queued()} blocks queued")
     
     try:
-        with open(f'/sd/{filename}', 'wb') as f:
-            # Record in chunks
-            while samples_recorded < total_samples * 2:  # *2 because each output sample is 2 bytes
-                buffer = bytearray(4096)  # For 32-bit samples (1024 samples)
-                # Read audio samples from the microphone
-                mic.readinto(buffer)
-                
-                # Analyze raw samples for the first chunk
-                if samples_recorded == 0:
-                    analyze_raw_samples(buffer)
-                
-                # Process samples - convert from 32-bit to 16-bit
-                amplified = bytearray(len(buffer) // 2)  # Output buffer for 16-bit samples
-                
-                # Process samples in this chunk
-                chunk_samples = []
-                for i in range(0, len(buffer), 8):  # Changed to 8 bytes (32-bit * 2 channels)
-                    # Extract the 32-bit value from buffer
-                    value = (buffer[i+3] << 24) | (buffer[i+2] << 16) | (buffer[i+1] << 8) | buffer[i]
-                    
-                    # Convert to signed 32-bit
-                    if value & 0x80000000:
-                        value -= 0x100000000
-                    
-                    # Store sample for DC offset calculation
-                    if len(dc_buffer) < dc_samples:
-                        dc_buffer.append(value)
-                    
-                    # Store sample for noise analysis
-                    if len(noise_analysis_buffer) < 1000:  # Store up to 1000 samples for analysis
-                        noise_analysis_buffer.append(value)
-                    
-                    # Apply gain if enabled
-                    if apply_gain:
-                        value = int(value * gain)
-                    
-                    # Clamp to 16-bit range
-                    value = max(min(value, 32767), -32768)
-                    
-                    chunk_samples.append(value)
-                
-                # Calculate DC offset from buffer
-                if len(dc_buffer) >= dc_samples:
-                    dc_offset = sum(dc_buffer) / len(dc_buffer)
-                    # Apply DC offset correction to chunk samples
-                    chunk_samples = [int(s - dc_offset) for s in chunk_samples]
-                
-                # Apply noise filter if enabled
-                if noise_filter:
-                    chunk_samples = apply_noise_filter(chunk_samples)
-                
-                # Calculate dB value for this chunk
-                db = calculate_dB(chunk_samples)
-                print(f"Current dB: {db:.1f}")
-                
-                # Visualize signal for the first chunk
-                if samples_recorded == 0:
-                    visualize_signal(chunk_samples[:50])  # Show first 50 samples
-                
-                # Convert samples to bytes and write to file
-                for i, sample in enumerate(chunk_samples):
-                    out_idx = i * 2
-                    amplified[out_idx] = sample & 0xFF
-                    amplified[out_idx + 1] = (sample >> 8) & 0xFF
-                
-                # Write processed data
-                f.write(amplified[:len(chunk_samples) * 2])
-                samples_recorded += len(chunk_samples)
-                
-                # Print progress
-                progress = (samples_recorded / total_samples) * 100
-                print(f"Recording progress: {progress:.1f}%")
+        writer.start()
+        recorder.record(mic, writer, f'/sd/{filename}', SAMPLE_RATE * duration_seconds,
+                        filters.process, progress)
+        
+        print(f"Recorder: {recorder.stats_line()}")
+        print(f"SD writer: {writer.stats_line()}")
+        if recorder.dropped:
+            print(f"WARNING: {recorder.dropped} frames dropped - the recording has gaps")
+        if recorder.stalled:
+            print(f"WARNING: {recorder.stalled} frames lost waiting for the SD card - "
+                  f"raise WRITE_BLOCKS")
         
         # Analyze noise characteristics after recording
-        if noise_analysis_buffer:
-            analyze_noise_characteristics(noise_analysis_buffer)
+        analyze_noise_characteristics(noise_analysis_buffer)
         
         print("Recording complete!")
         return True
@@ -295,6 +274,8 @@ def play_from_file(filename):
     print(f"Playing audio from {filename}...")
     try:
         with open(f'/sd/{filename}', 'rb') as f:
+            if filename.endswith('.wav'):
+                f.seek(WAV_HEADER_BYTES)
             # Read and play in chunks
             while True:
                 chunk = f.read(1024)  # Read 1KB at a time
@@ -325,20 +306,18 @@ def analyze_samples(filename, offset_seconds=1, num_samples=20):
     
     try:
         with open(f'/sd/{filename}', 'rb') as f:
-            # Calculate offset in bytes (16000 samples/sec * 2 bytes/sample)
-            offset_bytes = int(offset_seconds * 16000 * 2)
+            # Calculate offset in bytes (2 bytes/sample, after the WAV header)
+            offset_bytes = int(offset_seconds * SAMPLE_RATE * 2)
+            if filename.endswith('.wav'):
+                offset_bytes += WAV_HEADER_BYTES
             f.seek(offset_bytes)
             
             # Read a chunk of samples
             data = f.read(num_samples * 2)  # 2 bytes per sample
             
             # Convert to samples and print
-            samples = []
-            for i in range(0, len(data), 2):
-                sample = (data[i+1] << 8) | data[i]
-                if sample & 0x8000:
-                    sample -= 0x10000
-                samples.append(sample)
+            samples = array('h', bytearray(len(data)))
+            dsp.decode_pcm16(data, samples, len(data) // 2)
             
             # Print analysis
             print("\nSample Analysis:")
@@ -363,70 +342,78 @@ def analyze_samples(filename, offset_seconds=1, num_samples=20):
 
 def compute_rms(samples):
     """Calculate RMS value from a list of samples"""
-    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+    return dsp.rms(samples, len(samples))
 
 # Main test sequence
-try:
-    # Initialize hardware
-    sd = init_sd()
-    mic = init_mic()
-    speaker = init_speaker()
+def run():
+    global sd, mic, speaker
+    try:
+        # Initialize hardware
+        sd = init_sd()
+        mic = init_mic()
+        speaker = init_speaker()
     
-    print("\nStarting INMP441 microphone test sequence...")
+        print("\nStarting INMP441 microphone test sequence...")
     
-    # Test with different gain levels
-    gain_levels = [2, 5, 10]
-    for gain in gain_levels:
-        print(f"\nRecording with {gain}x gain and noise filter...")
-        filename = f'mic_test_{gain}x.raw'
-        if record_to_file(filename, duration_seconds=3, 
-                         apply_gain=True, gain=gain, noise_filter=True):
+        # Test with different gain levels
+        gain_levels = [2, 5, 10]
+        for gain in gain_levels:
+            print(f"\nRecording with {gain}x gain and noise filter...")
+            filename = f'mic_test_{gain}x.wav'
+            if record_to_file(filename, duration_seconds=3, 
+                             apply_gain=True, gain=gain, noise_filter=True):
             
-            # Analyze recording
-            print(f"\n=== SAMPLE ANALYSIS for {gain}x gain ===")
-            samples = analyze_samples(filename)
+                # Analyze recording
+                print(f"\n=== SAMPLE ANALYSIS for {gain}x gain ===")
+                samples = analyze_samples(filename)
             
-            if samples:
-                # Calculate RMS value
-                rms = compute_rms(samples)
-                print(f"\n=== RMS VALUE ===")
-                print(f"RMS: {rms:.2f}")
+                if samples:
+                    # Calculate RMS value
+                    rms = compute_rms(samples)
+                    print(f"\n=== RMS VALUE ===")
+                    print(f"RMS: {rms:.2f}")
             
-            # Play back recording
-            print(f"\n=== PLAYBACK for {gain}x gain ===")
-            print("Playing recording...")
-            play_from_file(filename)
-            time.sleep(1)  # Wait between playbacks
+                # Play back recording
+                print(f"\n=== PLAYBACK for {gain}x gain ===")
+                print("Playing recording...")
+                play_from_file(filename)
+                time.sleep(1)  # Wait between playbacks
     
-    print("\nINMP441 microphone test sequence complete!")
-    print("\nThe recordings have been saved with different gain levels.")
-    print("Check the noise analysis output to determine the best gain setting.")
-    print("If the recordings are too noisy, try:")
-    print("1. Increasing the noise filter threshold")
-    print("2. Using a lower gain value")
-    print("3. Checking the physical connections")
-    print("4. Ensuring the microphone is properly powered")
+        print("\nINMP441 microphone test sequence complete!")
+        print("\nThe recordings have been saved with different gain levels.")
+        print("Check the noise analysis output to determine the best gain setting.")
+        print("If the recordings are too noisy, try:")
+        print("1. Increasing the noise filter threshold")
+        print("2. Using a lower gain value")
+        print("3. Checking the physical connections")
+        print("4. Ensuring the microphone is properly powered")
 
-except Exception as e:
-    print("Error in test sequence:", e)
-    import sys
-    sys.print_exception(e)  # Print full traceback
+    except Exception as e:
+        print("Error in test sequence:", e)
+        import sys
+        sys.print_exception(e)  # Print full traceback
 
-finally:
-    # Clean up
-    try:
-        mic.deinit()
-    except:
-        pass
+    finally:
+        # Clean up
+        writer.stop()
+        try:
+            mic.deinit()
+        except:
+            pass
     
-    try:
-        speaker.deinit()
-    except:
-        pass
+        try:
+            speaker.deinit()
+        except:
+            pass
     
-    try:
-        uos.umount('/sd')
-    except:
-        pass
+        try:
+            uos.umount('/sd')
+        except:
+            pass
     
-    print("Test cleanup complete.") 
\ No newline at end of file
+        print("Test cleanup complete.") 
+
+# Runs as __main__ from exec() or the board; importing mic_test skips it
+# (with the precompiled build: import mic_test; mic_test.run())
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,98 @@
+from array import array
+
+import dsp
+from dsp import GAIN_ONE
+
+
+class Mixer:
+    """Mixes several 16-bit mono sources into one, each with its own gain ramp.
+
+    A source for BlockPlayer: readinto() reads every audible source into
+    its own preallocated block, adds it into a 32-bit accumulator at its
+    Q23 gain (stepped per sample while ramping) and saturates the sum
+    back to PCM16 in the caller's block. Silent sources aren't read, and
+    when one fades back in it is first moved to the mix position.
+    Ramps run over whole blocks.
+    """
+
+    def __init__(self, sources, block_bytes, selected=0):
+        count = len(sources)
+        self.sources = sources
+        self.block_bytes = block_bytes
+        self.acc = array('i', bytearray(block_bytes * 2))
+        self.bufs = [memoryview(bytearray(block_bytes)) for _ in range(count)]
+        # Views of bufs for reads shorter than a block, rebuilt only when that length changes
+        self.short_bufs = self.bufs
+        self.short_bytes = block_bytes
+        self.gains = [GAIN_ONE if i == selected else 0 for i in range(count)]
+        self.targets = list(self.gains)
+        self.ramp_blocks = [0] * count
+        self.selected = selected
+        self.crossfades = 0
+
+    def fade(self, index, target, blocks=1):
+        """Ramp one source to a Q23 gain over the next blocks"""
+        self.targets[index] = target
+        self.ramp_blocks[index] = max(1, blocks)
+
+    def crossfade(self, index, blocks=1):
+        """Fade index up to unity and every other source out"""
+        for i in range(len(self.sources)):
+            self.fade(i, GAIN_ONE if i == index else 0, blocks)
+        self.selected = index
+        self.crossfades += 1
+
+    def readinto(self, view):
+        nbytes = min(len(view), self.block_bytes)
+        n = nbytes >> 1
+        bufs = self.bufs
+        if nbytes < self.block_bytes:
+            if nbytes != self.short_bytes:
+                self.short_bufs = [buf[:nbytes] for buf in self.bufs]
+                self.short_bytes = nbytes
+            bufs = self.short_bufs
+
+        # Where the mix is: any source that was audible last block
+        pos = None
+        for i in range(len(self.sources)):
+            if self.gains[i]:
+                pos = self.sources[i].tell()
+                break
+
+        for i in range(len(self.sources)):
+            gain = self.gains[i]
+            target = self.targets[i]
+            if not gain and not target:
+                continue
+            source = self.sources[i]
+            if not gain and pos is not None:
+                source.seek(pos)  # Fading in: join at the mix position
+
+            step = 0
+            if gain != target:
+                blocks = self.ramp_blocks[i]
+                step = (target - gain) // (blocks * n)
+                self.ramp_blocks[i] = blocks - 1
+                if blocks <= 1:
+                    step = (target - gain) // n
+            buf = bufs[i]
+            got = source.readinto(buf)
+            dsp.mix_pcm16(self.acc, buf, got >> 1, gain, step)
+            self.gains[i] = target if self.ramp_blocks[i] <= 0 else gain + step * n
+
+        dsp.mix_out(self.acc, view, n)
+        return n << 1
+
+    def tell(self):
+        for i in range(len(self.sources)):
+            if self.gains[i]:
+                return self.sources[i].tell()
+        return self.sources[self.selected].tell()
+
+    def seek(self, pos):
+        for source in self.sources:
+            source.seek(pos)
+
+    def close(self):
+        for source in self.sources:
+            source.close()
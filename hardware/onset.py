@@ -0,0 +1,62 @@
+import math
+
+_DB = 20 / math.log(10)
+
+
+class OnsetDetector:
+    """Sustained-activity onset by CUSUM over per-frame novelty.
+
+    Each frame's novelty is its level in dB above the trigger threshold,
+    less drift_db, plus flux_gain times the spectral flux (the rise in
+    band levels since the last frame, so modulated sound like speech
+    builds evidence faster than a steady hum at the same level). The
+    score is Page's CUSUM of that: it adds each frame's novelty and
+    never drops below zero, and the onset is confirmed once it reaches
+    decide_db. Quiet frames pull it back down by as much as they are
+    below, instead of one quiet frame resetting a fixed count.
+
+    A frame adds at most cap_db, so no single transient (a door, a
+    footstep) can confirm alone: decide_db / cap_db frames is the
+    fastest onset. Sound just over the threshold takes about as long
+    as the old fixed count; clearly louder sound confirms in a few
+    frames.
+    """
+
+    def __init__(self, frame_ms, decide_db=24, cap_db=8, drift_db=1, flux_gain=0.5):
+        self.frame_ms = frame_ms
+        self.decide = decide_db
+        self.cap = cap_db
+        self.drift = drift_db
+        self.flux_gain = flux_gain
+        self.reset()
+
+    def reset(self):
+        """Forget the evidence so far (on trigger and on pause)"""
+        self.score = 0.0
+        self.novelty = 0.0
+
+    def update(self, rms, threshold, flux=0.0):
+        """Feed one frame; True once sustained activity is confirmed"""
+        if rms < 1:
+            rms = 1
+        if threshold < 1:
+            threshold = 1
+        novelty = math.log(rms / threshold) * _DB - self.drift + self.flux_gain * flux
+        if novelty > self.cap:
+            novelty = self.cap
+        self.novelty = novelty
+        score = self.score + novelty
+        if score < 0:
+            score = 0.0
+        elif score > self.decide:
+            score = self.decide
+        self.score = score
+        return score >= self.decide
+
+    def min_latency_ms(self):
+        """Fastest possible onset: the frames a capped run needs"""
+        return -(-self.decide // self.cap) * self.frame_ms
+
+    def status_line(self):
+        return (f"score={self.score:.1f}/{self.decide} dB novelty={self.novelty:+.1f} dB "
+                f"(fastest onset {self.min_latency_ms():.0f} ms)")
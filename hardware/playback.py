@@ -0,0 +1,214 @@
+import _thread
+import time
+
+import dsp
+from dsp import GAIN_ONE
+from locks import wake
+
+
+class FileSource:
+    """Raw PCM file on the SD card, looped, read straight into the caller's buffer"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb')
+        self.size = self.f.seek(0, 2)
+        self.f.seek(0)
+        self.pos = 0
+
+    def readinto(self, view):
+        n = self.f.readinto(view)
+        if n < len(view) and self.size:
+            # End of file: carry on from the start in the same block
+            self.f.seek(0)
+            n += self.f.readinto(view[n:])
+        self.pos = (self.pos + n) % self.size if self.size else 0
+        return n
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos):
+        self.pos = pos % self.size if self.size else 0
+        self.f.seek(self.pos)
+
+    def close(self):
+        self.f.close()
+
+
+class BlockPlayer:
+    """Plays a source to I2S from a ring of preallocated blocks.
+
+    start_prefetch() (a thread running run_prefetch()) or prefetch()
+    (between writes)
+    keeps free blocks filled from the source with readinto(), so the
+    writer only ever waits on the I2S DMA and never on the SD card.
+    Blocks are whole sectors and read back to back, so reads stay
+    sector aligned. If the writer finds no block ready it plays a
+    short stretch of silence and counts an underrun.
+
+    fade() ramps the output gain on the writer side, on the block about
+    to be written, so fades start at once rather than after the blocks
+    already prefetched.
+    """
+
+    def __init__(self, block_bytes=4096, blocks=3, byte_rate=32000):
+        self.block_bytes = block_bytes
+        self.count = blocks
+        self.blocks = [bytearray(block_bytes) for _ in range(blocks)]
+        self.views = [memoryview(block) for block in self.blocks]
+        self.lengths = [0] * blocks
+        self.block_us = block_bytes * 1000000 // byte_rate
+        self.silence = memoryview(bytearray(block_bytes // 4))
+
+        self.source = None
+        self.active = False
+        self.filled = 0   # blocks produced by the prefetcher
+        self.played = 0   # blocks handed to the speaker
+        self._holding = False
+        self._prefetching = False
+        self.gain = GAIN_ONE  # Output gain, Q23
+        self.target = GAIN_ONE
+        self.fade_blocks = 0
+
+        # Held while the ring is full; the writer releases it to wake the prefetcher
+        self._space = _thread.allocate_lock()
+        self._space.acquire()
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.underruns = 0
+        self.refills = 0
+        self.worst_refill_us = 0
+        self.total_refill_us = 0
+
+    def open(self, source, gain=GAIN_ONE):
+        """Start playing source from an empty ring at a Q23 output gain"""
+        # A previous prefetcher must be gone before the ring is reused
+        while self._prefetching:
+            time.sleep_ms(1)
+        self.source = source
+        self.filled = 0
+        self.played = 0
+        self._holding = False
+        self.gain = self.target = gain
+        self.active = True
+
+    def fade(self, target, blocks=1):
+        """Ramp the output gain to target over the next blocks written"""
+        if target != self.target:
+            self.target = target
+            self.fade_blocks = max(1, blocks)
+
+    def stop(self):
+        """Stop playback; the prefetcher (if any) closes the source"""
+        self.active = False
+        wake(self._space)
+        if not self._prefetching and self.source:
+            self.source.close()
+            self.source = None
+
+    # ===== PREFETCH SIDE =====
+
+    def prefetch(self, max_blocks=None):
+        """Fill every free block (or at most max_blocks) from the source;
+        returns how many were filled"""
+        done = 0
+        while self.active and self.filled - self.played < self.count:
+            if max_blocks is not None and done >= max_blocks:
+                break
+            i = self.filled % self.count
+            start = time.ticks_us()
+            n = self.source.readinto(self.views[i])
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+
+            self.refills += 1
+            self.total_refill_us += elapsed
+            if elapsed > self.worst_refill_us:
+                self.worst_refill_us = elapsed
+            if not n:
+                break  # Empty source
+            self.lengths[i] = n
+            self.filled += 1
+            done += 1
+        return done
+
+    def start_prefetch(self):
+        """Run run_prefetch() on a new thread"""
+        # Set before the thread runs, so a stop() and open() right after
+        # this wait for it instead of starting a second one on the ring
+        self._prefetching = True
+        try:
+            _thread.start_new_thread(self.run_prefetch, ())
+        except Exception:
+            self._prefetching = False
+            raise
+
+    def run_prefetch(self):
+        """Prefetch loop for a dedicated thread (see start_prefetch());
+        returns after stop()"""
+        self._prefetching = True
+        try:
+            while self.active:
+                if not self.prefetch():
+                    self._space.acquire()
+        except Exception as e:
+            print(f"ERROR in playback prefetch: {e}")
+            self.active = False
+        finally:
+            if self.source:
+                self.source.close()
+                self.source = None
+            self._prefetching = False
+
+    # ===== WRITER SIDE =====
+
+    def next_block(self):
+        """Oldest ready block, or silence (counted as an underrun) if none is"""
+        if self.filled == self.played:
+            self.underruns += 1
+            self._holding = False
+            return self.silence
+        self._holding = True
+        i = self.played % self.count
+        view = self.views[i]
+        if self.lengths[i] != self.block_bytes:
+            view = view[:self.lengths[i]]
+        if self.gain != GAIN_ONE or self.target != GAIN_ONE:
+            self._apply_gain(view)
+        return view
+
+    def _apply_gain(self, view):
+        n = len(view) >> 1
+        step = 0
+        if self.gain != self.target:
+            step = (self.target - self.gain) // (self.fade_blocks * n)
+            self.fade_blocks -= 1
+        dsp.ramp_pcm16(view, n, self.gain, step)
+        if self.fade_blocks <= 0:
+            self.gain = self.target
+        else:
+            self.gain += step * n
+
+    def done(self):
+        """Give the block from next_block() back to the prefetcher"""
+        if self._holding:
+            self._holding = False
+            self.played += 1
+            wake(self._space)
+
+    def write_to(self, speaker):
+        """Write the next block to the speaker (blocks only on the I2S DMA)"""
+        speaker.write(self.next_block())
+        self.done()
+
+    def recommended_blocks(self):
+        """Blocks needed to ride out the worst refill seen so far"""
+        return self.worst_refill_us // self.block_us + 2
+
+    def stats_line(self):
+        mean = self.total_refill_us // self.refills if self.refills else 0
+        return (f"underruns={self.underruns} refills={self.refills} "
+                f"refill_us mean={mean} worst={self.worst_refill_us} "
+                f"(block={self.block_us}us, recommend {self.recommended_blocks()} blocks)")
@@ -0,0 +1,158 @@
+import struct
+import time
+from array import array
+import dsp
+
+WAV_HEADER_BYTES = 512  # One sector, so the samples after it stay sector aligned
+_JUNK_BYTES = WAV_HEADER_BYTES - 52  # Padding chunk between fmt and data
+
+
+def wav_header(rate, data_bytes, channels=1, bits=16):
+    """PCM WAV header for data_bytes of sample data, padded to WAV_HEADER_BYTES
+    with a JUNK chunk (which readers skip)"""
+    block = channels * bits // 8
+    return (struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', WAV_HEADER_BYTES - 8 + data_bytes, b'WAVE',
+                        b'fmt ', 16, 1, channels, rate, rate * block, block, bits,
+                        b'JUNK', _JUNK_BYTES)
+            + bytes(_JUNK_BYTES) + struct.pack('<4sI', b'data', data_bytes))
+
+
+class StreamRecorder:
+    """Streams 32-bit I2S mic frames to a 16-bit mono WAV file.
+
+    Every chunk is read into one raw buffer and converted to 16 bits
+    (dsp.decode_pcm32 picks the channel and the top bits) straight into
+    a block of an sdwriter.SDWriter, handed to an optional
+    process(samples, n) that works in place and queued; the writer's
+    thread puts it on the card, so a chunk allocates nothing and never
+    waits for the SD card. If the writer has no free block the chunk is
+    converted into the recorder's own buffer and dropped (stalled). The
+    header is written first with a zero length and patched at the end.
+
+    The I2S driver doesn't report overruns, so dropped frames are
+    counted against the clock: frames that have arrived since the
+    start, less those read, is what the DMA is holding; anything past
+    its dma_bytes is gone. busy_us is the time spent on chunks other
+    than waiting for the mic - below the chunk duration means the
+    recorder keeps up.
+    """
+
+    def __init__(self, rate, chunk_frames=2048, channels=2, bits=32, shift=16, dma_bytes=32000):
+        self.rate = rate
+        self.chunk_frames = chunk_frames
+        self.frame_bytes = channels * bits // 8
+        self.stride = channels
+        self.shift = shift
+        self.dma_frames = dma_bytes // self.frame_bytes
+        self.raw = bytearray(chunk_frames * self.frame_bytes)
+        self.raw_view = memoryview(self.raw)
+        self.samples = array('h', bytearray(chunk_frames * 2))
+        self.chunk = self.samples  # The last chunk's samples
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.dropped = 0
+        self.stalled = 0
+        self.chunks = 0
+        self.busy_us = 0
+        self.worst_us = 0
+        self.elapsed_us = 0
+        self._start_us = 0
+        self._arrived = 0
+
+    def read(self, mic, n=None):
+        """Read one chunk (n frames, default a full one) into raw"""
+        n = n or self.chunk_frames
+        mic.readinto(self.raw_view if n == self.chunk_frames else self.raw_view[:n * self.frame_bytes])
+        return n
+
+    def convert(self, n=None, dst=None):
+        """raw to 16-bit samples (into dst, default the recorder's own buffer)"""
+        dsp.decode_pcm32(self.raw, self.samples if dst is None else dst,
+                         n or self.chunk_frames, self.shift, self.stride)
+
+    def drain(self, mic):
+        """Read until the DMA is empty (a read has to wait); returns the chunks read"""
+        chunk_us = self.chunk_frames * 1000000 // self.rate
+        for chunks in range(self.dma_frames // self.chunk_frames + 2):
+            start = time.ticks_us()
+            self.read(mic)
+            if time.ticks_diff(time.ticks_us(), start) > chunk_us // 2:
+                break
+        self.convert()
+        return chunks + 1
+
+    def _arrived_frames(self, now):
+        # Whole seconds are moved into _arrived so the arithmetic stays in small ints
+        elapsed = time.ticks_diff(now, self._start_us)
+        while elapsed >= 1000000:
+            self._start_us = time.ticks_add(self._start_us, 1000000)
+            self._arrived += self.rate
+            self.elapsed_us += 1000000
+            elapsed -= 1000000
+        return self._arrived + elapsed * (self.rate // 100) // 10000
+
+    def record(self, mic, writer, path, frames, process=None, progress=None):
+        """Record frames to a WAV file at path through writer (an SDWriter with
+        blocks of chunk_frames samples); process(samples, n) edits each chunk
+        in place, progress(recorder) runs about once a second. Returns the
+        frames written."""
+        if writer.block_bytes != self.chunk_frames * 2:
+            raise ValueError("writer blocks must hold one chunk")
+        self.reset()
+        writer.open(path, wav_header(self.rate, 0), WAV_HEADER_BYTES + frames * 2)
+        next_progress = self.rate
+
+        # Whatever sat in the DMA before now is stale: drain it, then start the clock
+        self.drain(mic)
+        self._start_us = time.ticks_us()
+
+        try:
+            while self.frames < frames:
+                n = min(self.chunk_frames, frames - self.frames)
+                backlog = self._arrived_frames(time.ticks_us()) - self.frames
+                if backlog > self.dma_frames:
+                    lost = backlog - self.dma_frames
+                    self.dropped += lost
+                    self._arrived -= lost  # Gone from the DMA; don't count them again
+                self.read(mic, n)
+                started = time.ticks_us()
+                block = writer.next_block()
+                samples = self.samples if block is None else block
+                self.convert(n, samples)
+                if process:
+                    process(samples, n)
+                if block is None:
+                    self.stalled += n  # Converted and processed all the same, to keep filter state
+                else:
+                    writer.commit(n * 2)
+                self.chunk = samples
+                self.frames += n
+                self.chunks += 1
+                busy = time.ticks_diff(time.ticks_us(), started)
+                self.busy_us += busy
+                if busy > self.worst_us:
+                    self.worst_us = busy
+                if progress and self.frames >= next_progress:
+                    next_progress += self.rate
+                    progress(self)
+        finally:
+            self.elapsed_us += time.ticks_diff(time.ticks_us(), self._start_us)
+            writer.close(wav_header(self.rate, self.written() * 2))
+        return self.written()
+
+    def written(self):
+        return self.frames - self.stalled
+
+    def load(self):
+        """Share of real time spent on the chunks (below 1.0 keeps up)"""
+        if not self.frames:
+            return 0.0
+        return self.busy_us * self.rate / (self.frames * 1000000)
+
+    def stats_line(self):
+        seconds = self.frames / self.rate
+        return (f"{self.frames} frames ({seconds:.2f} s) in {self.elapsed_us / 1000000:.2f} s, "
+                f"{self.dropped} dropped, {self.stalled} stalled, load {self.load() * 100:.0f}% "
+                f"(worst chunk {self.worst_us} us of {self.chunk_frames * 1000000 // self.rate} us)")
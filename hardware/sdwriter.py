@@ -0,0 +1,210 @@
+import _thread
+import time
+from array import array
+from locks import wake
+
+
+class SDWriter:
+    """Writes a stream of sample blocks to the SD card from its own thread.
+
+    The producer takes a block from a fixed pool with next_block(),
+    fills it in place (it is an array('h') view, so dsp kernels can
+    write straight into it) and hands it over with commit(). Neither
+    touches the card or waits: with every block still queued,
+    next_block() returns None and counts a stall, and the caller drops
+    that data. run() on a dedicated thread (or service() between chunks)
+    writes queued blocks out batch_blocks at a time: the pool is one
+    buffer, so consecutive blocks go out as one large f.write().
+    Blocks are whole sectors and the stream starts on a sector boundary
+    (see recorder.wav_header), so every write is sector aligned and FAT
+    never has to read a sector back to fill part of it.
+
+    The file is flushed every flush_ms, so a crash loses at most that
+    much. When open() is told the expected size and the file can be
+    truncated, that size is allocated up front and trimmed at close().
+    If the port's SD driver holds the GIL while it writes, the producer
+    can still stall for one batch; size the I2S DMA buffer for the worst
+    batch write (worst_write_us).
+    """
+
+    def __init__(self, block_bytes=4096, blocks=16, batch_blocks=4, flush_ms=1000):
+        self.block_bytes = block_bytes
+        self.count = blocks
+        self.batch = max(1, min(batch_blocks, blocks))
+        self.flush_ms = flush_ms
+        block_samples = block_bytes // 2
+        self.pool = array('h', bytearray(block_bytes * blocks))
+        view = memoryview(self.pool)
+        self.views = [view[i * block_samples:(i + 1) * block_samples] for i in range(blocks)]
+        # batch_views[i][k]: blocks i..i+k as one buffer, for writes that don't slice
+        self.batch_views = [[view[i * block_samples:(i + k + 1) * block_samples]
+                             for k in range(min(self.batch, blocks - i))] for i in range(blocks)]
+        self.lengths = [0] * blocks
+
+        self.f = None
+        self.preallocated = False
+        self.running = False
+        self._closing = False
+        self._header = None
+
+        # Held while nothing is queued; commit() and close() release it to wake run()
+        self._ready = _thread.allocate_lock()
+        self._ready.acquire()
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.committed = 0    # blocks handed over by the producer
+        self.written = 0      # blocks written to the card
+        self.bytes = 0
+        self.writes = 0
+        self.flushes = 0
+        self.stalls = 0       # next_block() calls that found the pool full
+        self.max_queued = 0
+        self.write_us = 0
+        self.worst_write_us = 0
+        self.opened_ms = time.ticks_ms()
+        self.elapsed_ms = 0
+
+    # ===== PRODUCER SIDE =====
+
+    def open(self, path, header=None, expected_bytes=0):
+        """Start a new file: header (if any) is written at once, then the stream"""
+        f = open(path, 'wb')
+        self.preallocated = bool(expected_bytes) and hasattr(f, 'truncate')
+        if self.preallocated:
+            f.seek(expected_bytes - 1)
+            f.write(b'\0')
+            f.seek(0)
+        if header:
+            f.write(header)
+        self.reset_stats()
+        self._closing = False
+        self._header = None
+        self._last_flush = time.ticks_ms()
+        self.f = f
+
+    def next_block(self):
+        """Free block to fill, or None (a stall) while every block is queued"""
+        if self.committed - self.written >= self.count:
+            self.stalls += 1
+            return None
+        return self.views[self.committed % self.count]
+
+    def commit(self, nbytes=None):
+        """Queue the block from next_block() with nbytes of data (default all);
+        only the last block of a file may be short"""
+        self.lengths[self.committed % self.count] = self.block_bytes if nbytes is None else nbytes
+        self.committed += 1
+        queued = self.committed - self.written
+        if queued > self.max_queued:
+            self.max_queued = queued
+        wake(self._ready)
+
+    def close(self, header=None):
+        """Wait for the queue to reach the card, rewrite the start of the file
+        with header (e.g. now the length is known) and close it"""
+        self._header = header
+        self._closing = True
+        wake(self._ready)
+        while self.f is not None:
+            if self.running:
+                time.sleep_ms(1)
+            else:
+                self.service()
+
+    def queued(self):
+        return self.committed - self.written
+
+    # ===== WRITER SIDE =====
+
+    def service(self):
+        """Write queued blocks in whole batches (everything once flush_ms has
+        passed or on close); returns the blocks written"""
+        f = self.f
+        if f is None:
+            return 0
+        done = 0
+        urgent = self._closing or time.ticks_diff(time.ticks_ms(), self._last_flush) >= self.flush_ms
+        while self.committed - self.written >= (1 if urgent else self.batch):
+            i = self.written % self.count
+            # Consecutive full blocks up to the end of the pool; a short block goes alone
+            k = 0
+            limit = min(self.committed - self.written, len(self.batch_views[i]))
+            while k < limit and self.lengths[(i + k) % self.count] == self.block_bytes:
+                k += 1
+            if k:
+                buf = self.batch_views[i][k - 1]
+                nbytes = k * self.block_bytes
+            else:
+                k = 1
+                nbytes = self.lengths[i]
+                buf = self.views[i][:nbytes // 2]
+            start = time.ticks_us()
+            f.write(buf)
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+            self.writes += 1
+            self.write_us += elapsed
+            if elapsed > self.worst_write_us:
+                self.worst_write_us = elapsed
+            self.bytes += nbytes
+            self.written += k
+            done += k
+
+        if urgent and done:
+            f.flush()
+            self.flushes += 1
+            self._last_flush = time.ticks_ms()
+        if self._closing and self.committed == self.written:
+            self._finish(f)
+        return done
+
+    def _finish(self, f):
+        if self.preallocated:
+            f.truncate(f.tell())
+        if self._header:
+            f.seek(0)
+            f.write(self._header)
+        f.close()
+        self.elapsed_ms = time.ticks_diff(time.ticks_ms(), self.opened_ms)
+        self.f = None
+
+    def run(self):
+        """Writer loop for a dedicated thread; returns after stop()"""
+        self.running = True
+        try:
+            while self.running:
+                if not self.service() and not (self._closing and self.f is not None):
+                    self._ready.acquire()
+        except Exception as e:
+            print(f"ERROR in SD writer: {e}")
+        finally:
+            self.running = False
+
+    def start(self):
+        """Start run() on its own thread, unless it is already running"""
+        if not self.running:
+            self.running = True
+            _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        self.running = False
+        wake(self._ready)
+
+    # ===== STATS =====
+
+    def throughput(self):
+        """(sustained, card) KB/s: bytes over the time the file was open, and
+        over the time spent in f.write()"""
+        elapsed_ms = self.elapsed_ms or time.ticks_diff(time.ticks_ms(), self.opened_ms)
+        sustained = self.bytes / elapsed_ms if elapsed_ms > 0 else 0.0
+        card = self.bytes * 1000 / self.write_us if self.write_us else 0.0
+        return sustained * 1000 / 1024, card * 1000 / 1024
+
+    def stats_line(self):
+        sustained, card = self.throughput()
+        per_write = self.bytes // self.writes if self.writes else 0
+        return (f"{self.bytes // 1024} KB in {self.writes} writes ({per_write} B each), "
+                f"{sustained:.0f} KB/s sustained, card {card:.0f} KB/s, "
+                f"queue max {self.max_queued}/{self.count} blocks, {self.stalls} stalls, "
+                f"worst write {self.worst_write_us} us, {self.flushes} flushes")
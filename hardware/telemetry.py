@@ -0,0 +1,70 @@
+import struct
+import sys
+import time
+
+# One record per report, little-endian, 24 bytes:
+#   sync (0xA5 0x5A), version, seq, ticks_ms, rms, level, above, below,
+#   flags, mic overruns, playback underruns, loop_us, heap delta bytes
+#   (capture.FrameCapture.heap_delta, 0 if negative), checksum
+# The checksum is the low byte of the sum of every byte before it.
+FORMAT = '<BBBHIHBBBBHHHHB'
+FIELDS = ('seq', 'ticks_ms', 'rms', 'level', 'above', 'below', 'flags',
+          'overruns', 'underruns', 'loop_us', 'heap_delta')
+SIZE = struct.calcsize(FORMAT)
+SYNC = b'\xa5\x5a'
+VERSION = 1
+
+# flags bits
+PLAYING = 0x01
+PAUSED = 0x02
+VARIANT_SHIFT = 2  # Two bits of variant index
+
+
+def _u8(value):
+    return 255 if value > 255 else int(value)
+
+
+def _u16(value):
+    if value < 0:
+        return 0
+    return 65535 if value > 65535 else int(value)
+
+
+def checksum(buf, n):
+    total = 0
+    for i in range(n):
+        total += buf[i]
+    return total & 0xFF
+
+
+class Telemetry:
+    """Fixed-size binary status records written to the serial console at rate_hz"""
+
+    def __init__(self, rate_hz=10, out=None):
+        self.interval_ms = 1000 // rate_hz if rate_hz else 0
+        self.out = out
+        self.buf = bytearray(SIZE)
+        self.seq = 0
+        self.last_ms = None
+        self.sent = 0
+
+    def due(self):
+        """True when the next record should go out"""
+        now = time.ticks_ms()
+        if self.last_ms is not None and time.ticks_diff(now, self.last_ms) < self.interval_ms:
+            return False
+        self.last_ms = now
+        return True
+
+    def send(self, rms, level, above, below, flags, overruns, underruns, loop_us, heap_delta):
+        buf = self.buf
+        struct.pack_into(FORMAT, buf, 0, 0xA5, 0x5A, VERSION, self.seq,
+                         time.ticks_ms(), _u16(rms), _u8(level), _u8(above), _u8(below),
+                         flags, _u16(overruns), _u16(underruns), _u16(loop_us),
+                         _u16(heap_delta or 0), 0)
+        buf[SIZE - 1] = checksum(buf, SIZE - 1)
+        out = self.out or getattr(sys.stdout, 'buffer', sys.stdout)
+        out.write(buf)
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.sent += 1
+
@@ -0,0 +1,84 @@
+import time
+from array import array
+
+BUCKETS = 20  # log2 microsecond buckets: <2us, <4us, ... the last is open-ended
+
+
+class StageTimer:
+    """Per-stage latency histograms plus min/mean/max, in fixed memory.
+
+    Stages are small integers indexing names. Every record() updates
+    preallocated arrays only, so timing can stay on in production;
+    each stage keeps a histogram of log2 microsecond buckets and a
+    running mean that cannot overflow.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        n = len(names)
+        self.hist = array('I', bytearray(4 * n * BUCKETS))
+        self.count = array('I', bytearray(4 * n))
+        self.min = array('I', bytearray(4 * n))
+        self.max = array('I', bytearray(4 * n))
+        self.mean16 = array('I', bytearray(4 * n))  # Running mean, us * 16
+
+    def record(self, stage, us):
+        if us < 0:
+            us = 0
+        bucket = 0
+        value = us >> 1
+        while value and bucket < BUCKETS - 1:
+            value >>= 1
+            bucket += 1
+        self.hist[stage * BUCKETS + bucket] += 1
+
+        count = self.count[stage] + 1
+        self.count[stage] = count
+        if count == 1 or us < self.min[stage]:
+            self.min[stage] = us
+        if us > self.max[stage]:
+            self.max[stage] = us
+        mean16 = self.mean16[stage]
+        self.mean16[stage] = mean16 + ((us << 4) - mean16) // count
+
+    def lap(self, stage, start):
+        """Record the time since start against stage; returns now for the next stage"""
+        now = time.ticks_us()
+        self.record(stage, time.ticks_diff(now, start))
+        return now
+
+    def percentile(self, stage, pct):
+        """Upper bound of the bucket holding the pct-th percentile, in us"""
+        count = self.count[stage]
+        if not count:
+            return 0
+        wanted = (count * pct + 99) // 100
+        seen = 0
+        base = stage * BUCKETS
+        for bucket in range(BUCKETS):
+            seen += self.hist[base + bucket]
+            if seen >= wanted:
+                return 2 << bucket
+        return 2 << (BUCKETS - 1)
+
+    def reset(self):
+        for table in (self.hist, self.count, self.min, self.max, self.mean16):
+            for i in range(len(table)):
+                table[i] = 0
+
+    def report(self):
+        """Print a line per stage: count, min/mean/max and percentile bounds (us)"""
+        print(f"{'stage':12s} {'count':>8s} {'min':>7s} {'mean':>7s} {'max':>7s} {'p50<':>7s} {'p90<':>7s} {'p99<':>7s}")
+        for stage in range(len(self.names)):
+            count = self.count[stage]
+            if not count:
+                continue
+            print(f"{self.names[stage]:12s} {count:8d} {self.min[stage]:7d} {self.mean16[stage] >> 4:7d} "
+                  f"{self.max[stage]:7d} {self.percentile(stage, 50):7d} "
+                  f"{self.percentile(stage, 90):7d} {self.percentile(stage, 99):7d}")
+
+    def histogram(self, stage):
+        """(upper bound us, count) for every non-empty bucket of a stage"""
+        base = stage * BUCKETS
+        return [(2 << bucket, self.hist[base + bucket])
+                for bucket in range(BUCKETS) if self.hist[base + bucket]]
@@ -0,0 +1,515 @@
+"""Benchmark the monitor's hot paths on fixed input frames
+
+Runs under CPython and the MicroPython unix port. Each path is timed
+on the same deterministic frames and reported as us per frame, frames
+per second against the real-time rate it has to sustain, and heap
+bytes allocated per frame. Paths that need the firmware scripts
+(main.py, mic_test.py) run through the host emulation and are skipped
+on MicroPython.
+
+    python bench.py                       # writes python-test-files/bench_results.json
+    python bench.py -o new.json --compare bench_results.json
+    micropython bench.py -o mp.json
+
+--compare exits non-zero if any path got slower than --threshold
+(default 0.10 = 10%). Under CPython it also replays loud bursts through
+main.py in the emulation (host CPU time charged to the virtual clock) and
+records the trigger-to-first-sample latency the firmware reports, for
+the first trigger (cold) and the resumes after it (warm).
+"""
+import sys
+import gc
+import json
+from array import array
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+
+if MICROPYTHON:
+    from time import ticks_us, ticks_diff
+else:
+    # Bound before the emulation patches the time module
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(a, b):
+        return a - b
+
+HERE = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+sys.path.append(HERE + '/../hardware')
+
+import dsp
+from capture import FrameCapture
+from mixer import Mixer
+from bands import BandAnalyzer
+from filters import FilterChain, DCBlocker, NoiseGate, Gain
+
+MAIN_RATE = 16000
+MIC_TEST_RATE = 40000
+
+
+class FixedMic:
+    """Stands in for I2S RX: every read copies the same frame
+
+    The frame must have the target buffer's item size and at least its length.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def readinto(self, buf):
+        buf = memoryview(buf)
+        buf[:] = memoryview(self.frame)[:len(buf)]
+
+
+class FixedSource:
+    """Stands in for a playback source: every read copies the same block"""
+
+    def __init__(self, block):
+        self.block = block
+
+    def readinto(self, view):
+        view[:] = self.block
+        return len(view)
+
+    def tell(self):
+        return 0
+
+    def seek(self, pos):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullOut:
+    def write(self, s):
+        return len(s)
+
+    def flush(self):
+        pass
+
+
+def fixed_frame(nbytes, seed=12345):
+    """Deterministic pseudo-random bytes (LCG, same on every port)"""
+    out = bytearray(nbytes)
+    x = seed
+    for i in range(nbytes):
+        x = (1103515245 * x + 12345) & 0x7FFFFFFF
+        out[i] = (x >> 16) & 0xFF
+    return out
+
+
+def fixed_pcm16(nsamples, amplitude=1500, seed=12345):
+    raw = fixed_frame(nsamples * 2, seed)
+    samples = array('h', bytearray(nsamples * 2))
+    for i in range(nsamples):
+        value = raw[2 * i] | (raw[2 * i + 1] << 8)
+        samples[i] = (value % (2 * amplitude)) - amplitude
+    return samples
+
+
+def fixed_pcm32_stereo(nframes, seed=12345):
+    left = fixed_pcm16(nframes, seed=seed)
+    words = array('i', bytearray(nframes * 8))
+    for i in range(nframes):
+        words[2 * i] = left[i] << 16
+    return words
+
+
+# ===== ALLOCATION MEASUREMENT =====
+
+if MICROPYTHON:
+    def alloc_per_call(func, calls=5):
+        gc.collect()
+        gc.disable()
+        try:
+            before = gc.mem_alloc()
+            for _ in range(calls):
+                func()
+            return (gc.mem_alloc() - before) // calls
+        finally:
+            gc.enable()
+else:
+    import tracemalloc
+
+    def alloc_per_call(func, calls=5):
+        # Peak transient allocation of one call, averaged
+        total = 0
+        tracemalloc.start()
+        try:
+            for _ in range(calls):
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                func()
+                total += tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+        return total // calls
+
+
+def run_bench(func, rate, frame_samples, iterations):
+    func()  # warm up
+    start = ticks_us()
+    for _ in range(iterations):
+        func()
+    elapsed = ticks_diff(ticks_us(), start)
+    us = elapsed / iterations
+    frames_per_s = 1000000 / us if us else float('inf')
+    realtime_fps = rate / frame_samples
+    return {
+        'us_per_frame': round(us, 2),
+        'budget_us': round(1000000 * frame_samples / rate, 1),
+        'frames_per_s': round(frames_per_s, 1),
+        'realtime_frames_per_s': round(realtime_fps, 2),
+        'headroom': round(frames_per_s / realtime_fps, 2),
+        'alloc_bytes_per_frame': alloc_per_call(func),
+        'rate': rate,
+        'frame_samples': frame_samples,
+    }
+
+
+# ===== HOT PATHS =====
+
+def kernel_benches():
+    """Paths that only need the hardware/ modules - any port"""
+    frame16 = fixed_pcm16(1024)
+    stereo32 = bytearray(fixed_pcm32_stereo(512))
+    mic = FixedMic(frame16)
+    capture = FrameCapture(1024)
+    out16 = array('h', bytearray(512 * 2))
+    scratch = array('h', frame16)
+
+    def capture_read():
+        capture.read(mic, 5)
+
+    def rms():
+        dsp.rms(frame16, 1024)
+
+    def decode_pcm32():
+        dsp.decode_pcm32(stereo32, out16, 512, 0, 2)
+
+    def gain_sumsq():
+        dsp.gain_sumsq(scratch, 1024, 1, 10)
+
+    def decimated_sumsq():
+        dsp.decimated_sumsq(frame16, 1024, 5, 8, 4)
+
+    # Speech bands as main.py configures them: four 256-point FFTs per frame
+    bands = BandAnalyzer(MAIN_RATE, (60, 250, 500, 1000, 2000, 4000, 8000),
+                         (0.25, 1.0, 1.5, 1.5, 1.0, 0.5), 256, 1024)
+
+    def band_analyze():
+        bands.analyze(frame16)
+        bands.weighting()
+
+    def fft_256():
+        dsp.fft_load(frame16, 0, bands.work, bands.table, 256)
+        dsp.fft_q15(bands.work, bands.twiddles, 256)
+
+    # The recorder's chain: DC blocker, gain, gate with the level hovering at its thresholds
+    filtered = array('h', frame16)
+    chain = FilterChain(DCBlocker(MAIN_RATE), Gain(1), NoiseGate(MAIN_RATE, 1500, 1000))
+
+    def filter_chain():
+        filtered[:] = frame16
+        chain.process(filtered, 1024)
+
+    pcm16 = bytearray(fixed_pcm16(1024))
+    ramp_buf = bytearray(pcm16)
+
+    def ramp_pcm16():
+        dsp.ramp_pcm16(ramp_buf, 1024, dsp.GAIN_ONE, -1)
+
+    benches = [
+        ('capture.read', capture_read, MAIN_RATE, 1024),
+        ('dsp.rms', rms, MAIN_RATE, 1024),
+        ('dsp.gain_sumsq', gain_sumsq, MAIN_RATE, 1024),
+        ('dsp.decimated_sumsq_4', decimated_sumsq, MAIN_RATE, 1024),
+        ('dsp.fft_q15_256', fft_256, MAIN_RATE, 256),
+        ('bands.analyze', band_analyze, MAIN_RATE, 1024),
+        ('dsp.decode_pcm32_stereo', decode_pcm32, MIC_TEST_RATE, 512),
+        ('filters.chain', filter_chain, MAIN_RATE, 1024),
+        ('dsp.ramp_pcm16', ramp_pcm16, MAIN_RATE, 1024),
+    ]
+    for streams in (1, 2, 4):
+        benches.append(('mixer.mix_%d' % streams, mix_bench(streams, pcm16), MAIN_RATE, 1024))
+    return benches
+
+
+def mix_bench(streams, pcm16):
+    """Mix N streams into one 1024-sample block, every stream mid-ramp"""
+    mixer = Mixer([FixedSource(pcm16) for _ in range(streams)], len(pcm16))
+    for i in range(streams):
+        mixer.fade(i, dsp.GAIN_ONE // streams, 1 << 20)
+    out = memoryview(bytearray(len(pcm16)))
+
+    def mix():
+        mixer.readinto(out)
+    return mix
+
+
+# Worst error of the table-lookup paths against the float math they replace
+ACCURACY = {}
+
+# Trigger to first sample in ms, from trigger_latency()
+LATENCY = {}
+
+
+def firmware_benches(sd_dir):
+    """Paths inside main.py / mic_test.py, run through the emulation"""
+    sys.path.insert(0, HERE + '/emu')
+    import emulator
+    emulator.install(sd_dir=sd_dir)
+    import uos
+    uos.mount(None, '/sd')
+
+    import main
+    import mic_test
+    from playback import BlockPlayer, FileSource
+
+    frame16 = fixed_pcm16(1024)
+    mic = FixedMic(frame16)
+    rms_values = [3500 + 7 * i for i in range(100)]
+
+    def detect_sound():
+        # One capture-thread fill plus the analysis that consumes it
+        main.capture_ring.fill(mic)
+        main.detect_sound()
+
+    # A calibration the inputs fall inside, so the level curve is what gets timed
+    main.levels.floor, main.levels.loud = 2000, 4000
+
+    def rms_to_level():
+        for value in rms_values:
+            main.rms_to_level(value)
+
+    # The same levels by table lookup on the sum of squares detect_sound() has
+    main.refresh_level_table()
+    scale = main.capture_ring.ms_scale
+    acc_values = [int(value * value / scale) for value in rms_values]
+
+    def level_table():
+        table = main.level_table
+        for acc in acc_values:
+            table.lookup(acc)
+
+    ACCURACY['main.level_table'] = main.level_table.max_error
+    ACCURACY['mic_test.calculate_dB'] = mic_test._db_table(512)[0].max_error
+
+    # Playback engine: one block refilled from a 64 KB track and written out
+    with open('/sd/bench_track.raw', 'wb') as f:
+        f.write(fixed_pcm16(32768))
+
+    class NullSpeaker:
+        def write(self, buf):
+            return len(buf)
+
+    speaker = NullSpeaker()
+    player = BlockPlayer(main.PLAY_BLOCK_BYTES, main.PLAY_BLOCKS, MAIN_RATE * 2)
+    player.open(FileSource('/sd/bench_track.raw'))
+
+    def play_block():
+        player.prefetch()
+        player.write_to(speaker)
+
+    chunk = mic_test.RECORD_CHUNK
+    mic_test.mic = FixedMic(bytearray(fixed_pcm32_stereo(chunk)))
+
+    def record_to_file():
+        mic_test.record_to_file('bench_rec.wav', duration_seconds=1, apply_gain=True, gain=5)
+
+    # Chunks per call: the preview read, a full drain (the fixed mic never makes a
+    # read wait) and one second of recording
+    recorder = mic_test.recorder
+    drain_chunks = recorder.dma_frames // chunk + 2
+    record_chunks = 1 + drain_chunks + -(-MIC_TEST_RATE // chunk)
+
+    return [
+        ('main.detect_sound', detect_sound, MAIN_RATE, 1024, 1),
+        ('main.rms_to_level', rms_to_level, MAIN_RATE, 1024, len(rms_values)),
+        ('main.level_table', level_table, MAIN_RATE, 1024, len(acc_values)),
+        ('playback.block', play_block, MAIN_RATE, main.PLAY_BLOCK_BYTES // 2, 1),
+        ('mic_test.record_to_file', record_to_file, MIC_TEST_RATE, chunk, record_chunks),
+    ]
+
+
+def trigger_latency(sd_dir, bursts=3):
+    """Run main.py in the emulation on quiet stretches with loud bursts and
+    collect the 'Trigger-to-first-sample' times it prints"""
+    import math
+    import os
+    import subprocess
+    import wave
+    quiet = fixed_pcm16(3 * MAIN_RATE, amplitude=60)
+    loud = array('h', (int(6000 * math.sin(2 * math.pi * 400 * i / MAIN_RATE)) for i in range(2 * MAIN_RATE)))
+    room = sd_dir + '/bench_room.wav'
+    with wave.open(room, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(MAIN_RATE)
+        for _ in range(bursts):
+            w.writeframes(quiet.tobytes())
+            w.writeframes(loud.tobytes())
+        w.writeframes(quiet.tobytes())
+    card = sd_dir + '/card'
+    os.makedirs(card, exist_ok=True)
+    with open(card + '/branches_med.raw', 'wb') as f:
+        f.write(fixed_pcm16(2 * MAIN_RATE))
+    log = sd_dir + '/bench_main.log'
+    subprocess.run([sys.executable, HERE + '/emulate.py', '--input', room, '--sd', card,
+                    '--cpu-scale', '1', '--log', log], check=True, capture_output=True)
+    times = []
+    with open(log) as f:
+        for line in f:
+            if line.startswith('Trigger-to-first-sample:'):
+                times.append(float(line.split()[1]))
+    return times
+
+
+def run_all(iterations):
+    results = {}
+    for name, func, rate, frame_samples in kernel_benches():
+        results[name] = run_bench(func, rate, frame_samples, iterations)
+
+    if not MICROPYTHON:
+        import tempfile
+        real_stdout = sys.stdout
+        with tempfile.TemporaryDirectory() as sd_dir:
+            # Firmware prints every frame; format the text but drop it
+            sys.stdout = NullOut()
+            try:
+                benches = firmware_benches(sd_dir)
+                for name, func, rate, frame_samples, frames_per_call in benches:
+                    calls = max(1, iterations // frames_per_call)
+                    result = run_bench(func, rate, frame_samples * frames_per_call, calls)
+                    results[name] = _per_frame(result, frames_per_call, frame_samples)
+            finally:
+                sys.stdout = real_stdout
+            times = trigger_latency(sd_dir)
+            if times:
+                LATENCY['main.trigger_cold'] = times[0]
+            if len(times) > 1:
+                warm = sorted(times[1:])
+                LATENCY['main.trigger_warm'] = warm[len(warm) // 2]
+    return results
+
+
+def _per_frame(result, frames_per_call, frame_samples):
+    # Re-express a multi-frame call as per-frame numbers
+    us = result['us_per_frame'] / frames_per_call
+    result['us_per_frame'] = round(us, 2)
+    result['budget_us'] = round(result['budget_us'] / frames_per_call, 1)
+    result['frames_per_s'] = round(1000000 / us if us else float('inf'), 1)
+    result['realtime_frames_per_s'] = round(result['rate'] / frame_samples, 2)
+    result['headroom'] = round(result['frames_per_s'] / result['realtime_frames_per_s'], 2)
+    result['alloc_bytes_per_frame'] = result['alloc_bytes_per_frame'] // frames_per_call
+    result['frame_samples'] = frame_samples
+    return result
+
+
+# ===== REPORTING =====
+
+def revision():
+    if MICROPYTHON:
+        return None
+    try:
+        import subprocess
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                             capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_table(results):
+    print(f"{'path':28s} {'us/frame':>10s} {'budget':>9s} {'fps':>10s} {'headroom':>9s} {'alloc B':>8s}")
+    print("-" * 78)
+    for name in sorted(results):
+        r = results[name]
+        print(f"{name:28s} {r['us_per_frame']:10.1f} {r['budget_us']:9.0f} "
+              f"{r['frames_per_s']:10.1f} {r['headroom']:8.1f}x {r['alloc_bytes_per_frame']:8d}")
+
+
+def compare(results, baseline, threshold):
+    """Print per-path change against a previous run; return the regressions"""
+    regressions = []
+    print(f"\nComparison against revision {baseline.get('revision')}:")
+    for name in sorted(results):
+        old = baseline.get('paths', {}).get(name)
+        if not old:
+            continue
+        change = results[name]['us_per_frame'] / old['us_per_frame'] - 1 if old['us_per_frame'] else 0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:28s} {old['us_per_frame']:10.1f} -> {results[name]['us_per_frame']:10.1f} us ({change * 100:+.1f}%){flag}")
+    for name in sorted(LATENCY):
+        old = baseline.get('latency_ms', {}).get(name)
+        if old is None:
+            continue
+        # A latency near zero moves by more than threshold on noise alone: allow 1 ms
+        flag = ''
+        if LATENCY[name] > old * (1 + threshold) + 1:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:28s} {old:10.1f} -> {LATENCY[name]:10.1f} ms{flag}")
+    return regressions
+
+
+def parse_args(argv):
+    opts = {'output': HERE + '/bench_results.json', 'compare': None, 'threshold': 0.10, 'iterations': 200}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in ('-o', '--output'):
+            opts['output'] = argv[i + 1]
+        elif arg == '--compare':
+            opts['compare'] = argv[i + 1]
+        elif arg == '--threshold':
+            opts['threshold'] = float(argv[i + 1])
+        elif arg in ('-n', '--iterations'):
+            opts['iterations'] = int(argv[i + 1])
+        else:
+            print(__doc__)
+            sys.exit(2)
+        i += 2
+    return opts
+
+
+def main():
+    opts = parse_args(sys.argv[1:])
+    results = run_all(opts['iterations'])
+
+    report = {
+        'implementation': sys.implementation.name,
+        'platform': sys.platform,
+        'dsp_backend': dsp.BACKEND,
+        'revision': revision(),
+        'iterations': opts['iterations'],
+        'paths': results,
+        'table_error': ACCURACY,
+        'latency_ms': LATENCY,
+    }
+    print(f"Implementation: {report['implementation']} | DSP backend: {report['dsp_backend']} | Revision: {report['revision']}")
+    print_table(results)
+    for name in sorted(ACCURACY):
+        print(f"{name} table: within {ACCURACY[name]:.2f} of the float path")
+    for name in sorted(LATENCY):
+        print(f"{name}: {LATENCY[name]:.1f} ms trigger to first sample")
+
+    with open(opts['output'], 'w') as f:
+        json.dump(report, f)
+    print(f"\nResults written to {opts['output']}")
+
+    if opts['compare']:
+        with open(opts['compare']) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, opts['threshold']):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
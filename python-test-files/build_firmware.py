@@ -0,0 +1,183 @@
+"""Precompile the firmware to .mpy, or freeze it into a custom ESP32_GENERIC_S3 image
+
+Uploaded as .py, every module is compiled on the board at each boot and
+its bytecode lives on the heap. This cross-compiles hardware/ with
+mpy-cross (pip install mpy-cross==1.24.1.post3, matching the bundled
+v1.24.1 image) so the board only loads bytecode, or writes a manifest to
+freeze it into the image, where the bytecode stays in flash.
+
+main.py becomes the module monitor; a two-line main.py stub imports it
+and calls run().
+
+    python build_firmware.py                           # build/mpy/*.mpy + stub main.py
+    python build_firmware.py --native dsp_py,mixer     # those modules as native code
+    python build_firmware.py --deploy /dev/ttyACM0     # ... and copy them to the board
+    python build_firmware.py --freeze ~/micropython    # custom image with the modules frozen
+
+Compare builds with hardware/import_report.py (import time and heap per module):
+
+    mpremote reset && mpremote run ../hardware/import_report.py
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.normpath(os.path.join(HERE, '..'))
+HARDWARE = os.path.join(ROOT, 'hardware')
+
+# What the board runs; dsp_np is host-only and the test scripts stay .py
+MODULES = ('locks', 'dsp_py', 'dsp_viper', 'dsp', 'capture', 'playback', 'mixer', 'assets',
+           'telemetry', 'timing', 'health', 'levels', 'levelmap', 'bands', 'onset', 'filters',
+           'recorder', 'sdwriter', 'clips', 'mic_test')
+APP = ('main', 'monitor')  # Compiled under a new name, behind the stub
+SCRIPTS = ('import_report.py',)  # Copied as source: run, not imported
+BOARD = 'ESP32_GENERIC_S3'
+ARCH = 'xtensawin'  # ESP32-S3, for native and viper code
+
+STUB = """# Generated by build_firmware.py: the monitor is precompiled as monitor.mpy (or frozen)
+import monitor
+monitor.run()
+"""
+
+
+def bundled_version():
+    """MicroPython version of the image checked in next to hardware/, e.g. '1.24'"""
+    for name in os.listdir(ROOT):
+        match = re.match(BOARD + r'-\d+-v(\d+\.\d+)', name)
+        if match:
+            return match.group(1)
+    return None
+
+
+def find_mpy_cross(path):
+    if path:
+        return [path]
+    if shutil.which('mpy-cross'):
+        return ['mpy-cross']
+    try:
+        import mpy_cross  # noqa: F401
+    except ImportError:
+        sys.exit("mpy-cross not found: pip install mpy-cross==1.24.1.post3 or pass --mpy-cross")
+    return [sys.executable, '-m', 'mpy_cross']
+
+
+def check_version(mpy_cross):
+    out = subprocess.run(mpy_cross + ['--version'], capture_output=True, text=True).stdout
+    print(out.strip())
+    wanted = bundled_version()
+    match = re.search(r'v(\d+\.\d+)', out)
+    if wanted and match and match.group(1) != wanted:
+        print(f"WARNING: the bundled image is v{wanted}; a different mpy-cross may write "
+              f".mpy files it can't load")
+
+
+def compile_module(mpy_cross, src, dst, native, opt):
+    args = mpy_cross + [f'-march={ARCH}', f'-O{opt}', '-o', dst]
+    if native:
+        args.append('-X')
+        args.append('emit=native')
+    args.append(src)
+    result = subprocess.run(args, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(f"mpy-cross failed on {src}:\n{result.stderr}")
+
+
+def build_mpy(args, out):
+    mpy_cross = find_mpy_cross(args.mpy_cross)
+    check_version(mpy_cross)
+    native = set(args.native.split(',')) if args.native else set()
+    os.makedirs(out, exist_ok=True)
+
+    print(f"{'module':12s} {'source':>8s} {'mpy':>8s}")
+    total_src = total_mpy = 0
+    for name, target in [(m, m) for m in MODULES] + [APP]:
+        src = os.path.join(HARDWARE, name + '.py')
+        dst = os.path.join(out, target + '.mpy')
+        compile_module(mpy_cross, src, dst, target in native or name in native, args.opt)
+        src_size = os.path.getsize(src)
+        mpy_size = os.path.getsize(dst)
+        total_src += src_size
+        total_mpy += mpy_size
+        emit = ' native' if target in native or name in native else ''
+        print(f"{target:12s} {src_size:8d} {mpy_size:8d}{emit}")
+    print(f"{'total':12s} {total_src:8d} {total_mpy:8d}")
+
+    for script in SCRIPTS:
+        shutil.copy(os.path.join(HARDWARE, script), out)
+    with open(os.path.join(out, 'main.py'), 'w') as f:
+        f.write(STUB)
+    print(f"Built {out}")
+
+
+def write_manifest(out):
+    """Copy the modules to build/freeze and write a manifest freezing them"""
+    freeze_dir = os.path.join(out, 'freeze')
+    os.makedirs(freeze_dir, exist_ok=True)
+    for name, target in [(m, m) for m in MODULES] + [APP]:
+        shutil.copy(os.path.join(HARDWARE, name + '.py'), os.path.join(freeze_dir, target + '.py'))
+    manifest = os.path.join(out, 'manifest.py')
+    with open(manifest, 'w') as f:
+        f.write("# Generated by build_firmware.py: the board's usual modules plus the monitor\n")
+        f.write('include("$(PORT_DIR)/boards/manifest.py")\n')
+        f.write(f'freeze({freeze_dir!r})\n')
+    return manifest
+
+
+def mpremote(port, *command):
+    return subprocess.run(['mpremote', 'connect', port] + list(command),
+                          capture_output=True, text=True)
+
+
+def deploy(port, out):
+    """Copy the build to the board, removing the .py files that would shadow it"""
+    if not shutil.which('mpremote'):
+        sys.exit("Deploying needs mpremote (pip install mpremote)")
+    # The board imports name.py before name.mpy, so the sources have to go
+    for name in MODULES + ('monitor',):
+        mpremote(port, 'rm', f':{name}.py')
+    for name in sorted(os.listdir(out)):
+        if name.endswith('.mpy') or name.endswith('.py'):
+            result = mpremote(port, 'cp', os.path.join(out, name), ':' + name)
+            if result.returncode:
+                sys.exit(f"Copying {name} failed:\n{result.stderr}")
+            print(f"Copied {name}")
+    mpremote(port, 'reset')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default=os.path.join(ROOT, 'build'), help='build directory')
+    parser.add_argument('--mpy-cross', help='mpy-cross executable (default: PATH, then the pip package)')
+    parser.add_argument('--native', help='comma-separated modules to compile as native code')
+    parser.add_argument('-O', '--opt', type=int, default=0, choices=range(4),
+                        help='mpy-cross optimisation level (1 and up strip asserts)')
+    parser.add_argument('--deploy', metavar='PORT', help='copy the .mpy build to the board on PORT')
+    parser.add_argument('--freeze', metavar='MICROPYTHON',
+                        help='build a frozen image from this micropython checkout (needs ESP-IDF)')
+    args = parser.parse_args()
+
+    mpy_out = os.path.join(args.out, 'mpy')
+    build_mpy(args, mpy_out)
+
+    manifest = write_manifest(args.out)
+    make = ['make', '-C', os.path.join(args.freeze or '<micropython>', 'ports', 'esp32'),
+            f'BOARD={BOARD}', f'FROZEN_MANIFEST={manifest}']
+    if args.freeze:
+        version = bundled_version()
+        print(f"Building a frozen image (check out v{version} in {args.freeze} to match the bundled one)")
+        subprocess.run(make, check=True)
+        print(f"Flash {args.freeze}/ports/esp32/build-{BOARD}/firmware.bin, then copy "
+              f"{mpy_out}/main.py and remove any module .py files from the board")
+    else:
+        print(f"Frozen image: {manifest}\n  {' '.join(make)}")
+
+    if args.deploy:
+        deploy(args.deploy, mpy_out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""asyncio on the virtual clock, and an I2S stream like MicroPython's
+
+asyncio.run() picks up VirtualEventLoop once install() has set the
+policy: loop.time() is virtual and waiting for the next timer advances
+the clock instead of sleeping.
+"""
+import asyncio
+import math
+import selectors
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    def __init__(self, clock):
+        super().__init__()
+        self._vclock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            # Nothing scheduled: only another thread can wake the loop
+            return super().select(0.05)
+        self._vclock.sleep_us(int(math.ceil(timeout * 1000000)))
+        return super().select(0)
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(VirtualSelector(clock))
+        self._vclock = clock
+
+    def time(self):
+        return self._vclock.now_us / 1000000
+
+
+class VirtualLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    def __init__(self, clock):
+        super().__init__()
+        self._vclock = clock
+
+    def new_event_loop(self):
+        return VirtualEventLoop(self._vclock)
+
+
+def install(clock):
+    asyncio.set_event_loop_policy(VirtualLoopPolicy(clock))
+
+
+async def _sleep_until(clock, deadline_us):
+    if deadline_us > clock.now_us:
+        await asyncio.sleep((deadline_us - clock.now_us) / 1000000)
+
+
+class I2SStream:
+    """MicroPython asyncio Stream semantics over an emulated I2S"""
+
+    def __init__(self, i2s):
+        self.i2s = i2s
+        self.out_buf = b''
+
+    async def readinto(self, buf):
+        import machine
+        nbytes = memoryview(buf).nbytes
+        await _sleep_until(machine.clock, self.i2s.rx_ready_us(nbytes))
+        return self.i2s.readinto(buf)
+
+    def write(self, buf):
+        self.out_buf = bytes(self.out_buf) + bytes(buf)
+
+    async def drain(self):
+        import machine
+        if not self.out_buf:
+            return
+        data = memoryview(bytes(self.out_buf))
+        self.out_buf = b''
+        # Hand over a quarter of the DMA buffer at a time, like the real
+        # stream writing whatever fits, so large buffers never wait for
+        # the DMA to run empty
+        while data:
+            n = min(len(data), self.i2s.ibuf // 4)
+            await _sleep_until(machine.clock, self.i2s.tx_room_us(n))
+            self.i2s.write(data[:n])
+            data = data[n:]
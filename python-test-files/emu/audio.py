@@ -0,0 +1,142 @@
+"""Audio sources for emulated I2S RX and a timing sink for I2S TX
+
+Sources hold 16-bit mono PCM; the I2S emulation converts to whatever
+bits/format the firmware configured.
+"""
+import random
+import wave
+from array import array
+
+
+class PcmSource:
+    """16-bit mono PCM served frame by frame, optionally looped"""
+
+    def __init__(self, data, rate, loop=False, limit_frames=None):
+        self.samples = array('h')
+        self.samples.frombytes(bytes(data))
+        self.rate = rate
+        self.loop = loop
+        self.limit_frames = limit_frames
+        self.pos = 0
+        self.served = 0
+
+    def remaining(self):
+        if self.limit_frames is not None:
+            left = self.limit_frames - self.served
+        elif self.loop:
+            return None
+        else:
+            left = len(self.samples) - self.pos
+        return max(left, 0)
+
+    def read(self, nframes):
+        """Return up to nframes samples; fewer means end of input"""
+        left = self.remaining()
+        if left is not None:
+            nframes = min(nframes, left)
+        out = array('h')
+        while len(out) < nframes and self.samples:
+            if self.pos >= len(self.samples):
+                if not self.loop:
+                    break
+                self.pos = 0
+            take = min(nframes - len(out), len(self.samples) - self.pos)
+            out.extend(self.samples[self.pos:self.pos + take])
+            self.pos += take
+        self.served += len(out)
+        return out
+
+    def skip(self, nframes):
+        """Drop nframes samples, as the DMA does when nobody reads"""
+        self.read(nframes)
+
+
+def load_source(path, rate, loop=False, seconds=None):
+    """Load a WAV (any width, first channel) or raw 16-bit LE mono file"""
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as w:
+            width = w.getsampwidth()
+            channels = w.getnchannels()
+            file_rate = w.getframerate()
+            raw = w.readframes(w.getnframes())
+        samples = _to_mono16(raw, width, channels)
+        if file_rate != rate:
+            samples = _resample(samples, file_rate, rate)
+        data = samples.tobytes()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+        data = data[:len(data) & ~1]
+    limit = int(seconds * rate) if seconds else None
+    return PcmSource(data, rate, loop=loop, limit_frames=limit)
+
+
+def noise_source(rate, seconds, amplitude=800, seed=0, loop=False):
+    """Deterministic white noise, handy when no recording is at hand"""
+    rng = random.Random(seed)
+    samples = array('h', (int(rng.gauss(0, amplitude)) for _ in range(int(rate * seconds))))
+    for i, value in enumerate(samples):
+        samples[i] = max(-32767, min(32767, value))
+    return PcmSource(samples.tobytes(), rate, loop=loop)
+
+
+def _to_mono16(raw, width, channels):
+    if width == 2:
+        samples = array('h')
+        samples.frombytes(raw[:len(raw) & ~1])
+        return samples[::channels]
+    step = width * channels
+    out = array('h', bytes(2 * (len(raw) // step)))
+    for i in range(len(out)):
+        j = i * step
+        if width == 1:
+            value = (raw[j] - 128) << 8
+        else:
+            value = int.from_bytes(raw[j:j + width], 'little', signed=True) >> (8 * (width - 2))
+        out[i] = value
+    return out
+
+
+def _resample(samples, src_rate, dst_rate):
+    # Nearest-neighbour is plenty for level detection
+    count = len(samples) * dst_rate // src_rate
+    return array('h', (samples[i * src_rate // dst_rate] for i in range(count)))
+
+
+class TimingSink:
+    """Records when each I2S TX write would have reached the speaker
+
+    A gap is any stretch where the DMA ran dry between two writes - an
+    underrun while playing, or simply a pause.
+    """
+
+    def __init__(self, keep_audio=False):
+        self.writes = 0
+        self.bytes = 0
+        self.gaps = 0
+        self.gap_us = 0
+        self.first_sample_us = None
+        self.events = []  # (play_start_us, nbytes)
+        self.audio = bytearray() if keep_audio else None
+
+    def record(self, play_start_us, data, gap_us, bytes_per_us):
+        self.writes += 1
+        self.bytes += len(data)
+        if self.first_sample_us is None:
+            self.first_sample_us = play_start_us
+        if gap_us > 0:
+            self.gaps += 1
+            self.gap_us += gap_us
+        self.events.append((play_start_us, len(data)))
+        if self.audio is not None:
+            if gap_us > 0:
+                silence = int(gap_us * bytes_per_us) & ~1
+                self.audio.extend(bytes(silence))
+            self.audio.extend(data)
+
+    def save_wav(self, path, rate, bits=16):
+        with wave.open(path, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(bits // 8)
+            w.setframerate(rate)
+            w.writeframes(bytes(self.audio or b''))
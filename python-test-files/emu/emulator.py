@@ -0,0 +1,111 @@
+"""Install the host emulation and run firmware scripts under it
+
+    import emulator
+    emu = emulator.install(mic_source=src, sd_dir='sd')
+    emulator.run_script('main.py')
+
+install() must run before the firmware imports machine/uos/time.
+"""
+import _thread
+import os
+import runpy
+import sys
+import traceback
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HARDWARE_DIR = os.path.normpath(os.path.join(HERE, '..', '..', 'hardware'))
+
+import vclock
+import vfs
+import machine
+import audio
+import aio
+
+
+class Emulation:
+    def __init__(self, clock, sink):
+        self.clock = clock
+        self.sink = sink
+
+    def stats(self):
+        return {
+            'virtual_s': self.clock.now_us / 1000000,
+            'mic_overruns': machine.rx_overruns,
+            'mic_dropped_bytes': machine.rx_dropped_bytes,
+            'wdt_expiries': machine.wdt_expiries,
+            'speaker_writes': self.sink.writes,
+            'speaker_gaps': self.sink.gaps,
+            'speaker_gap_ms': self.sink.gap_us / 1000,
+            'sd_writes': vfs.write_stats['writes'],
+            'sd_stalls': vfs.write_stats['stalls'],
+            'sd_busy_ms': vfs.write_stats['busy_us'] / 1000,
+            'first_sample_s': None if self.sink.first_sample_us is None else self.sink.first_sample_us / 1000000,
+        }
+
+
+def _print_exception(exc, file=sys.stdout):
+    traceback.print_exception(type(exc), exc, exc.__traceback__, file=file)
+
+
+def _patch_threads(clock):
+    real_start = _thread.start_new_thread
+
+    def start_new_thread(func, args, kwargs=None):
+        clock.add_thread()
+
+        def run():
+            clock.thread_started()
+            try:
+                func(*args, **(kwargs or {}))
+            except SystemExit:
+                pass
+            finally:
+                clock.remove_thread()
+        return real_start(run, ())
+    _thread.start_new_thread = start_new_thread
+
+    real_allocate = _thread.allocate_lock
+    _thread.allocate_lock = lambda: vclock.VirtualLock(clock, real_allocate())
+
+
+def install(mic_source=None, sd_dir=None, cpu_scale=0.0, keep_audio=False, sd_present=True,
+            sd_latency=None):
+    """Wire machine/uos/time to a fresh virtual clock and return the Emulation
+
+    sd_latency: (write_us, kb_per_s, stall_ms, stall_kb) for writes to /sd,
+    see vfs.set_write_latency()
+    """
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    if HARDWARE_DIR not in sys.path:
+        sys.path.insert(1, HARDWARE_DIR)
+
+    clock = vclock.VirtualClock(cpu_scale)
+    vclock.install_time(clock)
+    _patch_threads(clock)
+    aio.install(clock)
+    sys.print_exception = _print_exception
+
+    if sd_dir is not None:
+        vfs.configure('/sd', sd_dir)
+    vfs.install()
+    if sd_latency:
+        vfs.set_write_latency(clock, *sd_latency)
+
+    sink = audio.TimingSink(keep_audio=keep_audio)
+    machine.clock = clock
+    machine.mic_source = mic_source
+    machine.speaker_sink = sink
+    machine.sd_present = sd_present and sd_dir is not None
+    return Emulation(clock, sink)
+
+
+def run_script(name):
+    """Run a firmware script from hardware/ as __main__, like the board does"""
+    path = name if os.path.isabs(name) else os.path.join(HARDWARE_DIR, name)
+    # Host-side setup isn't firmware CPU time
+    machine.clock.thread_started()
+    try:
+        return runpy.run_path(path, run_name='__main__')
+    except KeyboardInterrupt:
+        return None
@@ -0,0 +1,230 @@
+"""Emulated machine module for running the firmware on a host
+
+Only what the firmware touches is here. emulator.install() wires the
+module to a virtual clock, a microphone source and a speaker sink;
+until then I2S falls back to silence and a private clock.
+"""
+import _thread
+import threading
+from array import array
+
+import vclock
+
+# Set by emulator.install()
+clock = vclock.VirtualClock()
+mic_source = None
+speaker_sink = None
+sd_present = True
+
+# DMA overruns across every RX instance (data the firmware never saw)
+rx_overruns = 0
+rx_dropped_bytes = 0
+
+# Times a WDT ran out before it was fed (each would have reset the board)
+wdt_expiries = 0
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+
+    # Input levels by pin id, so a run can hold a button down
+    levels = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            Pin.levels[id] = value
+
+    def value(self, value=None):
+        if value is None:
+            default = 1 if self.pull == Pin.PULL_UP else 0
+            return Pin.levels.get(self.id, default)
+        Pin.levels[self.id] = 1 if value else 0
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING):
+        return None
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+
+class SDCard:
+    def __init__(self, slot=1, width=1, sck=None, mosi=None, miso=None, cs=None, freq=20000000):
+        if not sd_present:
+            raise OSError(16, 'no SD card')
+
+    def deinit(self):
+        pass
+
+
+class I2S:
+    RX = 0
+    TX = 1
+    MONO = 0
+    STEREO = 1
+
+    def __init__(self, id, **kwargs):
+        self.id = id
+        self.mode = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, sck=None, ws=None, sd=None, mck=None, mode=RX, bits=16,
+             format=MONO, rate=16000, ibuf=20000):
+        if bits not in (16, 32):
+            raise ValueError('invalid bits')
+        self.mode = mode
+        self.bits = bits
+        self.format = format
+        self.rate = rate
+        self.ibuf = ibuf
+        self.channels = 2 if format == I2S.STEREO else 1
+        self.frame_bytes = bits // 8 * self.channels
+        self.bytes_per_us = rate * self.frame_bytes / 1000000
+        self.start_us = clock.now_us
+        self.pos = 0            # RX: bytes handed to the firmware
+        self.tx_end_us = None   # TX: when queued audio finishes playing
+        self.overruns = 0
+        self.dropped_bytes = 0
+
+    def deinit(self):
+        self.mode = None
+
+    def _bytes_view(self, buf):
+        view = memoryview(buf)
+        return view.cast('B') if view.format != 'B' else view
+
+    def readinto(self, buf):
+        global rx_overruns, rx_dropped_bytes
+        if self.mode != I2S.RX:
+            raise OSError(22, 'I2S not configured for RX')
+        view = self._bytes_view(buf)
+        n = len(view) - len(view) % self.frame_bytes
+
+        # DMA keeps only ibuf bytes; anything older was overwritten
+        produced = int((clock.now_us - self.start_us) * self.bytes_per_us)
+        produced -= produced % self.frame_bytes
+        if produced - self.pos > self.ibuf:
+            dropped = produced - self.ibuf - self.pos
+            dropped -= dropped % self.frame_bytes
+            if dropped > 0:
+                self.overruns += 1
+                self.dropped_bytes += dropped
+                rx_overruns += 1
+                rx_dropped_bytes += dropped
+                self.pos += dropped
+                if mic_source is not None:
+                    mic_source.skip(dropped // self.frame_bytes)
+
+        clock.wait_until(self.rx_ready_us(n))
+
+        nframes = n // self.frame_bytes
+        samples = mic_source.read(nframes) if mic_source is not None else array('h', bytes(2 * nframes))
+        if len(samples) < nframes:
+            _end_of_input()
+            samples.extend(array('h', bytes(2 * (nframes - len(samples)))))
+        view[:n] = self._encode(samples)
+        self.pos += n
+        return n
+
+    def rx_ready_us(self, nbytes):
+        """Virtual time at which the next nbytes of RX data exist"""
+        return self.start_us + (self.pos + nbytes) / self.bytes_per_us
+
+    def tx_room_us(self, nbytes):
+        """Virtual time at which the TX DMA buffer has room for nbytes"""
+        if self.tx_end_us is None or self.tx_end_us < clock.now_us:
+            return clock.now_us
+        return self.tx_end_us + (nbytes - self.ibuf) / self.bytes_per_us
+
+    def asyncio_stream(self):
+        """Stand-in for asyncio.StreamReader/StreamWriter over this I2S"""
+        import aio
+        return aio.I2SStream(self)
+
+    def _encode(self, samples):
+        if self.bits == 16 and self.channels == 1:
+            return samples.tobytes()
+        if self.bits == 16:
+            out = array('h', bytes(2 * self.channels * len(samples)))
+        else:
+            out = array('i', bytes(4 * self.channels * len(samples)))
+            samples = array('i', (s << 16 for s in samples))
+        # Left channel only, like an INMP441 with L/R tied to ground
+        out[0::self.channels] = samples
+        return out.tobytes()
+
+    def write(self, buf):
+        if self.mode != I2S.TX:
+            raise OSError(22, 'I2S not configured for TX')
+        data = bytes(self._bytes_view(buf))
+        duration_us = len(data) / self.bytes_per_us
+
+        gap_us = 0
+        if self.tx_end_us is None or self.tx_end_us < clock.now_us:
+            if self.tx_end_us is not None:
+                gap_us = clock.now_us - self.tx_end_us
+            self.tx_end_us = clock.now_us
+
+        # Block until the DMA buffer has room for this write
+        clock.wait_until(self.tx_room_us(len(data)))
+
+        if speaker_sink is not None:
+            speaker_sink.record(self.tx_end_us, data, gap_us, self.bytes_per_us)
+        self.tx_end_us += duration_us
+        return len(data)
+
+
+class WDT:
+    """Counts expiries instead of resetting, checked whenever it is fed"""
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout_us = timeout * 1000
+        self.fed_us = clock.now_us
+
+    def feed(self):
+        global wdt_expiries
+        if clock.now_us - self.fed_us > self.timeout_us:
+            wdt_expiries += 1
+        self.fed_us = clock.now_us
+
+
+def _end_of_input():
+    # Stop the firmware the way Ctrl-C at the REPL would
+    if threading.current_thread() is threading.main_thread():
+        raise KeyboardInterrupt
+    _thread.interrupt_main()
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def unique_id():
+    return b'\x00emu00'
+
+
+def idle():
+    clock.sleep_us(1000)
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+def soft_reset():
+    raise SystemExit('machine.soft_reset()')
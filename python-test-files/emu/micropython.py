@@ -0,0 +1,25 @@
+"""Emulated micropython module - decorators are no-ops on the host"""
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=False):
+    print('mem: not available under emulation')
+
+
+def schedule(func, arg):
+    func(arg)
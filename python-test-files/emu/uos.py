@@ -0,0 +1,61 @@
+"""Emulated uos: the host os module plus MicroPython's mount/umount"""
+import os
+import vfs
+
+sep = '/'
+
+
+def mount(device, mount_point, readonly=False):
+    vfs.mount(device, mount_point)
+
+
+def umount(mount_point):
+    vfs.umount(mount_point)
+
+
+def listdir(path='.'):
+    return os.listdir(path)
+
+
+def stat(path):
+    return tuple(os.stat(path))
+
+
+def statvfs(path):
+    return tuple(os.statvfs(path))
+
+
+def remove(path):
+    os.remove(path)
+
+
+def rename(src, dst):
+    os.rename(src, dst)
+
+
+def mkdir(path):
+    os.mkdir(path)
+
+
+def rmdir(path):
+    os.rmdir(path)
+
+
+def getcwd():
+    return os.getcwd()
+
+
+def urandom(n):
+    return os.urandom(n)
+
+
+def uname():
+    return ('esp32', 'emulator', '1.24.1', 'host emulation', 'ESP32S3 (emulated)')
+
+
+def sync():
+    pass
+
+
+def dupterm(stream=None, index=0):
+    return None
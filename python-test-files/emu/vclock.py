@@ -0,0 +1,179 @@
+"""Virtual clock for running the firmware faster than real time
+
+Time only moves when every registered thread is blocked in a sleep, an
+emulated I2S wait or a lock; the clock then jumps to the earliest
+deadline.
+
+Computation is free unless cpu_scale is set, in which case the wall
+time a thread spent running since it last woke (times cpu_scale) is
+charged to it before it can wait - set it to roughly how much slower
+the target CPU is than the host to surface loop overruns.
+"""
+import threading
+import time
+
+TICKS_PERIOD = 1 << 30
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+
+class VirtualClock:
+    def __init__(self, cpu_scale=0.0):
+        self.now_us = 0
+        self.cpu_scale = cpu_scale
+        self._cond = threading.Condition()
+        self._active = 1  # the thread that creates the clock
+        self._deadlines = []  # one entry per waiting thread
+        self._blocked = 0     # threads blocked on a VirtualLock
+        self._local = threading.local()
+        self._local.resumed = time.perf_counter()
+
+    def add_thread(self):
+        """Call before starting a thread so the clock can't run ahead of it"""
+        with self._cond:
+            self._active += 1
+
+    def thread_started(self):
+        self._local.resumed = time.perf_counter()
+
+    def remove_thread(self):
+        with self._cond:
+            self._active -= 1
+            self._advance_if_idle()
+
+    def _charge_cpu(self, deadline_us):
+        if not self.cpu_scale:
+            return deadline_us
+        resumed = getattr(self._local, 'resumed', None)
+        if resumed is None:
+            return deadline_us
+        busy_us = int((time.perf_counter() - resumed) * 1e6 * self.cpu_scale)
+        return max(deadline_us, self.now_us + busy_us)
+
+    def wait_until(self, deadline_us):
+        """Block the calling thread until virtual time reaches deadline_us"""
+        with self._cond:
+            deadline_us = self._charge_cpu(int(deadline_us))
+            if deadline_us > self.now_us:
+                self._deadlines.append(deadline_us)
+                try:
+                    while self.now_us < deadline_us:
+                        self._advance_if_idle()
+                        if self.now_us >= deadline_us:
+                            break
+                        # Timeout only so KeyboardInterrupt gets through
+                        self._cond.wait(0.05)
+                finally:
+                    self._deadlines.remove(deadline_us)
+        self._local.resumed = time.perf_counter()
+
+    def sleep_us(self, us):
+        self.wait_until(self.now_us + us)
+
+    def block(self, lock):
+        with self._cond:
+            self._blocked += 1
+            lock.waiting += 1
+            self._advance_if_idle()
+
+    def wake(self, lock):
+        # Count a waiter as running from the release, not from when the
+        # OS gets round to scheduling it, so time can't slip past it
+        with self._cond:
+            if lock.waiting > lock.handed_off:
+                lock.handed_off += 1
+                self._blocked -= 1
+
+    def unblock(self, lock):
+        with self._cond:
+            lock.waiting -= 1
+            if lock.handed_off:
+                lock.handed_off -= 1
+            else:
+                self._blocked -= 1
+        self._local.resumed = time.perf_counter()
+
+    def _advance_if_idle(self):
+        if self._deadlines and len(self._deadlines) + self._blocked >= self._active:
+            earliest = min(self._deadlines)
+            if earliest > self.now_us:
+                self.now_us = earliest
+                self._cond.notify_all()
+
+    # MicroPython time API
+
+    def ticks_us(self):
+        return self.now_us & _TICKS_MAX
+
+    def ticks_ms(self):
+        return (self.now_us // 1000) & _TICKS_MAX
+
+    def ticks_cpu(self):
+        return self.ticks_us()
+
+
+class VirtualLock:
+    """_thread lock whose blocking acquire counts as idle for the clock"""
+
+    def __init__(self, clock, lock):
+        self._clock = clock
+        self._lock = lock
+        self.waiting = 0
+        self.handed_off = 0
+
+    def acquire(self, waitflag=1, timeout=-1):
+        if self._lock.acquire(False):
+            return True
+        if not waitflag:
+            return False
+        if self._clock.cpu_scale:
+            # Pay for the work done so far before going idle
+            self._clock.wait_until(self._clock.now_us)
+        self._clock.block(self)
+        try:
+            # Short real timeouts only so KeyboardInterrupt gets through
+            while not self._lock.acquire(True, 0.05):
+                pass
+        finally:
+            self._clock.unblock(self)
+        return True
+
+    def release(self):
+        self._clock.wake(self)
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    if diff >= _TICKS_HALF:
+        diff -= TICKS_PERIOD
+    return diff
+
+
+def install_time(clock, epoch=None):
+    """Point the time module's sleeps and MicroPython ticks at the clock"""
+    if epoch is None:
+        epoch = time.time()
+    time.sleep = lambda seconds: clock.sleep_us(int(seconds * 1000000))
+    time.sleep_ms = lambda ms: clock.sleep_us(int(ms) * 1000)
+    time.sleep_us = lambda us: clock.sleep_us(int(us))
+    time.ticks_us = clock.ticks_us
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_cpu = clock.ticks_cpu
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.time = lambda: epoch + clock.now_us / 1000000
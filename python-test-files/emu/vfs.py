@@ -0,0 +1,131 @@
+"""Map device mount points such as /sd onto local directories
+
+Paths under a mount point only resolve while it is mounted, like on
+the board, so code that touches /sd before mounting still fails.
+
+set_write_latency() makes writes to files under a mount point cost
+virtual time the way an SD card does: a fixed cost per write call, a
+transfer rate, and a long stall (erase-block housekeeping, FAT cluster
+allocation) every so many bytes.
+"""
+import builtins
+import errno
+import os
+
+_backing = {}   # mount point -> local directory (set by configure)
+_mounted = {}   # mount point -> local directory (set by mount)
+
+_real_open = builtins.open
+_real = {}
+_latency = None  # (clock, write_us, us_per_kb, stall_us, stall_bytes)
+write_stats = {'writes': 0, 'bytes': 0, 'stalls': 0, 'busy_us': 0}
+
+
+def configure(mount_point, directory):
+    """Declare which local directory backs a mount point"""
+    _backing[mount_point] = os.path.abspath(directory)
+
+
+def mount(device, mount_point):
+    if mount_point in _mounted:
+        raise OSError(errno.EPERM, 'already mounted')
+    if mount_point not in _backing:
+        raise OSError(errno.ENODEV, 'no backing directory for ' + mount_point)
+    os.makedirs(_backing[mount_point], exist_ok=True)
+    _mounted[mount_point] = _backing[mount_point]
+
+
+def umount(mount_point):
+    if mount_point not in _mounted:
+        raise OSError(errno.EINVAL, 'not mounted')
+    del _mounted[mount_point]
+
+
+def is_mounted(mount_point):
+    return mount_point in _mounted
+
+
+def map_path(path):
+    if not isinstance(path, str):
+        return path
+    for point in _backing:
+        if path == point or path.startswith(point + '/'):
+            if point not in _mounted:
+                raise OSError(errno.ENOENT, 'not mounted', path)
+            return _mounted[point] + path[len(point):]
+    return path
+
+
+def _wrap(name):
+    real = getattr(os, name)
+    _real[name] = real
+
+    def mapped(path, *args, **kwargs):
+        return real(map_path(path), *args, **kwargs)
+    return mapped
+
+
+def _rename(src, dst):
+    return _real['rename'](map_path(src), map_path(dst))
+
+
+def set_write_latency(clock, write_us=0, kb_per_s=0, stall_ms=0, stall_kb=0):
+    """Charge each write under a mount point write_us plus its size at
+    kb_per_s, and stall_ms more every stall_kb written (0 = free)"""
+    global _latency
+    us_per_kb = 1000000 / kb_per_s if kb_per_s else 0
+    _latency = (clock, write_us, us_per_kb, stall_ms * 1000, stall_kb * 1024)
+
+
+class _TimedFile:
+    """A file whose writes take virtual time; everything else passes through"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, data):
+        n = self._f.write(data)
+        clock, write_us, us_per_kb, stall_us, stall_bytes = _latency
+        cost = write_us + int(n * us_per_kb / 1024)
+        before = write_stats['bytes']
+        write_stats['writes'] += 1
+        write_stats['bytes'] += n
+        if stall_bytes and before // stall_bytes != (before + n) // stall_bytes:
+            write_stats['stalls'] += 1
+            cost += stall_us
+        if cost:
+            write_stats['busy_us'] += cost
+            clock.sleep_us(cost)
+        return n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def _open(file, *args, **kwargs):
+    path = map_path(file)
+    f = _real_open(path, *args, **kwargs)
+    mode = args[0] if args else kwargs.get('mode', 'r')
+    if _latency and path != file and any(c in mode for c in 'wa+'):
+        return _TimedFile(f)
+    return f
+
+
+def install():
+    """Patch open() and the os path functions to honour mount points"""
+    if _real:
+        return
+    for name in ('listdir', 'stat', 'remove', 'mkdir', 'rmdir', 'statvfs'):
+        setattr(os, name, _wrap(name))
+    _real['rename'] = os.rename
+    os.rename = _rename
+    builtins.open = _open
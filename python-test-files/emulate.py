@@ -0,0 +1,81 @@
+"""Run the firmware on this computer against recorded room audio
+
+The unmodified hardware/ scripts run against an emulated machine/uos
+(see emu/): the microphone is fed from a WAV or raw file, the speaker
+goes to a timing sink, /sd maps to a local directory and time is
+virtual, so an hour of audio replays in seconds.
+
+    python emulate.py --input room.wav --sd ./sd
+    python emulate.py --input room.wav --sd ./sd --speaker-out out.wav
+    python emulate.py --script mic_test.py --rate 40000 --sd ./sd
+    python emulate.py --script mic_test.py --rate 40000 --sd ./sd --sd-latency 2000,800,250,512
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emu'))
+import emulator
+import audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default='main.py', help='firmware script in hardware/')
+    parser.add_argument('--input', help='WAV or raw 16-bit mono file for the microphone (default: noise)')
+    parser.add_argument('--rate', type=int, default=16000, help='mic sample rate the script configures')
+    parser.add_argument('--sd', default='sd', help='local directory that backs /sd')
+    parser.add_argument('--loop', action='store_true', help='loop the input')
+    parser.add_argument('--duration', type=float, help='stop after this many seconds of audio')
+    parser.add_argument('--cpu-scale', type=float, default=0.0,
+                        help='charge host CPU time x this factor to the virtual clock')
+    parser.add_argument('--sd-latency', type=lambda text: [float(v) for v in text.split(',')],
+                        help='SD writes as WRITE_US,KB_PER_S,STALL_MS,STALL_KB: a cost per write, '
+                             'a transfer rate and a stall every STALL_KB written')
+    parser.add_argument('--speaker-out', help='save what the speaker played to this WAV')
+    parser.add_argument('--log', default=os.devnull, help='where firmware output goes')
+    parser.add_argument('--verbose', action='store_true', help='show firmware output')
+    args = parser.parse_args()
+
+    if args.input:
+        source = audio.load_source(args.input, args.rate, loop=args.loop, seconds=args.duration)
+    else:
+        source = audio.noise_source(args.rate, 10, loop=True)
+        source.limit_frames = int((args.duration or 10) * args.rate)
+
+    emu = emulator.install(mic_source=source, sd_dir=args.sd, cpu_scale=args.cpu_scale,
+                           keep_audio=bool(args.speaker_out), sd_latency=args.sd_latency)
+
+    started = time.perf_counter()
+    real_stdout = sys.stdout
+    log = None
+    if not args.verbose:
+        log = open(args.log, 'w')
+        sys.stdout = log
+    try:
+        emulator.run_script(args.script)
+    finally:
+        sys.stdout = real_stdout
+        if log:
+            log.close()
+    wall = time.perf_counter() - started
+
+    stats = emu.stats()
+    print(f"Virtual time: {stats['virtual_s']:.1f}s in {wall:.2f}s wall "
+          f"({stats['virtual_s'] / wall if wall else 0:.0f}x real time)")
+    print(f"Mic: {stats['mic_overruns']} DMA overruns")
+    if stats['wdt_expiries']:
+        print(f"WDT: {stats['wdt_expiries']} expiries (the board would have reset)")
+    print(f"Speaker: {stats['speaker_writes']} writes, {stats['speaker_gaps']} gaps "
+          f"({stats['speaker_gap_ms']:.1f} ms)")
+    if args.sd_latency:
+        print(f"SD: {stats['sd_writes']} writes, {stats['sd_stalls']} stalls, "
+              f"{stats['sd_busy_ms']:.0f} ms busy")
+    if args.speaker_out:
+        emu.sink.save_wav(args.speaker_out, 16000)
+        print(f"Speaker output saved to {args.speaker_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Score trigger latency and false triggers on labelled recordings
+
+Replays each recording through the firmware's level path (main.handle_level(),
+as sweep_analysis.py does) once per trigger configuration - the onset
+detector at each --decide/--cap and the old fixed count at each --counts -
+and scores the playback starts against the labels:
+
+    detected  labelled stretches a trigger started in (or up to --grace after)
+    covered   ... already playing when they began (a trigger from before)
+    missed    ... with neither
+    latency   labelled start to trigger: median, 90th percentile, worst
+    false/h   triggers outside every labelled stretch, per hour of audio
+
+Labels are Audacity label tracks (Tracks > Add New > Label Track, then File >
+Export > Labels): one "start<TAB>end<TAB>text" line per stretch, in seconds,
+of sound that should trigger. Everything else in the recording should not.
+
+    python onset_eval.py --input talk.wav --labels talk.txt
+    python onset_eval.py --input a.wav --labels a.txt --input b.wav --labels b.txt
+    python onset_eval.py --input talk.wav --labels talk.txt --decide 16,24,32 --cap 6,8 --counts 320,1280
+    python onset_eval.py --synth synth.wav       # write a labelled synthetic recording to try it on
+
+The synthetic recording (noise floor, hum, speech-like bursts at several
+levels, door thumps, footsteps and an HVAC swell that should not trigger)
+is a smoke test, not a substitute for real rooms. Only detections are
+scored here, not CPU, so kernels run on numpy when it is installed.
+"""
+import argparse
+import math
+import os
+import random
+import wave
+from array import array
+
+os.environ.setdefault('DSP_BACKEND', 'dsp_np')  # Before sweep_analysis picks dsp_py
+import sweep_analysis
+from sweep_analysis import Replay, int_list
+
+MIC_RATE = 16000
+
+
+def float_list(text):
+    return [float(v) for v in text.split(',')]
+
+
+def load_labels(path):
+    """[(start s, end s)] from an Audacity label export"""
+    stretches = []
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split('\t')
+            # Spectral-selection lines start with '\\'; skip them and blanks
+            if len(fields) < 2 or fields[0].startswith('\\'):
+                continue
+            start, end = float(fields[0]), float(fields[1])
+            stretches.append((start, max(start, end)))
+    return sorted(stretches)
+
+
+def score(events, stretches, seconds, grace_s):
+    """Detection counts, latencies (ms) and false triggers of one replay"""
+    starts = [ms / 1000 for ms, kind in events if kind == 'start']
+    latencies = []
+    covered = missed = 0
+    for start, end in stretches:
+        hits = [t for t in starts if start <= t <= end + grace_s]
+        if hits:
+            latencies.append((hits[0] - start) * 1000)
+        elif playing_at(events, start):
+            covered += 1
+        else:
+            missed += 1
+    false = sum(1 for t in starts
+                if not any(start <= t <= end + grace_s for start, end in stretches))
+    return {'detected': len(latencies), 'covered': covered, 'missed': missed,
+            'latencies': latencies, 'false': false, 'seconds': seconds}
+
+
+def playing_at(events, t):
+    playing = False
+    for ms, kind in events:
+        if ms / 1000 > t:
+            break
+        playing = kind == 'start'
+    return playing
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def combine(results):
+    total = {'detected': 0, 'covered': 0, 'missed': 0, 'latencies': [], 'false': 0, 'seconds': 0}
+    for result in results:
+        for key in total:
+            total[key] += result[key]
+    return total
+
+
+# ===== SYNTHETIC RECORDING =====
+
+def _onepole(values, alpha):
+    """Low-pass y += alpha * (x - y), in place"""
+    y = 0.0
+    for i, x in enumerate(values):
+        y += alpha * (x - y)
+        values[i] = y
+
+
+def synthesize(path, seconds=120, seed=1):
+    """Write a labelled 16 kHz test recording to path and its labels next to it"""
+    rng = random.Random(seed)
+    rate = MIC_RATE
+    n = seconds * rate
+    out = [rng.gauss(0, 60) + 40 * math.sin(2 * math.pi * 60 * i / rate) for i in range(n)]
+    labels = []
+
+    def burst(start_s, length_s, amplitude, lo_alpha, hi_alpha, syllable_hz):
+        # Band-limited noise (difference of two low-passes), amplitude-modulated
+        count = int(length_s * rate)
+        noise = [rng.gauss(0, 1) for _ in range(count)]
+        low = list(noise)
+        _onepole(noise, hi_alpha)
+        _onepole(low, lo_alpha)
+        first = int(start_s * rate)
+        for i in range(count):
+            envelope = 1.0
+            if syllable_hz:
+                envelope = 0.25 + 0.75 * max(0.0, math.sin(math.pi * syllable_hz * i / rate)) ** 2
+            if first + i < n:
+                out[first + i] += amplitude * envelope * (noise[i] - low[i])
+
+    # Speech-like: 300-3000 Hz, ~4 syllables a second, from barely over the floor to loud
+    t = 8.0
+    for amplitude in (600, 1200, 2500, 5000, 900, 3000, 1500, 8000):
+        length = rng.uniform(1.5, 4.0)
+        burst(t, length, amplitude, 0.11, 0.7, 4.0)
+        labels.append((t, t + length))
+        t += length + rng.uniform(6.0, 9.0)
+
+    # Distractors, unlabelled: door thumps, a run of footsteps, an HVAC swell
+    for start in (5.0, 47.3, 90.2):
+        burst(start, 0.08, 20000, 0.005, 0.05, 0)
+    for step in range(8):
+        burst(110.0 + 0.55 * step, 0.06, 6000, 0.01, 0.08, 0)
+    for i in range(int(100 * rate), min(n, int(106 * rate))):
+        swell = math.sin(math.pi * (i - 100 * rate) / (6 * rate))
+        out[i] += 400 * swell * math.sin(2 * math.pi * 120 * i / rate)
+
+    pcm = array('h', (max(-32767, min(32767, int(v))) for v in out))
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    label_path = os.path.splitext(path)[0] + '.txt'
+    with open(label_path, 'w') as f:
+        for start, end in labels:
+            f.write(f"{start:.3f}\t{end:.3f}\tspeech\n")
+    print(f"Wrote {path} ({seconds} s) and {label_path} ({len(labels)} labelled stretches)")
+
+
+# ===== REPLAY =====
+
+def replay(firmware, recordings, onset, decide, cap, count_ms, grace_s):
+    firmware.ONSET_DETECTOR = onset
+    firmware.ONSET_DECIDE_DB = decide
+    firmware.ONSET_CAP_DB = cap
+    firmware.ABOVE_THRESHOLD_MS = count_ms
+    results = []
+    for samples, stretches in recordings:
+        run = Replay(firmware, samples, MIC_RATE, firmware.FRAME_SAMPLES, firmware.ANALYSIS_STEP)
+        results.append(score(run.events, stretches, run.seconds(), grace_s))
+    return combine(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', action='append', default=[], help='WAV or raw 16-bit mono recording')
+    parser.add_argument('--labels', action='append', default=[], help='Audacity labels, one per --input')
+    parser.add_argument('--decide', type=float_list, help='onset detector ONSET_DECIDE_DB values')
+    parser.add_argument('--cap', type=float_list, help='onset detector ONSET_CAP_DB values')
+    parser.add_argument('--counts', type=int_list, help='fixed-count ABOVE_THRESHOLD_MS values')
+    parser.add_argument('--grace', type=float, default=1.0, help='seconds after a stretch a trigger still counts')
+    parser.add_argument('--synth', metavar='WAV', help='write a labelled synthetic recording and exit')
+    args = parser.parse_args()
+
+    if args.synth:
+        synthesize(args.synth)
+        return
+    if not args.input or len(args.input) != len(args.labels):
+        parser.error('give each --input its --labels')
+
+    firmware = sweep_analysis.load_firmware()
+    recordings = []
+    for path, label_path in zip(args.input, args.labels):
+        samples = sweep_analysis.audio.load_source(path, MIC_RATE).samples
+        recordings.append((samples, load_labels(label_path)))
+    stretches = sum(len(r[1]) for r in recordings)
+    print(f"{len(recordings)} recording(s), {stretches} labelled stretches")
+
+    configs = []
+    for decide in args.decide or [firmware.ONSET_DECIDE_DB]:
+        for cap in args.cap or [firmware.ONSET_CAP_DB]:
+            configs.append((f"onset {decide:g}/{cap:g} dB", True, decide, cap, firmware.ABOVE_THRESHOLD_MS))
+    for count_ms in args.counts or [firmware.ABOVE_THRESHOLD_MS]:
+        configs.append((f"count {count_ms} ms", False, firmware.ONSET_DECIDE_DB,
+                        firmware.ONSET_CAP_DB, count_ms))
+
+    print(f"{'trigger':22s} {'detected':>8s} {'covered':>7s} {'missed':>6s} "
+          f"{'median ms':>9s} {'p90 ms':>7s} {'worst ms':>8s} {'false':>5s} {'false/h':>7s}")
+    for name, onset, decide, cap, count_ms in configs:
+        total = replay(firmware, recordings, onset, decide, cap, count_ms, args.grace)
+        latencies = total['latencies']
+        hours = total['seconds'] / 3600 or 1
+        print(f"{name:22s} {total['detected']:8d} {total['covered']:7d} {total['missed']:6d} "
+              f"{percentile(latencies, 50):9.0f} {percentile(latencies, 90):7.0f} "
+              f"{max(latencies) if latencies else float('nan'):8.0f} {total['false']:5d} "
+              f"{total['false'] / hours:7.1f}")
+
+
+if __name__ == '__main__':
+    main()
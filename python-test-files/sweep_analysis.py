@@ -0,0 +1,235 @@
+"""Sweep the analysis rate, frame length and decimation on recorded input
+
+Replays a recording through the firmware's own level path (FrameCapture
+and main.handle_level(), via the host emulation) once per configuration
+and reports what it costs against what it detects, relative to a
+reference configuration (by default the highest rate, 1024-sample
+frames, every sample):
+
+    cpu us/s  analysis time per second of audio, on this host
+    samples/s samples the analysis touches per second (device-independent)
+    gate %    share of time the above/below-threshold decision matches
+    events    trigger/pause events matched within --tolerance, missed, extra
+    shift ms  mean timing error of the matched events
+
+    python sweep_analysis.py --input room.wav
+    python sweep_analysis.py --input room.wav --rates 16000,8000 --frames 1024,512 --steps 1,2,4,8
+    python sweep_analysis.py --input room.wav --csv sweep.csv
+
+Kernels run on the pure-Python backend unless DSP_BACKEND says otherwise,
+so per-sample cost scales the way it does on the device. --ibufs only
+changes the DMA slack column (how late the capture thread may be
+without an overrun); the replay itself never overruns.
+"""
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault('DSP_BACKEND', 'dsp_py')
+sys.path.insert(0, os.path.join(HERE, 'emu'))
+sys.path.insert(1, os.path.join(HERE, '..', 'hardware'))
+import emulator
+import audio
+from capture import FrameCapture
+from levels import LevelTracker
+from bands import BandAnalyzer
+from onset import OnsetDetector
+from filters import FilterChain, DCBlocker, NoiseGate
+
+GRID_MS = 10  # Resolution the gate decisions are compared at
+
+
+def int_list(text):
+    return [int(v) for v in text.split(',')]
+
+
+class Replay:
+    """One configuration's pass over the input"""
+
+    def __init__(self, main, samples, rate, frame_samples, step):
+        self.rate = rate
+        self.frame_samples = frame_samples
+        self.step = step
+        self.frame_ms = frame_samples * 1000 / rate
+        self.capture = FrameCapture(frame_samples, step)
+        self.filters = input_filters(main, rate)
+        self.bands = None
+        if main.BANDS and frame_samples >= main.BAND_FFT:
+            self.bands = BandAnalyzer(rate, main.BAND_EDGES_HZ, main.BAND_WEIGHTS, main.BAND_FFT,
+                                      frame_samples, main.BAND_SEGMENTS)
+        self.gate = []    # (end ms, above threshold) per frame
+        self.events = []  # (ms, 'start' | 'pause')
+        self.cpu_ns = 0
+        self.frames = 0
+        self._run(main, samples)
+
+    def _run(self, main, samples):
+        reset_trigger_state(main, self.frame_samples * 1000 // self.rate)
+        capture = self.capture
+        frame = capture.frame
+        n = self.frame_samples
+        playing = False
+        for start in range(0, len(samples) - n + 1, n):
+            frame[:] = samples[start:start + n]
+            t = time.perf_counter_ns()
+            self.filters.process(frame, n)
+            acc = capture.sumsq(frame, main.MIC_GAIN)
+            rms = math.sqrt(acc * capture.ms_scale)
+            if self.bands:
+                self.bands.analyze(frame)
+                main.speech_weight = self.bands.weighting()
+                main.spectral_flux = self.bands.flux()
+            threshold = main.trigger_threshold()
+            main.handle_level(main.frame_level(acc, rms), rms)
+            self.cpu_ns += time.perf_counter_ns() - t
+            self.frames += 1
+
+            end_ms = (start + n) * 1000 / self.rate
+            self.gate.append((end_ms, rms * main.speech_weight > threshold))
+            now_playing = main.audio_playing and not main.audio_paused
+            if now_playing != playing:
+                self.events.append((end_ms, 'start' if now_playing else 'pause'))
+                playing = now_playing
+
+    def seconds(self):
+        return self.frames * self.frame_samples / self.rate
+
+    def gate_at(self, ms):
+        """Decision in force at ms: that of the frame being captured"""
+        index = min(int(ms // self.frame_ms), len(self.gate) - 1)
+        return self.gate[index][1]
+
+
+def input_filters(main, rate):
+    """main.input_filters as configured, at this rate"""
+    filters = FilterChain()
+    if main.DC_BLOCK and main.ADAPTIVE_LEVELS:
+        filters.stages.append(DCBlocker(rate, main.DC_CUTOFF_HZ))
+    if main.NOISE_GATE_LEVEL:
+        filters.stages.append(NoiseGate(rate, main.NOISE_GATE_LEVEL))
+    return filters
+
+
+def reset_trigger_state(main, frame_ms):
+    main.above_threshold_count = 0
+    main.below_threshold_count = 0
+    main.audio_playing = main.audio_should_play = main.audio_paused = False
+    main.variant_choice = main.variant_count = 0
+    main.speech_weight = 1.0
+    main.spectral_flux = 0.0
+    main.ABOVE_THRESHOLD_REQUIRED = max(1, main.ABOVE_THRESHOLD_MS // frame_ms)
+    main.BELOW_THRESHOLD_REQUIRED = max(1, main.BELOW_THRESHOLD_MS // frame_ms)
+    # Each run learns the room from scratch, at its own frame rate
+    main.levels = LevelTracker(frame_ms, threshold_db=main.THRESHOLD_DB,
+                               min_threshold=main.THRESHOLD_MIN_RMS)
+    main.onset = OnsetDetector(frame_ms, main.ONSET_DECIDE_DB, main.ONSET_CAP_DB,
+                               main.ONSET_DRIFT_DB, main.ONSET_FLUX_GAIN)
+
+
+def compare_events(reference, events, tolerance_ms):
+    """(matched, missed, extra, mean |shift| ms) of events against reference"""
+    unused = list(events)
+    shifts = []
+    for ms, kind in reference:
+        best = None
+        for candidate in unused:
+            if candidate[1] == kind and abs(candidate[0] - ms) <= tolerance_ms:
+                if best is None or abs(candidate[0] - ms) < abs(best[0] - ms):
+                    best = candidate
+        if best:
+            unused.remove(best)
+            shifts.append(abs(best[0] - ms))
+    matched = len(shifts)
+    mean_shift = sum(shifts) / matched if matched else 0.0
+    return matched, len(reference) - matched, len(unused), mean_shift
+
+
+def gate_agreement(reference, replay):
+    span = min(reference.seconds(), replay.seconds()) * 1000
+    points = int(span // GRID_MS)
+    if not points:
+        return 0.0
+    same = sum(1 for i in range(points)
+               if reference.gate_at(i * GRID_MS) == replay.gate_at(i * GRID_MS))
+    return 100.0 * same / points
+
+
+def load_firmware():
+    """Import main.py under the emulation, quietly"""
+    emulator.install(sd_dir=None)
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')  # main prints on import
+    try:
+        import main as firmware
+    finally:
+        sys.stdout = real_stdout
+    firmware.DEBUG_LEVEL = 0
+    return firmware
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', required=True, help='WAV or raw 16-bit mono recording')
+    parser.add_argument('--rates', type=int_list, default=[16000, 8000])
+    parser.add_argument('--frames', type=int_list, default=[1024, 512, 256])
+    parser.add_argument('--steps', type=int_list, default=[1, 2, 4, 8])
+    parser.add_argument('--ibufs', type=int_list, default=[4000])
+    parser.add_argument('--reference', type=int_list, metavar='RATE,FRAME,STEP',
+                        help='configuration the others are scored against')
+    parser.add_argument('--tolerance', type=float, default=500, help='event match window, ms')
+    parser.add_argument('--csv', help='also write the results here')
+    args = parser.parse_args()
+
+    firmware = load_firmware()
+
+    cache = {}
+
+    def samples_at(rate):
+        if rate not in cache:
+            cache[rate] = audio.load_source(args.input, rate).samples
+        return cache[rate]
+
+    ref_rate, ref_frame, ref_step = args.reference or (max(args.rates), 1024, 1)
+    reference = Replay(firmware, samples_at(ref_rate), ref_rate, ref_frame, ref_step)
+    print(f"Reference: {ref_rate} Hz, {ref_frame}-sample frames, step {ref_step}: "
+          f"{len(reference.events)} events over {reference.seconds():.1f} s")
+
+    header = ['rate', 'frame', 'step', 'ibuf', 'frame_ms', 'dma_ms', 'cpu_us_per_s', 'samples_per_s',
+              'gate_pct', 'matched', 'missed', 'extra', 'shift_ms']
+    print(f"{'rate':>6s} {'frame':>6s} {'step':>4s} {'ibuf':>6s} {'frame ms':>8s} {'dma ms':>7s} "
+          f"{'cpu us/s':>9s} {'samples/s':>9s} {'gate %':>7s} {'events':>12s} {'shift ms':>8s}")
+    rows = []
+    for rate in args.rates:
+        for frame in args.frames:
+            for step in args.steps:
+                if step >= frame:
+                    continue
+                replay = Replay(firmware, samples_at(rate), rate, frame, step)
+                matched, missed, extra, shift = compare_events(reference.events, replay.events,
+                                                               args.tolerance)
+                gate = gate_agreement(reference, replay)
+                cpu = replay.cpu_ns / 1000 / replay.seconds() if replay.seconds() else 0
+                for ibuf in args.ibufs:
+                    dma_ms = ibuf * 1000 / (2 * rate)
+                    row = [rate, frame, step, ibuf, round(replay.frame_ms, 1), round(dma_ms, 1),
+                           round(cpu), rate // step, round(gate, 2), matched, missed, extra,
+                           round(shift, 1)]
+                    rows.append(row)
+                    print(f"{rate:6d} {frame:6d} {step:4d} {ibuf:6d} {replay.frame_ms:8.1f} "
+                          f"{dma_ms:7.1f} {cpu:9.0f} {rate // step:9d} {gate:7.2f} "
+                          f"{f'{matched}/{missed}/{extra}':>12s} {shift:8.1f}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"Results written to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Decode the monitor's binary telemetry into CSV or a live plot
+
+Reads the serial port (needs pyserial) or a captured file, finds the
+fixed-size records in the byte stream (anything printed between them
+is skipped) and writes one CSV row per record.
+
+    python telemetry_decode.py --port /dev/ttyACM0 --csv run.csv --raw run.bin
+    python telemetry_decode.py --file run.bin --csv run.csv
+    python telemetry_decode.py --port /dev/ttyACM0 --plot
+
+Set TELEMETRY = True in main.py to turn the stream on.
+"""
+import argparse
+import csv
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hardware'))
+import telemetry
+
+COLUMNS = telemetry.FIELDS + ('playing', 'paused', 'variant')
+
+
+class Decoder:
+    """Incremental record parser: feed() bytes, get back decoded records"""
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.records = 0
+        self.skipped_bytes = 0
+        self.lost = 0  # Records missing according to seq
+        self.last_seq = None
+
+    def feed(self, data):
+        buf = self.pending
+        buf.extend(data)
+        out = []
+        i = 0
+        size = telemetry.SIZE
+        while len(buf) - i >= size:
+            if (buf[i] != 0xA5 or buf[i + 1] != 0x5A
+                    or telemetry.checksum(buf[i:i + size], size - 1) != buf[i + size - 1]):
+                i += 1
+                self.skipped_bytes += 1
+                continue
+            values = struct.unpack_from(telemetry.FORMAT, buf, i)
+            record = dict(zip(telemetry.FIELDS, values[3:-1]))
+            flags = record['flags']
+            record['playing'] = int(bool(flags & telemetry.PLAYING))
+            record['paused'] = int(bool(flags & telemetry.PAUSED))
+            record['variant'] = (flags >> telemetry.VARIANT_SHIFT) & 0x3
+            if self.last_seq is not None:
+                self.lost += (record['seq'] - self.last_seq - 1) & 0xFFFF
+            self.last_seq = record['seq']
+            self.records += 1
+            out.append(record)
+            i += size
+        del buf[:i]
+        return out
+
+
+def open_input(args):
+    if args.port:
+        try:
+            import serial
+        except ImportError:
+            sys.exit("Reading a serial port needs pyserial (pip install pyserial)")
+        return serial.Serial(args.port, args.baud, timeout=0.1)
+    if args.file == '-':
+        return sys.stdin.buffer
+    return open(args.file, 'rb')
+
+
+class LivePlot:
+    """RMS and loop time over the last few hundred records (needs matplotlib)"""
+
+    def __init__(self, window=300):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self.window = window
+        self.t = []
+        self.rms = []
+        self.loop_us = []
+        plt.ion()
+        self.fig, (self.ax_rms, self.ax_loop) = plt.subplots(2, 1, sharex=True)
+        self.line_rms, = self.ax_rms.plot([], [])
+        self.line_loop, = self.ax_loop.plot([], [])
+        self.ax_rms.set_ylabel('RMS')
+        self.ax_loop.set_ylabel('loop us')
+        self.ax_loop.set_xlabel('s')
+
+    def add(self, records):
+        for r in records:
+            self.t.append(r['ticks_ms'] / 1000)
+            self.rms.append(r['rms'])
+            self.loop_us.append(r['loop_us'])
+        del self.t[:-self.window], self.rms[:-self.window], self.loop_us[:-self.window]
+
+    def draw(self):
+        if not self.t:
+            return
+        self.line_rms.set_data(self.t, self.rms)
+        self.line_loop.set_data(self.t, self.loop_us)
+        for ax in (self.ax_rms, self.ax_loop):
+            ax.relim()
+            ax.autoscale_view()
+        self.plt.pause(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--port', help='serial port the board is on')
+    source.add_argument('--file', help="captured stream ('-' for stdin)")
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--csv', help='write records here (default: stdout)')
+    parser.add_argument('--raw', help='also save the raw byte stream here')
+    parser.add_argument('--plot', action='store_true', help='live plot (needs matplotlib)')
+    args = parser.parse_args()
+
+    stream = open_input(args)
+    raw = open(args.raw, 'wb') if args.raw else None
+    out = open(args.csv, 'w', newline='') if args.csv else sys.stdout
+    writer = csv.DictWriter(out, fieldnames=COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    plot = LivePlot() if args.plot else None
+    decoder = Decoder()
+
+    try:
+        while True:
+            data = stream.read(4096) if not args.port else stream.read(stream.in_waiting or 1)
+            if not data:
+                if args.port:
+                    continue
+                break
+            if raw:
+                raw.write(data)
+            records = decoder.feed(data)
+            writer.writerows(records)
+            if plot and records:
+                plot.add(records)
+                plot.draw()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if raw:
+            raw.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{decoder.records} records, {decoder.lost} lost, "
+          f"{decoder.skipped_bytes} bytes of other output skipped", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()